@@ -0,0 +1,63 @@
+"""
+Benchmarks for django_mail_admin. They use the test settings and are run from
+the repository root as modules, e.g.::
+
+    python -m benchmarks.templates
+"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+# Holds the database and files of this run, removed when the process exits
+_temp_dir = None
+
+
+def setup_django():
+    """
+    Sets up Django with the test settings, pointing the database and
+    MEDIA_ROOT to a temporary directory so nothing is left in the tree
+    """
+    global _temp_dir
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+    import django
+    from django.conf import settings
+
+    if _temp_dir is None:
+        _temp_dir = tempfile.TemporaryDirectory(prefix='django_mail_admin_benchmark')
+        settings.DATABASES['default']['NAME'] = os.path.join(_temp_dir.name, 'benchmark.db')
+        settings.MEDIA_ROOT = _temp_dir.name
+    django.setup()
+
+
+def timed(func, *args, **kwargs):
+    """Returns the result of ``func`` and the seconds it took"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def mail_admin_settings(**options):
+    """Overrides DJANGO_MAIL_ADMIN options, keeping the backends of the test settings"""
+    from django.conf import settings
+    from django.test.utils import override_settings
+    return override_settings(DJANGO_MAIL_ADMIN=dict(settings.DJANGO_MAIL_ADMIN, **options))
+
+
+@contextmanager
+def test_database():
+    """
+    Runs the body against a throwaway test database, with files stored
+    in a temporary MEDIA_ROOT
+    """
+    from django.db import connection
+    from django.test.utils import override_settings
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,54 @@
+"""
+Measures preparing a batch of emails sharing one attachment, with and without
+the attachment payload cache::
+
+    python -m benchmarks.attachments [emails] [attachment size in KB]
+"""
+import sys
+import tracemalloc
+
+from benchmarks import mail_admin_settings, setup_django, test_database, timed
+
+
+def prepare(emails):
+    # Messages are kept like in _send_bulk, until the whole batch is sent
+    return [email.prepare_email_message() for email in emails]
+
+
+def measure(storage_class):
+    from django_mail_admin.mail import get_queued
+    from mock import patch
+
+    emails = list(get_queued())
+    with patch.object(storage_class, '_open', autospec=True, side_effect=storage_class._open) as storage_open:
+        tracemalloc.start()
+        messages, seconds = timed(prepare, emails)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, storage_open.call_count, peak
+
+
+def main(count=1000, size_kb=512):
+    setup_django()
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import FileSystemStorage
+    from django_mail_admin import cache
+    from django_mail_admin.mail import send_many
+
+    with test_database(), mail_admin_settings(BATCH_SIZE=count):
+        attachments = {'report.pdf': ContentFile(b'%PDF' * (size_kb * 256))}
+        send_many(dict(sender='from@example.com', recipients=['to%d@example.com' % i],
+                       subject='Report', attachments=attachments) for i in range(count))
+
+        with mail_admin_settings(BATCH_SIZE=count, ATTACHMENT_CACHE_SIZE=0):
+            uncached = measure(FileSystemStorage)
+        cache.clear_attachment_payloads()
+        cached = measure(FileSystemStorage)
+
+    print('%d emails sharing a %dKB attachment' % (count, size_kb))
+    for label, (seconds, reads, peak) in (('without cache', uncached), ('with cache', cached)):
+        print('%-14s %.3fs, %d file reads, peak memory %.1fMB' % (label + ':', seconds, reads, peak / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,97 @@
+"""
+Measures selecting a batch from a large queue, comparing a single query
+OR-ing the due conditions with the indexed branches of get_queued(), both
+loading the same relations, and checks the query plans of the branches::
+
+    python -m benchmarks.queue [queued emails] [sent emails]
+"""
+import random
+import sys
+
+from benchmarks import setup_django, test_database, timed
+
+
+def seed(queued, sent):
+    from django.utils.timezone import now
+    from datetime import timedelta
+    from django_mail_admin.models import OutgoingEmail, STATUS, PRIORITY
+
+    current_time = now()
+    priorities = [PRIORITY.low, PRIORITY.medium, PRIORITY.high]
+
+    def emails():
+        for i in range(queued + sent):
+            email = OutgoingEmail(to=['to%d@example.com' % i], from_email='from@example.com',
+                                  subject='Hi', priority=random.choice(priorities),
+                                  status=STATUS.queued if i < queued else STATUS.sent)
+            # A few scheduled and retried emails, half of them due
+            if i % 50 == 0:
+                email.scheduled_time = current_time + timedelta(hours=random.choice([-1, 1]))
+            elif i % 50 == 1:
+                email.next_retry = current_time + timedelta(minutes=random.choice([-1, 1]))
+            yield email
+
+    batch = []
+    for email in emails():
+        batch.append(email)
+        if len(batch) == 5000:
+            OutgoingEmail.objects.bulk_create(batch)
+            batch = []
+    OutgoingEmail.objects.bulk_create(batch)
+
+
+def single_query():
+    from django.db.models import Q, prefetch_related_objects
+    from django.utils.timezone import now
+    from django_mail_admin.models import OutgoingEmail, STATUS
+    from django_mail_admin.settings import get_batch_size, get_sending_order
+
+    current_time = now()
+    # Loads the same relations as get_queued()
+    emails = list(OutgoingEmail.objects.filter(status=STATUS.queued)
+                  .filter(Q(scheduled_time__lte=current_time) | Q(scheduled_time=None))
+                  .filter(Q(next_retry__lte=current_time) | Q(next_retry=None))
+                  .select_related('template').order_by(*get_sending_order())[:get_batch_size()])
+    prefetch_related_objects(emails, 'attachments', 'templatevariable_set')
+    return emails
+
+
+def check_plans():
+    from django.db import connection
+    from django_mail_admin.mail import get_queued_branches
+
+    if connection.vendor != 'sqlite':
+        print('Skipping query plan checks, they are specific to SQLite')
+        return
+    names = ['mail_admin_queue_ready_idx', 'mail_admin_queue_sched_idx', 'mail_admin_queue_retried_idx']
+    # Every branch is read in SENDING_ORDER from its index
+    for branch, name in zip(get_queued_branches(), names):
+        plan = branch.explain()
+        assert name in plan, 'Expected %s in the query plan:\n%s' % (name, plan)
+        assert 'TEMP B-TREE' not in plan, 'The branch of %s is sorted:\n%s' % (name, plan)
+
+def main(queued=100000, sent=100000):
+    setup_django()
+    from django.db import connection
+    from django_mail_admin.mail import get_queued
+
+    with test_database():
+        seed(queued, sent)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        check_plans()
+        # Warm up the page cache
+        single_query()
+        get_queued()
+        old, old_seconds = timed(single_query)
+        new, new_seconds = timed(get_queued)
+        # Ties in SENDING_ORDER may come in a different order
+        assert [email.priority for email in old] == [email.priority for email in new]
+
+    print('Selecting a batch of %d from %d queued and %d sent emails' % (len(new), queued, sent))
+    print('%-14s %.4fs' % ('single query:', old_seconds))
+    print('%-14s %.4fs' % ('get_queued:', new_seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,177 @@
+"""
+Measures the outgoing pipeline: enqueueing with send_many(), preparing a
+batch from get_queued() and sending everything with send_queued(), against the
+locmem backend and an in-process SMTP sink. Every scenario runs in its own
+process, so its peak RSS is its own::
+
+    python -m benchmarks.sending [--sizes 1000 10000 100000] [--variants plain template attachment]
+                                 [--backends locmem smtp] [--batch-size 1000] [--output results.json]
+
+Results are written as JSON, to compare them across releases.
+"""
+import argparse
+import datetime
+import json
+import platform
+import resource
+import subprocess
+import sys
+from contextlib import contextmanager
+
+from benchmarks import mail_admin_settings, setup_django, test_database, timed
+
+SIZES = [1000, 10000, 100000]
+VARIANTS = ['plain', 'template', 'attachment']
+BACKENDS = ['locmem', 'smtp']
+
+HTML = '<html><body><h1>Hello {{ name }}</h1>{% for item in items %}<p>{{ item }}</p>{% endfor %}</body></html>'
+
+
+@contextmanager
+def count_queries():
+    """Counts the queries run in the body, without keeping them like CaptureQueriesContext"""
+    from django.db import connection
+    counter = {'queries': 0}
+
+    def execute(execute, sql, params, many, context):
+        counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(execute):
+        yield counter
+
+
+def get_emails(size, variant, backend):
+    from django.core.files.base import ContentFile
+    from django_mail_admin.models import EmailTemplate
+
+    template = None
+    attachments = None
+    if variant == 'template':
+        template = EmailTemplate.objects.create(name='benchmark', subject='Hello {{ name }}', email_html_text=HTML)
+    elif variant == 'attachment':
+        # One shared attachment, stored once
+        attachments = {'report.pdf': ContentFile(b'%PDF' * 2560)}
+
+    for i in range(size):
+        kwargs = dict(sender='from@example.com', recipients=['to%d@example.com' % i], backend=backend)
+        if template is not None:
+            kwargs.update(template=template, variable_dict={'name': 'user%d' % i, 'items': ['first', 'second']})
+        else:
+            kwargs.update(subject='Hello user%d' % i, message='Hello', html_message='<p>Hello</p>')
+        if attachments is not None:
+            kwargs['attachments'] = attachments
+        yield kwargs
+
+
+def phase(func, count):
+    with count_queries() as counter:
+        result, seconds = timed(func)
+    return result, {'seconds': round(seconds, 4), 'per_second': round(count / seconds, 1) if seconds else None,
+                    'queries': counter['queries']}
+
+
+def run_scenario(size, variant, backend, batch_size):
+    setup_django()
+    from django.core import mail
+    from django.test.utils import override_settings
+    from django_mail_admin.mail import close_pools, get_queued, send_many, send_queued
+    from django_mail_admin.models import OutgoingEmail, STATUS
+    from tests.smtp_sink import SMTPSink
+
+    sink = SMTPSink(store_messages=False).start()
+    mail.outbox = []
+    result = {'size': size, 'variant': variant, 'backend': backend, 'batch_size': batch_size}
+    try:
+        with test_database(), override_settings(EMAIL_HOST='127.0.0.1', EMAIL_PORT=sink.port), \
+                mail_admin_settings(BATCH_SIZE=batch_size):
+            _, result['enqueue'] = phase(lambda: send_many(get_emails(size, variant, backend)), size)
+
+            def prepare():
+                emails = get_queued()
+                for email in emails:
+                    email.prepare_email_message()
+                return len(emails)
+
+            prepared = prepare()
+            _, result['prepare'] = phase(prepare, prepared)
+
+            def send_all():
+                while True:
+                    sent, failed = send_queued(keep_alive=True)
+                    # Don't keep every sent message in memory
+                    mail.outbox = []
+                    if not sent and not failed:
+                        return
+
+            _, result['send'] = phase(send_all, size)
+            close_pools()
+            result['sent'] = OutgoingEmail.objects.filter(status=STATUS.sent).count()
+    finally:
+        sink.stop()
+    if backend == 'smtp':
+        result['smtp_messages'] = sink.message_count
+    # Kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['peak_rss_mb'] = round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    return result
+
+
+def get_metadata():
+    import django
+    import django_mail_admin
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'version': django_mail_admin.__version__,
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the outgoing pipeline.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=VARIANTS)
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=BACKENDS)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--output', help='File to write the JSON results to, defaults to stdout')
+    # Used by the parent process to run one scenario
+    parser.add_argument('--scenario', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.scenario:
+        print(json.dumps(run_scenario(**json.loads(args.scenario))))
+        return
+
+    results = []
+    for size in args.sizes:
+        for variant in args.variants:
+            for backend in args.backends:
+                scenario = dict(size=size, variant=variant, backend=backend, batch_size=args.batch_size)
+                output = subprocess.check_output([sys.executable, '-m', 'benchmarks.sending',
+                                                  '--scenario', json.dumps(scenario)])
+                result = json.loads(output.decode().strip().splitlines()[-1])
+                results.append(result)
+                sys.stderr.write('%(size)7d %(variant)-10s %(backend)-6s' % result +
+                                 ' enqueue %(per_second)8.1f/s' % result['enqueue'] +
+                                 ' prepare %(per_second)8.1f/s' % result['prepare'] +
+                                 ' send %(per_second)8.1f/s %(queries)6d queries' % result['send'] +
+                                 ' peak RSS %(peak_rss_mb).1fMB\n' % result)
+
+    setup_django()
+    report = json.dumps({'metadata': get_metadata(), 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
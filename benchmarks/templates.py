@@ -0,0 +1,47 @@
+"""
+Measures the render phase of EmailTemplate with and without the compiled
+template cache::
+
+    python -m benchmarks.templates [renders]
+"""
+import sys
+
+from benchmarks import mail_admin_settings, setup_django, timed
+
+HTML = '''
+<html><body>
+<h1>Hello {{ name }}</h1>
+{% for item in items %}<p>{{ forloop.counter }}. {{ item|title }}</p>{% endfor %}
+{% if coupon %}<p>Your coupon: <b>{{ coupon|upper }}</b></p>{% endif %}
+<p>{{ footer|linebreaksbr }}</p>
+</body></html>
+''' * 5
+
+
+def render(email_template, renders):
+    from django.template import Context
+    for i in range(renders):
+        context = Context({'name': 'user%d' % i, 'items': ['first', 'second', 'third'],
+                           'coupon': 'abc%d' % i, 'footer': 'Line one\nLine two'})
+        email_template.render_subject(context)
+        email_template.render_html_text(context)
+
+
+def main(renders=10000):
+    setup_django()
+    from django_mail_admin import cache
+    from django_mail_admin.models import EmailTemplate
+
+    email_template = EmailTemplate(name='benchmark', subject='Hello {{ name }}', email_html_text=HTML)
+    with mail_admin_settings(TEMPLATE_CACHE_SIZE=0):
+        _, uncached = timed(render, email_template, renders)
+    cache.invalidate_templates()
+    _, cached = timed(render, email_template, renders)
+
+    print('%d renders of subject and html text' % renders)
+    print('without cache: %.3fs' % uncached)
+    print('with cache:    %.3fs (%.1fx faster)' % (cached, uncached / cached))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -4,7 +4,7 @@ from django.conf import settings
 from django.contrib import admin
 from django.contrib import messages
 from django.forms.widgets import TextInput
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseRedirect
 from django.shortcuts import reverse
 from django.template import Context
 from django.utils import timezone
@@ -12,7 +12,7 @@ from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 
 from django_mail_admin.models import Mailbox, IncomingAttachment, IncomingEmail, TemplateVariable, OutgoingEmail, \
-    Outbox, EmailTemplate, STATUS, Log, Attachment
+    Outbox, EmailTemplate, STATUS, Log, Attachment, ArchivedEmail, ArchivedLog, LogCounter
 from django_mail_admin.signals import message_received
 from django_mail_admin.utils import convert_header_to_unicode
 from .fields import CommaSeparatedEmailField
@@ -77,7 +77,7 @@ class MailboxAdmin(get_parent()):
         'active',
         'last_polling',
     )
-    readonly_fields = ['last_polling', ]
+    readonly_fields = ['last_polling', 'uid_validity', 'last_uid', ]
     actions = [get_new_mail, switch_active]
 
 
@@ -309,7 +309,7 @@ class CommaSeparatedEmailWidget(TextInput):
 
 def requeue(modeladmin, request, queryset):
     """An admin action to requeue emails."""
-    queryset.update(status=STATUS.queued)
+    queryset.update(status=STATUS.queued, attempts=0, next_retry=None, lease_owner='', lease_expires=None)
 
 
 requeue.short_description = _('Requeue selected emails')
@@ -363,6 +363,49 @@ class OutgoingEmailAdmin(admin.ModelAdmin):
         # TODO: add setting to only queue emails after pressing a button/etc.
         obj.queue()
 
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        # Links to archived emails (e.g. in old notifications) lead to the archive
+        if object_id.isdigit() and not OutgoingEmail.objects.filter(id=object_id).exists():
+            archived = ArchivedEmail.objects.filter(email_id=object_id).order_by('-id').first()
+            if archived is not None:
+                return HttpResponseRedirect(reverse('admin:django_mail_admin_archivedemail_change',
+                                                    args=[archived.pk]))
+        return super(OutgoingEmailAdmin, self).change_view(request, object_id, form_url, extra_context)
+
+
+class ArchivedLogInline(admin.TabularInline):
+    model = ArchivedLog
+    can_delete = False
+    fields = ['date', 'status', 'exception_type', 'message']
+    readonly_fields = fields
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).order_by('date')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class ArchivedEmailAdmin(admin.ModelAdmin):
+    """Sent and failed emails moved out of the queue by the archive_email command, read only"""
+    inlines = (ArchivedLogInline,)
+    list_display = ['email_id', 'to_display', 'subject', 'template', 'from_email', 'status', 'created', 'archived']
+    list_filter = ['status', 'archived']
+    search_fields = ['to', 'subject', 'from_email']
+    date_hierarchy = 'created'
+
+    def to_display(self, instance):
+        return ', '.join(instance.to)
+
+    to_display.short_description = _('To')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        # Shown read only to users with the view permission
+        return False
+
 
 class AttachmentAdmin(admin.ModelAdmin):
     list_display = ('name', 'file',)
@@ -377,6 +420,12 @@ class LogAdmin(admin.ModelAdmin):
     list_display = ('email', 'status', 'date', 'message')
 
 
+class LogCounterAdmin(admin.ModelAdmin):
+    list_display = ('minute', 'backend_alias', 'status', 'count')
+    list_filter = ('backend_alias', 'status')
+    date_hierarchy = 'minute'
+
+
 if getattr(settings, 'DJANGO_MAILADMIN_ADMIN_ENABLED', True):
     admin.site.register(IncomingEmail, IncomingEmailAdmin)
     admin.site.register(IncomingAttachment, IncomingAttachmentAdmin)
@@ -387,3 +436,5 @@ if getattr(settings, 'DJANGO_MAILADMIN_ADMIN_ENABLED', True):
     admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
     admin.site.register(Outbox, OutboxAdmin)
     admin.site.register(Log, LogAdmin)
+    admin.site.register(LogCounter, LogCounterAdmin)
+    admin.site.register(ArchivedEmail, ArchivedEmailAdmin)
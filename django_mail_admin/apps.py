@@ -7,3 +7,19 @@ class DjangoMailAdminConfig(AppConfig):
     name = 'django_mail_admin'
     verbose_name = _('Mail Admin')
     default_auto_field = 'django.db.models.AutoField'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from django_mail_admin import cache, wakeup
+        from django_mail_admin.models import EmailTemplate
+        from django_mail_admin.signals import email_queued
+        email_queued.connect(wakeup.notify, dispatch_uid='django_mail_admin_wakeup')
+        post_save.connect(cache.invalidate_templates, sender=EmailTemplate,
+                          dispatch_uid='django_mail_admin_template_saved')
+        post_delete.connect(cache.invalidate_templates, sender=EmailTemplate,
+                            dispatch_uid='django_mail_admin_template_deleted')
+
+        from django_mail_admin.settings import get_metrics_enabled
+        if get_metrics_enabled():
+            from django_mail_admin.metrics import enable_metrics
+            enable_metrics()
@@ -0,0 +1,89 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.timezone import now
+
+from .models import OutgoingEmail, Log, Attachment, IncomingEmail, ArchivedEmail, ArchivedLog, STATUS
+from .settings import get_archive_chunk_size
+
+logger = logging.getLogger(__name__)
+
+# Fields copied from an OutgoingEmail to its ArchivedEmail
+ARCHIVED_FIELDS = ['from_email', 'to', 'cc', 'bcc', 'template_id', 'subject', 'message', 'html_message',
+                   'headers', 'status', 'priority', 'backend_alias', 'attempts', 'created', 'last_updated',
+                   'scheduled_time']
+
+
+def get_archivable(before):
+    """
+    Returns the sent and failed emails last updated before ``before``.
+    Emails with replies are kept, IncomingEmail.in_reply_to points to them.
+    """
+    replies = IncomingEmail.objects.filter(in_reply_to=OuterRef('pk'))
+    return OutgoingEmail.objects.filter(status__in=[STATUS.sent, STATUS.failed], last_updated__lt=before) \
+        .filter(~Exists(replies))
+
+
+def archive_emails(before, chunk_size=None):
+    """
+    Moves the emails of get_archivable(), their logs and links to their
+    attachments into ArchivedEmail and ArchivedLog, ``chunk_size`` emails per
+    transaction, so the queue table only holds emails still to be sent.
+
+    Yields the number of emails archived by each chunk. As every chunk moves
+    its emails out of the queue, an interrupted run continues where it
+    stopped when started again.
+    """
+    if chunk_size is None:
+        chunk_size = get_archive_chunk_size()
+    while True:
+        archived = archive_chunk(before, chunk_size)
+        if not archived:
+            return
+        yield archived
+
+
+def archive_chunk(before, chunk_size):
+    """Archives up to ``chunk_size`` emails, returns how many were archived"""
+    with transaction.atomic():
+        ids = list(get_archivable(before).select_for_update().order_by('id')
+                   .values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return 0
+        emails = OutgoingEmail.objects.filter(id__in=ids).prefetch_related('templatevariable_set')
+        archived_at = now()
+        ArchivedEmail.objects.bulk_create([
+            ArchivedEmail(email_id=email.id, context=get_archived_context(email), archived=archived_at,
+                          **dict((field, getattr(email, field)) for field in ARCHIVED_FIELDS))
+            for email in emails
+        ])
+        # Not every database returns the primary keys of bulk_create()
+        archived_ids = dict(ArchivedEmail.objects.filter(email_id__in=ids, archived=archived_at)
+                            .values_list('email_id', 'id'))
+
+        logs = Log.objects.filter(email_id__in=ids).order_by('id') \
+            .values_list('email_id', 'date', 'status', 'exception_type', 'message')
+        ArchivedLog.objects.bulk_create([
+            ArchivedLog(email_id=archived_ids[email_id], date=date, status=status,
+                        exception_type=exception_type, message=message)
+            for email_id, date, status, exception_type, message in logs
+        ])
+        links = Attachment.emails.through.objects.filter(outgoingemail_id__in=ids) \
+            .values_list('outgoingemail_id', 'attachment_id')
+        ArchivedEmail.attachments.through.objects.bulk_create([
+            ArchivedEmail.attachments.through(archivedemail_id=archived_ids[email_id], attachment_id=attachment_id)
+            for email_id, attachment_id in links
+        ])
+        # Logs, template variables and links to attachments are deleted
+        # with the emails
+        OutgoingEmail.objects.filter(id__in=ids).delete()
+    logger.debug('Archived %d emails', len(ids))
+    return len(ids)
+
+
+def get_archived_context(email):
+    context = dict(email.context or {})
+    for var in email.templatevariable_set.all():
+        context[var.name] = var.value
+    return context or None
@@ -1,6 +1,11 @@
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+from django.template import Template
 from django.template.defaultfilters import slugify
 
-from .settings import get_cache_backend
+from .settings import get_attachment_cache_size, get_cache_backend, get_template_cache_size
 
 # Stripped down version of caching functions from django-dbtemplates
 # https://github.com/jezdez/django-dbtemplates/blob/develop/dbtemplates/utils/cache.py
@@ -25,3 +30,102 @@ def get(name):
 
 def delete(name):
     return cache_backend.delete(get_cache_key(name))
+
+
+# Compiled templates can't be pickled into a cache backend, so they are kept in
+# an in-process LRU. Keys include a hash of the source, so an edited template
+# never renders stale content even before invalidate_templates() runs.
+_compiled_templates = OrderedDict()
+_compiled_templates_lock = Lock()
+
+
+def get_compiled_template(email_template, field):
+    """
+    Returns a compiled Template for ``field`` (e.g. 'subject') of an EmailTemplate,
+    parsing it only if it isn't in the cache yet
+    """
+    source = getattr(email_template, field)
+    size = get_template_cache_size()
+    if not size:
+        return Template(source)
+
+    key = (email_template.pk, field, hashlib.sha1(source.encode('utf-8')).hexdigest())
+    with _compiled_templates_lock:
+        template = _compiled_templates.get(key)
+        if template is not None:
+            _compiled_templates.move_to_end(key)
+            return template
+
+    # Parse outside of the lock, at worst two threads compile the same template
+    template = Template(source)
+    with _compiled_templates_lock:
+        _compiled_templates[key] = template
+        while len(_compiled_templates) > size:
+            _compiled_templates.popitem(last=False)
+    return template
+
+
+def invalidate_templates(sender=None, instance=None, **kwargs):
+    """
+    Drops compiled templates of an EmailTemplate, or all of them if no instance
+    is given. Connected to post_save and post_delete of EmailTemplate.
+    """
+    with _compiled_templates_lock:
+        if instance is None:
+            _compiled_templates.clear()
+            return
+        for key in [key for key in _compiled_templates if key[0] == instance.pk]:
+            del _compiled_templates[key]
+
+
+# Attachment contents shared by the emails of a campaign are read from storage
+# once per process and the same bytes object is attached to every message.
+# The LRU is bounded by ATTACHMENT_CACHE_SIZE bytes, larger files aren't cached.
+_attachment_payloads = OrderedDict()
+_attachment_payloads_size = 0
+_attachment_payloads_lock = Lock()
+
+
+def get_attachment_payload_key(attachment):
+    if attachment.content_hash:
+        return 'sha256', attachment.content_hash
+    # Attachments created before content hashes were stored
+    return 'attachment', attachment.pk, attachment.file.size
+
+
+def get_attachment_payload(attachment):
+    """
+    Returns the content of an Attachment, reading the file only if it isn't
+    in the cache yet. Contents are cached by their hash: the storage reuses
+    the name of a deleted file, see delete_unused_attachments(), so the file
+    name doesn't identify the content.
+    """
+    global _attachment_payloads_size
+    max_size = get_attachment_cache_size()
+    key = get_attachment_payload_key(attachment) if max_size else None
+    if max_size:
+        with _attachment_payloads_lock:
+            content = _attachment_payloads.get(key)
+            if content is not None:
+                _attachment_payloads.move_to_end(key)
+                return content
+
+    with attachment.file.open('rb') as attachment_file:
+        content = attachment_file.read()
+
+    if max_size and len(content) <= max_size:
+        with _attachment_payloads_lock:
+            if key not in _attachment_payloads:
+                _attachment_payloads[key] = content
+                _attachment_payloads_size += len(content)
+                while _attachment_payloads_size > max_size:
+                    _, evicted = _attachment_payloads.popitem(last=False)
+                    _attachment_payloads_size -= len(evicted)
+    return content
+
+
+def clear_attachment_payloads():
+    global _attachment_payloads_size
+    with _attachment_payloads_lock:
+        _attachment_payloads.clear()
+        _attachment_payloads_size = 0
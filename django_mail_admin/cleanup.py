@@ -0,0 +1,98 @@
+import logging
+import time
+
+from django.db import transaction
+
+from .models import OutgoingEmail, IncomingEmail, IncomingAttachment, ArchivedEmail
+
+logger = logging.getLogger(__name__)
+
+
+def delete_in_chunks(queryset, delete, chunk_size, pause=0):
+    """
+    Deletes the rows of ``queryset`` in id ranges of up to ``chunk_size``
+    rows, calling ``delete`` with the queryset of every range in its own
+    transaction and sleeping ``pause`` seconds between ranges, so no
+    transaction or cascade grows with the table.
+
+    Yields the number of rows deleted by each range. Deleted rows are gone
+    for good, an interrupted cleanup continues where it stopped when
+    started again.
+    """
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        with transaction.atomic():
+            deleted = delete(queryset.filter(id__gte=ids[0], id__lte=ids[-1]))
+        last_id = ids[-1]
+        yield deleted
+        if pause:
+            time.sleep(pause)
+
+
+def get_incoming_files(emails):
+    """
+    Returns the stored original messages and attachments of the incoming
+    ``emails`` as (storage, name) tuples. Queryset deletes skip
+    IncomingEmail.delete() and IncomingAttachment.delete(), which
+    remove these files.
+    """
+    files = [(IncomingEmail.eml.field.storage, name)
+             for name in emails.exclude(eml='').exclude(eml=None).values_list('eml', flat=True)]
+    files += [(IncomingAttachment.document.field.storage, name)
+              for name in IncomingAttachment.objects.filter(message__in=emails).exclude(document='')
+                                                    .values_list('document', flat=True)]
+    return files
+
+
+def delete_files(files):
+    for storage, name in files:
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning('Could not delete %s', name, exc_info=True)
+
+
+def delete_with_files(queryset, incoming_emails):
+    """
+    Deletes ``queryset``, and the files of ``incoming_emails`` deleted with it
+    once the transaction is committed. Returns the number of deleted rows
+    of the queryset's model.
+    """
+    files = get_incoming_files(incoming_emails)
+    _, deleted = queryset.delete()
+    transaction.on_commit(lambda: delete_files(files))
+    return deleted.get(queryset.model._meta.label, 0)
+
+
+def delete_outgoing_emails(before, chunk_size, pause=0):
+    """
+    Deletes outgoing emails created before ``before``, with their logs and
+    replies, see delete_in_chunks(). Attachments left without emails are
+    deleted by models.delete_unused_attachments().
+    """
+    return delete_in_chunks(
+        OutgoingEmail.objects.filter(created__lt=before),
+        lambda chunk: delete_with_files(chunk, IncomingEmail.objects.filter(in_reply_to__in=chunk)),
+        chunk_size, pause)
+
+
+def delete_archived_emails(before, chunk_size, pause=0):
+    """Deletes archived emails created before ``before``, see delete_in_chunks()"""
+    return delete_in_chunks(
+        ArchivedEmail.objects.filter(created__lt=before),
+        lambda chunk: chunk.delete()[1].get(ArchivedEmail._meta.label, 0),
+        chunk_size, pause)
+
+
+def delete_incoming_emails(before, chunk_size, pause=0):
+    """
+    Deletes incoming emails processed before ``before`` with their stored
+    messages and attachments, see delete_in_chunks()
+    """
+    return delete_in_chunks(
+        IncomingEmail.objects.filter(processed__lt=before),
+        lambda chunk: delete_with_files(chunk, chunk),
+        chunk_size, pause)
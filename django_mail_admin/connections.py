@@ -1,8 +1,10 @@
-from threading import local
+import smtplib
+import time
+from threading import local, Lock
 
 from django.core.mail import get_connection
 
-from .settings import get_backend
+from .settings import get_backend, get_connection_idle_timeout, get_connection_pool_size
 
 
 # Copied from Django 1.8's django.core.cache.CacheHandler
@@ -10,36 +12,115 @@ class ConnectionHandler(object):
     """
     A Cache Handler to manage access to Cache instances.
 
-    Ensures only one instance of each alias exists per thread.
+    Ensures only one instance of each alias exists per thread. Connections
+    given back with release() or checkin() are kept in a pool of up to
+    CONNECTION_POOL_SIZE idle connections per alias and reused if they are
+    not older than CONNECTION_IDLE_TIMEOUT and still respond to a NOOP.
     """
 
     def __init__(self):
         self._connections = local()
+        self._idle = {}
+        self._lock = Lock()
+
+    def _get_local_connections(self):
+        if not hasattr(self._connections, 'connections'):
+            self._connections.connections = {}
+        return self._connections.connections
 
     def __getitem__(self, alias):
+        local_connections = self._get_local_connections()
         try:
-            return self._connections.connections[alias]
-        except AttributeError:
-            self._connections.connections = {}
+            return local_connections[alias]
         except KeyError:
             pass
 
-        try:
-            backend = get_backend(alias)
-        except KeyError:
-            raise KeyError('%s is not a valid backend alias' % alias)
+        connection = self.checkout(alias)
+        local_connections[alias] = connection
+        return connection
+
+    def checkout(self, alias):
+        """
+        Returns an idle connection of ``alias`` or a new one, owned by the
+        caller until it's given back with checkin() or closed.
+        """
+        connection = self._get_idle(alias)
+        if connection is None:
+            try:
+                backend = get_backend(alias)
+            except KeyError:
+                raise KeyError('%s is not a valid backend alias' % alias)
+
+            connection = get_connection(backend)
+            connection.open()
+        return connection
 
-        connection = get_connection(backend)
+    def checkin(self, alias, connection):
+        """Gives a connection back to the pool, or closes it if the pool is full"""
+        with self._lock:
+            idle = self._idle.setdefault(alias, [])
+            if len(idle) < get_connection_pool_size():
+                idle.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+    def _get_idle(self, alias):
+        deadline = time.monotonic() - get_connection_idle_timeout()
+        while True:
+            with self._lock:
+                idle = self._idle.get(alias)
+                if not idle:
+                    return None
+                connection, released_at = idle.pop()
+            if released_at >= deadline and is_usable(connection):
+                return connection
+            connection.close()
+
+    def reconnect(self, alias):
+        """
+        Reopens this thread's connection, e.g. after the server dropped it
+        in the middle of a batch.
+        """
+        connection = self[alias]
+        connection.close()
         connection.open()
-        self._connections.connections[alias] = connection
         return connection
 
     def all(self):
-        return getattr(self._connections, 'connections', {}).values()
+        return self._get_local_connections().values()
+
+    def release(self):
+        """Gives this thread's connections back to the pool"""
+        local_connections = self._get_local_connections()
+        self._connections.connections = {}
+        for alias, connection in local_connections.items():
+            self.checkin(alias, connection)
 
     def close(self):
-        for connection in self.all():
+        """Closes this thread's connections and the idle ones"""
+        local_connections = self._get_local_connections()
+        self._connections.connections = {}
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connection in local_connections.values():
             connection.close()
+        for connections in idle.values():
+            for connection, released_at in connections:
+                connection.close()
+
+
+def is_usable(connection):
+    """
+    Checks that an SMTP connection is still alive with a NOOP. Backends
+    that don't keep a connection open are always usable.
+    """
+    smtp = getattr(connection, 'connection', None)
+    if not isinstance(smtp, smtplib.SMTP):
+        return True
+    try:
+        return smtp.noop()[0] == 250
+    except (smtplib.SMTPException, OSError):
+        return False
 
 
 connections = ConnectionHandler()
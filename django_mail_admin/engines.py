@@ -0,0 +1,150 @@
+import asyncio
+import logging
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.smtp import EmailBackend as SMTPEmailBackend
+from django.core.mail.message import sanitize_address
+
+from .instrumentation import timed_stage
+from .ratelimit import get_wait_time
+from .settings import get_async_concurrency, get_backend, get_sending_engine
+from .signals import email_sent, email_failed_to_send
+
+# Optional dependency: pip install django_mail_admin[async]
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
+
+logger = logging.getLogger(__name__)
+
+THREAD = 'thread'
+ASYNCIO = 'asyncio'
+
+_fallback_warned = set()
+
+
+def get_engine(alias):
+    """
+    Returns the engine used to send emails of the given backend alias,
+    either THREAD (ThreadPool in _send_bulk) or ASYNCIO.
+    """
+    alias = alias or 'default'
+    engine = get_sending_engine(alias)
+    if engine not in (THREAD, ASYNCIO):
+        raise ValueError('%s is not a valid sending engine for backend %s' % (engine, alias))
+    if engine == ASYNCIO and aiosmtplib is None:
+        if alias not in _fallback_warned:
+            _fallback_warned.add(alias)
+            logger.warning('aiosmtplib is not installed, backend %s falls back to the thread engine', alias)
+        return THREAD
+    return engine
+
+
+def send_with_asyncio(emails):
+    """
+    Sends prepared emails from an asyncio event loop. SMTP backends are driven
+    by aiosmtplib with up to ASYNC_CONCURRENCY connections per backend alias,
+    each one sending its share of emails over a single session. Other backends
+    are called from the loop's default executor.
+
+    Returns a tuple of (sent_emails, failed_emails), failed_emails being
+    (email, exception) pairs like in _send_bulk.
+    """
+    sent_emails = []
+    failed_emails = []
+    asyncio.run(_send_all(emails, sent_emails, failed_emails))
+
+    # Signals are sent once the loop is done, so receivers may use the ORM
+    for email in sent_emails:
+        logger.debug('Successfully sent email #%d' % email.id)
+        email_sent.send(sender=email, outgoing_email=email.email_message())
+    for email, exception in failed_emails:
+        logger.debug('Failed to send email #%d' % email.id)
+        email_failed_to_send.send(sender=email, outgoing_email=email.email_message())
+    return sent_emails, failed_emails
+
+
+async def _send_all(emails, sent_emails, failed_emails):
+    groups = {}
+    for email in emails:
+        groups.setdefault(email.backend_alias or 'default', []).append(email)
+
+    workers = []
+    for alias, group in groups.items():
+        try:
+            backend = get_connection(get_backend(alias))
+        except Exception as e:
+            failed_emails.extend((email, e) for email in group)
+            continue
+
+        # Workers pull from a shared iterator, which is safe since
+        # coroutines only switch at await points
+        pending = iter(group)
+        concurrency = min(get_async_concurrency(alias), len(group))
+        if isinstance(backend, SMTPEmailBackend):
+            workers.extend(_smtp_worker(backend, pending, sent_emails, failed_emails)
+                           for i in range(concurrency))
+        else:
+            workers.extend(_executor_worker(backend, pending, sent_emails, failed_emails)
+                           for i in range(concurrency))
+
+    await asyncio.gather(*workers)
+
+
+def _get_smtp_client(backend):
+    return aiosmtplib.SMTP(
+        hostname=backend.host, port=backend.port,
+        username=backend.username or None, password=backend.password or None,
+        use_tls=bool(backend.use_ssl), start_tls=bool(backend.use_tls),
+        timeout=backend.timeout,
+        client_cert=backend.ssl_certfile, client_key=backend.ssl_keyfile,
+    )
+
+
+async def _smtp_worker(backend, pending, sent_emails, failed_emails):
+    smtp = None
+    try:
+        for email in pending:
+            await asyncio.sleep(get_wait_time(email))
+            email_message = email.email_message()
+            recipients = email_message.recipients()
+            try:
+                # Like Django's SMTP backend, skip messages without recipients
+                if recipients:
+                    if smtp is None or not smtp.is_connected:
+                        smtp = _get_smtp_client(backend)
+                        await smtp.connect()
+                    encoding = email_message.encoding or settings.DEFAULT_CHARSET
+                    with timed_stage('send'):
+                        await smtp.send_message(
+                            email_message.message(),
+                            sender=sanitize_address(email_message.from_email, encoding),
+                            recipients=[sanitize_address(addr, encoding) for addr in recipients],
+                        )
+            except Exception as e:
+                failed_emails.append((email, e))
+            else:
+                sent_emails.append(email)
+    finally:
+        if smtp is not None and smtp.is_connected:
+            try:
+                await smtp.quit()
+            except Exception:
+                smtp.close()
+
+
+async def _executor_worker(backend, pending, sent_emails, failed_emails):
+    loop = asyncio.get_running_loop()
+    for email in pending:
+        await asyncio.sleep(get_wait_time(email))
+        email_message = email.email_message()
+        try:
+            with timed_stage('send'):
+                await loop.run_in_executor(None, backend.send_messages, [email_message])
+        except Exception as e:
+            failed_emails.append((email, e))
+        else:
+            sent_emails.append(email)
+
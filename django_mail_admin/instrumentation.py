@@ -0,0 +1,106 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+from .signals import stage_timed
+
+logger = logging.getLogger(__name__)
+
+# Stages of the sending pipeline timed with timed_stage(), in pipeline order
+STAGES = ['get_queued', 'render', 'mime', 'attachments', 'send', 'status_update', 'log_write']
+
+_aggregator = None
+
+
+@contextmanager
+def timed_stage(stage):
+    """
+    Sends ``stage_timed`` with the seconds the body took, if it didn't raise.
+    Nothing is measured while the signal has no receivers.
+    """
+    if not stage_timed.has_listeners():
+        yield
+        return
+    start = time.perf_counter()
+    yield
+    stage_timed.send(sender=None, stage=stage, duration=time.perf_counter() - start)
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of a sorted list"""
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class TimingAggregator(object):
+    """
+    Collects the durations of stage_timed in this process, see enable_timings()
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.lock = Lock()
+
+    def record(self, sender, stage, duration, **kwargs):
+        with self.lock:
+            self.durations.setdefault(stage, []).append(duration)
+
+    def connect(self):
+        stage_timed.connect(self.record, weak=False, dispatch_uid=id(self))
+
+    def disconnect(self):
+        stage_timed.disconnect(dispatch_uid=id(self))
+
+    def reset(self):
+        with self.lock:
+            durations, self.durations = self.durations, {}
+        return durations
+
+    def summary(self):
+        """
+        Returns a dict of stage: (count, p50, p95, max) of the durations
+        recorded since the last reset, and resets them
+        """
+        summary = {}
+        for stage, durations in self.reset().items():
+            durations.sort()
+            summary[stage] = (len(durations), percentile(durations, 50), percentile(durations, 95), durations[-1])
+        return summary
+
+    def log_summary(self):
+        summary = self.summary()
+        if not summary:
+            return
+        order = dict((stage, position) for position, stage in enumerate(STAGES))
+        lines = ['%s: %d, p50 %.1fms, p95 %.1fms, max %.1fms' % (
+            stage, count, p50 * 1000, p95 * 1000, maximum * 1000)
+            for stage, (count, p50, p95, maximum) in
+            sorted(summary.items(), key=lambda item: order.get(item[0], len(order)))]
+        logger.info('Stage timings: %s' % '; '.join(lines))
+
+
+def enable_timings():
+    """
+    Starts collecting stage timings in this process and the worker processes
+    forked from it, which are logged by log_timings()
+    """
+    global _aggregator
+    if _aggregator is None or _aggregator[0] != os.getpid():
+        _aggregator = (os.getpid(), TimingAggregator())
+        _aggregator[1].connect()
+    return _aggregator[1]
+
+
+def disable_timings():
+    global _aggregator
+    if _aggregator is not None:
+        _aggregator[1].disconnect()
+    _aggregator = None
+
+
+def log_timings():
+    """Logs and resets the timings collected since the last call, if enabled"""
+    if _aggregator is not None:
+        _aggregator[1].log_summary()
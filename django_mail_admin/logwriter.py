@@ -0,0 +1,114 @@
+import atexit
+import logging
+import os
+import time
+from threading import Lock
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from .instrumentation import timed_stage
+from .models import Log, LogCounter, STATUS
+from .settings import get_log_buffer_size, get_log_flush_interval, get_log_success_rollup
+
+logger = logging.getLogger(__name__)
+
+# Logs of sent and failed emails are buffered per process and written with
+# one bulk insert once LOG_BUFFER_SIZE logs are buffered or the oldest one is
+# LOG_FLUSH_INTERVAL seconds old. The default interval of 0 writes them at the
+# end of every batch, or right away for emails sent with dispatch().
+_log_writer = None
+
+
+class LogWriter(object):
+
+    def __init__(self):
+        self.logs = []
+        # (minute, backend alias, status) -> count, see LOG_SUCCESS_ROLLUP
+        self.counters = {}
+        self.buffered_since = None
+        self.lock = Lock()
+
+    def _buffered(self):
+        if self.buffered_since is None:
+            self.buffered_since = time.monotonic()
+
+    def add(self, email, status, message='', exception_type=''):
+        with self.lock:
+            self.logs.append(Log(email=email, date=now(), status=status, message=message,
+                                 exception_type=exception_type))
+            self._buffered()
+
+    def add_sent(self, email):
+        """
+        Logs a sent email, or only counts it per minute and backend alias
+        if LOG_SUCCESS_ROLLUP is enabled
+        """
+        if not get_log_success_rollup():
+            self.add(email, STATUS.sent)
+            return
+        key = (now().replace(second=0, microsecond=0), email.backend_alias, STATUS.sent)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+            self._buffered()
+
+    def __len__(self):
+        return len(self.logs) + len(self.counters)
+
+    def is_due(self):
+        if self.buffered_since is None:
+            return False
+        return len(self) >= get_log_buffer_size() or \
+            time.monotonic() - self.buffered_since >= get_log_flush_interval()
+
+    def flush(self):
+        with self.lock:
+            logs, counters = self.logs, self.counters
+            self.logs, self.counters, self.buffered_since = [], {}, None
+        with timed_stage('log_write'):
+            if logs:
+                Log.objects.bulk_create(logs, batch_size=get_log_buffer_size() or None)
+            for (minute, backend_alias, status), count in counters.items():
+                increment_counter(minute, backend_alias, status, count)
+
+
+def increment_counter(minute, backend_alias, status, count):
+    counters = LogCounter.objects.filter(minute=minute, backend_alias=backend_alias, status=status)
+    if counters.update(count=F('count') + count):
+        return
+    try:
+        with transaction.atomic():
+            LogCounter.objects.create(minute=minute, backend_alias=backend_alias, status=status, count=count)
+    except IntegrityError:
+        # Created by another process in the meantime
+        counters.update(count=F('count') + count)
+
+
+def get_log_writer():
+    """Returns the LogWriter of this process"""
+    global _log_writer
+    pid = os.getpid()
+    if _log_writer is None or _log_writer[0] != pid:
+        _log_writer = (pid, LogWriter())
+    return _log_writer[1]
+
+
+def flush_logs(force=False):
+    """Writes the buffered logs of this process if they are due, or with ``force``"""
+    writer = get_log_writer()
+    if force and len(writer) or writer.is_due():
+        writer.flush()
+
+
+@atexit.register
+def _flush_at_exit():
+    if _log_writer is None or _log_writer[0] != os.getpid():
+        return
+    count = len(_log_writer[1])
+    if count:
+        try:
+            _log_writer[1].flush()
+        except Exception:
+            # The database may be gone already
+            logger.warning('Could not write %d buffered logs', count, exc_info=True)
@@ -1,19 +1,34 @@
+import datetime
+import json
+import os
+import signal
+import time
+from functools import partial
+from itertools import islice
 from multiprocessing import Pool
+from smtplib import SMTPServerDisconnected
 from multiprocessing.dummy import Pool as ThreadPool
 
 from django.core.exceptions import ValidationError
-from django.db import connection as db_connection
-from django.db.models import Q
+from django.db import connection as db_connection, transaction
+from django.db.models import F, Q, prefetch_related_objects
 from django.utils.timezone import now
 
+from . import wakeup
 from .connections import connections
+from .engines import ASYNCIO, get_engine, send_with_asyncio
+from .instrumentation import log_timings, timed_stage
+from .metrics import flush_metrics
 from .logutils import setup_loghandlers
-from .models import OutgoingEmail, Log, PRIORITY, STATUS, create_attachments, TemplateVariable
-from .settings import (get_available_backends, get_batch_size,
-                       get_log_level, get_sending_order, get_threads_per_process)
-from .signals import email_queued
-from .utils import (parse_emails, parse_priority,
-                    split_emails)
+from .logwriter import get_log_writer, flush_logs
+from .ratelimit import get_rate_limiter, get_wait_time
+from .models import Attachment, OutgoingEmail, PRIORITY, STATUS, create_attachments
+from .settings import (get_available_backends, get_batch_size, get_lease_duration,
+                       get_log_level, get_rate_limit_max_wait, get_sending_order,
+                       get_threads_per_process)
+from .signals import email_queued, email_sent, email_failed_to_send
+from .utils import (get_worker_id, parse_emails, parse_priority,
+                    split_contiguous, split_emails_by_backend)
 
 logger = setup_loghandlers("INFO")
 
@@ -21,7 +36,7 @@ logger = setup_loghandlers("INFO")
 def create(sender, recipients=None, cc=None, bcc=None, subject='', message='',
            html_message='', scheduled_time=None, headers=None,
            template=None, priority=None, commit=True,
-           backend=''):
+           backend='', context=None):
     """
     Creates an email from supplied keyword arguments. If template is
     specified, email subject and content will be rendered during delivery.
@@ -49,7 +64,7 @@ def create(sender, recipients=None, cc=None, bcc=None, subject='', message='',
         html_message=html_message,
         scheduled_time=scheduled_time,
         headers=headers, priority=priority, status=status,
-        backend_alias=backend
+        backend_alias=backend, context=context
     )
 
     if commit:
@@ -95,7 +110,7 @@ def send(sender, recipients=None, template=None, subject='',
         if priority == PRIORITY.now:
             raise ValueError("send_many() can't be used with priority = 'now'")
         if attachments:
-            raise ValueError("Can't add attachments with send_many()")
+            raise ValueError("Can't add attachments to an email that isn't saved")
 
     if template:
         if subject:
@@ -108,56 +123,280 @@ def send(sender, recipients=None, template=None, subject='',
     if backend and backend not in get_available_backends().keys():
         raise ValueError('%s is not a valid backend alias' % backend)
 
+    context = None
+    if variable_dict:
+        # JSON types are kept, so templates can loop over lists etc.
+        # Anything else is stored as its string representation
+        context = json.loads(json.dumps(variable_dict, default=str))
+
     email = create(sender, recipients, cc, bcc,
                    subject, message, html_message, scheduled_time, headers, template,
-                   priority, commit=commit, backend=backend)
+                   priority, commit=commit, backend=backend, context=context)
 
-    if variable_dict:
-        variables = []
-        for k, v in variable_dict.items():
-            variables.append(TemplateVariable(name=k, value=str(v), email=email))
-        TemplateVariable.objects.bulk_create(variables, 20)
     if attachments:
         attachments = create_attachments(attachments)
         email.attachments.add(*attachments)
 
     if priority == PRIORITY.now:
         email.dispatch(log_level=log_level)
-    else:
+    elif commit:
         email_queued.send(email)
 
     return email
 
 
-def send_many(kwargs_list):
+def send_many(kwargs_list, chunk_size=1000):
     """
-    Similar to mail.send(), but this function accepts a list of kwargs.
-    Internally, it uses Django's bulk_create command for efficiency reasons.
+    Similar to mail.send(), but this function accepts an iterable of kwargs,
+    e.g. a generator yielding a whole campaign. Emails are validated and
+    inserted ``chunk_size`` at a time, each chunk with its attachment links
+    in one transaction, so memory use doesn't grow with the campaign.
+    If a ValidationError is raised, emails of the previous chunks stay queued.
+
+    ``attachments`` may be a dict like in mail.send() or a list of Attachment
+    instances. Passing the same dict to several emails stores the files once.
     Currently send_many() can't be used to send emails with priority = 'now'.
+
+    Returns a list of ids of the queued emails.
     """
+    ids = []
+    kwargs_iter = iter(kwargs_list)
+    while True:
+        chunk = list(islice(kwargs_iter, chunk_size))
+        if not chunk:
+            return ids
+        ids.extend(_send_chunk(chunk))
+
+
+def _send_chunk(kwargs_chunk):
+    # id() of attachments dicts -> Attachment list. The chunk keeps the dicts
+    # alive, so their ids can't be reused by another one, and the cache goes
+    # with the chunk. Dicts shared across chunks are deduplicated by content.
+    attachments_cache = {}
     emails = []
-    for kwargs in kwargs_list:
+    email_attachments = []
+    for kwargs in kwargs_chunk:
+        kwargs = dict(kwargs)
+        email_attachments.append(kwargs.pop('attachments', None))
         emails.append(send(commit=False, **kwargs))
-    OutgoingEmail.objects.bulk_create(emails)
+
+    with transaction.atomic():
+        if db_connection.features.can_return_rows_from_bulk_insert:
+            OutgoingEmail.objects.bulk_create(emails)
+        else:
+            # Ids are needed to link attachments and to return them
+            for email in emails:
+                email.save()
+
+        links = []
+        for email, attachments in zip(emails, email_attachments):
+            if not attachments:
+                continue
+            for attachment in _get_attachments(attachments, attachments_cache):
+                links.append(Attachment.emails.through(attachment_id=attachment.id, outgoingemail_id=email.id))
+        Attachment.emails.through.objects.bulk_create(links)
+
+    # One wake-up for the sending daemons is enough for the whole chunk
+    with wakeup.batched():
+        for email in emails:
+            email_queued.send(email)
+    return [email.id for email in emails]
+
+
+def _get_attachments(attachments, attachments_cache):
+    if not isinstance(attachments, dict):
+        return attachments
+    try:
+        return attachments_cache[id(attachments)]
+    except KeyError:
+        created = attachments_cache[id(attachments)] = create_attachments(attachments)
+        return created
 
 
-def get_queued():
+def get_due():
     """
-    Returns a list of emails that should be sent:
+    Returns queued emails which are due:
      - Status is queued
      - Has scheduled_time lower than the current time or None
+     - Has next_retry lower than the current time or None
     """
+    current_time = now()
     return OutgoingEmail.objects.filter(status=STATUS.queued) \
-               .select_related('template') \
-               .filter(Q(scheduled_time__lte=now()) | Q(scheduled_time=None)) \
-               .order_by(*get_sending_order()).prefetch_related('attachments')[:get_batch_size()]
+        .filter(Q(scheduled_time__lte=current_time) | Q(scheduled_time=None)) \
+        .filter(Q(next_retry__lte=current_time) | Q(next_retry=None))
+
+
+def get_queued_branches(current_time=None):
+    """
+    Returns the due emails of get_due() as three querysets, each ordered by
+    SENDING_ORDER and limited to BATCH_SIZE, so every branch can be served by
+    one of the partial queue indexes instead of sorting all queued rows:
+     - ready: neither scheduled nor waiting for a retry, usually the bulk
+       of the queue
+     - scheduled: scheduled_time has passed
+     - retried: not scheduled and next_retry has passed
+    """
+    if current_time is None:
+        current_time = now()
+    queued = OutgoingEmail.objects.filter(status=STATUS.queued).select_related('template')
+    branches = [
+        queued.filter(scheduled_time=None, next_retry=None),
+        queued.filter(scheduled_time__lte=current_time)
+              .filter(Q(next_retry=None) | Q(next_retry__lte=current_time)),
+        queued.filter(scheduled_time=None, next_retry__lte=current_time),
+    ]
+    order = get_sending_order()
+    batch_size = get_batch_size()
+    return [branch.order_by(*order)[:batch_size] for branch in branches]
+
+
+def _merge_branches(branches):
+    """
+    Evaluates the branches of get_queued_branches() and merges them into
+    one batch in SENDING_ORDER
+    """
+    emails = [email for branch in branches for email in branch]
+    # Stable sorts, from the least significant field to the most significant
+    for field in reversed(get_sending_order()):
+        descending = field.startswith('-')
+        field = field.lstrip('-')
+        emails.sort(key=lambda email: _sort_value(getattr(email, field)), reverse=descending)
+    emails = emails[:get_batch_size()]
+    prefetch_related_objects(emails, 'attachments', 'templatevariable_set')
+    return emails
+
+
+def _sort_value(value):
+    # NULLs sort last in ascending order
+    return (value is None, value if value is not None else 0)
+
+
+def get_queued():
+    """
+    Returns a list of up to BATCH_SIZE due emails that should be sent,
+    see get_due() and get_queued_branches()
+    """
+    with timed_stage('get_queued'):
+        return _merge_branches(get_queued_branches())
+
+
+def claim_queued(lease_owner=None):
+    """
+    Claims a batch of queued emails for this worker and returns them as a list.
 
+    The batch is selected with SELECT ... FOR UPDATE SKIP LOCKED and moved to
+    STATUS.sending in the same transaction, so several workers (on one or many
+    hosts) can drain the queue concurrently without sending an email twice.
+    Databases without SKIP LOCKED support (e.g. SQLite) fall back to a plain
+    select; ``send_queued_mail`` serializes workers with a lockfile there.
 
-def send_queued(processes=1, log_level=None):
+    Claimed emails are leased to ``lease_owner`` for LEASE_DURATION seconds,
+    if the worker dies before finishing the batch, ``release_expired_leases``
+    puts them back in the queue.
+    """
+    if lease_owner is None:
+        lease_owner = get_worker_id()
+    lease_expires = now() + datetime.timedelta(seconds=get_lease_duration())
+
+    with timed_stage('get_queued'), transaction.atomic():
+        branches = get_queued_branches()
+        if db_connection.features.has_select_for_update_skip_locked:
+            if db_connection.features.has_select_for_update_of:
+                branches = [branch.select_for_update(skip_locked=True, of=('self',)) for branch in branches]
+            else:
+                branches = [branch.select_for_update(skip_locked=True) for branch in branches]
+        emails = _merge_branches(branches)
+        OutgoingEmail.objects.filter(id__in=[email.id for email in emails], status=STATUS.queued) \
+            .update(status=STATUS.sending, lease_owner=lease_owner, lease_expires=lease_expires)
+
+    for email in emails:
+        email.status = STATUS.sending
+        email.lease_owner = lease_owner
+        email.lease_expires = lease_expires
+    return emails
+
+
+def release_expired_leases():
+    """
+    Puts emails claimed by a worker that didn't finish in time (e.g. crashed)
+    back in the queue. Returns the number of requeued emails.
+    """
+    count = OutgoingEmail.objects.filter(status=STATUS.sending, lease_expires__lt=now()) \
+        .update(status=STATUS.queued, lease_owner='', lease_expires=None)
+    if count:
+        logger.warning('Requeued %s emails with expired leases' % count)
+    return count
+
+
+def supports_concurrent_workers():
+    """
+    Returns True if the database lets several workers claim queued emails
+    at the same time, see ``claim_queued``.
+    """
+    return db_connection.features.has_select_for_update_skip_locked
+
+
+# Pools kept alive between batches by send_queued(keep_alive=True), keyed
+# by the pid that created them since they can't be used in forked children
+_process_pool = None
+_thread_pool = None
+
+
+def _init_worker_process():
+    # Multiprocessing does not play well with database connection,
+    # persistent workers open their own connection once
+    db_connection.close()
+    # Shutdown is coordinated by the parent process, which may have installed
+    # its own handlers (see send_queued_mail --daemon)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _get_process_pool(processes):
+    global _process_pool
+    if _process_pool is None or _process_pool[0] != os.getpid() or _process_pool[2] != processes:
+        close_pools()
+        db_connection.close()
+        _process_pool = (os.getpid(), Pool(processes, initializer=_init_worker_process), processes)
+    return _process_pool[1]
+
+
+def _get_thread_pool():
+    global _thread_pool
+    if _thread_pool is None or _thread_pool[0] != os.getpid():
+        _thread_pool = (os.getpid(), ThreadPool(get_threads_per_process()))
+    return _thread_pool[1]
+
+
+def close_pools():
+    """
+    Shuts down process and thread pools kept alive by
+    send_queued(keep_alive=True), closes backend connections and writes
+    buffered logs.
+    """
+    global _process_pool, _thread_pool
+    if _process_pool is not None and _process_pool[0] == os.getpid():
+        _process_pool[1].terminate()
+        _process_pool[1].join()
+    _process_pool = None
+    if _thread_pool is not None and _thread_pool[0] == os.getpid():
+        _thread_pool[1].close()
+        _thread_pool[1].join()
+    _thread_pool = None
+    connections.close()
+    flush_logs(force=True)
+
+
+def send_queued(processes=1, log_level=None, keep_alive=False):
     """
     Sends out all queued mails that has scheduled_time less than now or None
+
+    With ``keep_alive``, worker processes, threads and backend connections
+    are reused by the next call instead of being torn down after the batch,
+    call ``close_pools()`` when done.
     """
-    queued_emails = get_queued()
+    release_expired_leases()
+    queued_emails = claim_queued()
     total_sent, total_failed = 0, 0
     total_email = len(queued_emails)
 
@@ -169,20 +408,24 @@ def send_queued(processes=1, log_level=None):
 
     if queued_emails:
 
-        # Don't use more processes than number of emails
-        if total_email < processes:
-            processes = total_email
-
         if processes == 1:
             total_sent, total_failed = _send_bulk(queued_emails,
                                                   uses_multiprocessing=False,
-                                                  log_level=log_level)
+                                                  log_level=log_level,
+                                                  keep_alive=keep_alive)
         else:
-            email_lists = split_emails(queued_emails, processes)
-
-            pool = Pool(processes)
-            results = pool.map(_send_bulk, email_lists)
-            pool.terminate()
+            # Don't use more processes than number of emails
+            email_lists = split_emails_by_backend(queued_emails, min(processes, total_email))
+
+            if keep_alive:
+                pool = _get_process_pool(processes)
+                results = pool.map(partial(_send_bulk, uses_multiprocessing=False, log_level=log_level,
+                                           keep_alive=True, processes=processes), email_lists)
+            else:
+                pool = Pool(min(processes, total_email))
+                results = pool.map(partial(_send_bulk, log_level=log_level,
+                                           processes=min(processes, total_email)), email_lists)
+                pool.terminate()
 
             total_sent = sum([result[0] for result in results])
             total_failed = sum([result[1] for result in results])
@@ -192,10 +435,92 @@ def send_queued(processes=1, log_level=None):
         total_failed
     )
     logger.info(message)
+    log_timings()
+    flush_metrics()
     return (total_sent, total_failed)
 
 
-def _send_bulk(emails, uses_multiprocessing=True, log_level=None):
+class _TrackedMessages(list):
+    """
+    Messages handed to a backend's send_messages(). Backends send messages in
+    the order they iterate them, so ``position`` tells which message an
+    exception was raised for, the messages before it were sent. Iterating
+    also waits until each email's rate limits allow sending it.
+    """
+
+    def __init__(self, emails):
+        super(_TrackedMessages, self).__init__(email.email_message() for email in emails)
+        self.emails = emails
+        self.position = -1
+
+    def __iter__(self):
+        for position, message in enumerate(list.__iter__(self)):
+            self.position = position
+            time.sleep(get_wait_time(self.emails[position]))
+            # The backend asks for the next message once this one is sent
+            with timed_stage('send'):
+                yield message
+
+
+def _send_messages(emails):
+    """
+    Sends prepared emails of one backend alias over this thread's connection,
+    with as few send_messages() calls as possible. If sending a message fails,
+    the following ones are sent with another call.
+
+    Returns a tuple of (sent_emails, failed_emails), failed_emails being
+    (email, exception) pairs.
+    """
+    alias = emails[0].backend_alias or 'default'
+    sent_emails = []
+    failed_emails = []
+    reconnected = False
+    while emails:
+        messages = _TrackedMessages(emails)
+        try:
+            connections[alias].send_messages(messages)
+        except Exception as e:
+            position = messages.position
+            if position > 0:
+                _record_sent(emails[:position], sent_emails)
+                emails = emails[position:]
+                reconnected = False
+            if isinstance(e, SMTPServerDisconnected) and not reconnected:
+                # The server dropped a pooled connection, retry once on a new one
+                reconnected = True
+                try:
+                    connections.reconnect(alias)
+                    continue
+                except Exception as reconnect_error:
+                    e, position = reconnect_error, -1
+            if position < 0:
+                # Raised before sending anything, e.g. while connecting
+                _record_failed(emails, e, failed_emails)
+                break
+            _record_failed(emails[:1], e, failed_emails)
+            emails = emails[1:]
+            reconnected = False
+        else:
+            _record_sent(emails, sent_emails)
+            break
+    return sent_emails, failed_emails
+
+
+def _record_sent(emails, sent_emails):
+    for email in emails:
+        sent_emails.append(email)
+        logger.debug('Successfully sent email #%d' % email.id)
+        email_sent.send(sender=email, outgoing_email=email.email_message())
+
+
+def _record_failed(emails, exception, failed_emails):
+    for email in emails:
+        failed_emails.append((email, exception))
+        logger.debug('Failed to send email #%d' % email.id)
+        email_failed_to_send.send(sender=email, outgoing_email=email.email_message())
+
+
+def _send_bulk(emails, uses_multiprocessing=True, log_level=None, keep_alive=False, processes=1):
     # Multiprocessing does not play well with database connection
     # Fix: Close connections on forking process
     # https://groups.google.com/forum/#!topic/django-users/eCAIY9DAfG0
@@ -211,17 +536,26 @@ def _send_bulk(emails, uses_multiprocessing=True, log_level=None):
 
     logger.info('Process started, sending %s emails' % email_count)
 
-    def send(email):
+    def send(emails):
         try:
-            email.dispatch(log_level=log_level, commit=False)
-            sent_emails.append(email)
-            logger.debug('Successfully sent email #%d' % email.id)
-        except Exception as e:
-            logger.debug('Failed to send email #%d' % email.id)
-            failed_emails.append((email, e))
+            sent, failed = _send_messages(emails)
+        finally:
+            # Every thread gives back the connections it checked out
+            if keep_alive:
+                connections.release()
+            else:
+                connections.close()
+        sent_emails.extend(sent)
+        failed_emails.extend(failed)
 
     # Prepare emails before we send these to threads for sending
     # So we don't need to access the DB from within threads
+    thread_emails = []
+    async_emails = []
+    deferred_emails = []  # Emails over their rate limits, as (email, delay) tuples
+    engines = {}
+    rate_limiter = get_rate_limiter(processes)
+    max_wait = get_rate_limit_max_wait()
     for email in emails:
         # Sometimes this can fail, for example when trying to render
         # email from a faulty Django template
@@ -229,51 +563,119 @@ def _send_bulk(emails, uses_multiprocessing=True, log_level=None):
             email.prepare_email_message()
         except Exception as e:
             failed_emails.append((email, e))
-
-    number_of_threads = min(get_threads_per_process(), email_count)
-    pool = ThreadPool(number_of_threads)
-
-    pool.map(send, emails)
-    pool.close()
-    pool.join()
-
-    connections.close()
-
-    # Update statuses of sent and failed emails
-    email_ids = [email.id for email in sent_emails]
-    OutgoingEmail.objects.filter(id__in=email_ids).update(status=STATUS.sent)
-
-    email_ids = [email.id for (email, e) in failed_emails]
-    OutgoingEmail.objects.filter(id__in=email_ids).update(status=STATUS.failed)
+            continue
+
+        reserved, delay = rate_limiter.reserve(email, max_wait)
+        if not reserved:
+            deferred_emails.append((email, delay))
+            continue
+        email._send_after = time.monotonic() + delay if delay else None
+
+        alias = email.backend_alias or 'default'
+        if alias not in engines:
+            engines[alias] = get_engine(alias)
+        if engines[alias] == ASYNCIO:
+            async_emails.append(email)
+        else:
+            thread_emails.append(email)
+
+    if async_emails:
+        sent, failed = send_with_asyncio(async_emails)
+        sent_emails.extend(sent)
+        failed_emails.extend(failed)
+
+    # Each thread hands a run of emails of one backend to send_messages()
+    groups = {}
+    for email in thread_emails:
+        groups.setdefault(email.backend_alias or 'default', []).append(email)
+    thread_count = min(get_threads_per_process(), len(thread_emails))
+    chunks = []
+    for group in groups.values():
+        chunks.extend(split_contiguous(group, min(thread_count, len(group))))
+
+    if chunks and keep_alive:
+        _get_thread_pool().map(send, chunks)
+    elif chunks:
+        pool = ThreadPool(thread_count)
+
+        pool.map(send, chunks)
+        pool.close()
+        pool.join()
+
+    with timed_stage('status_update'):
+        retried_emails = _update_statuses(emails, sent_emails, failed_emails, deferred_emails)
 
     # If log level is 0, log nothing, 1 logs only sending failures
     # and 2 means log both successes and failures
+    log_writer = get_log_writer()
     if log_level >= 1:
-
-        logs = []
         for (email, exception) in failed_emails:
-            logs.append(
-                Log(email=email, status=STATUS.failed,
-                    message=str(exception),
-                    exception_type=type(exception).__name__)
-            )
-
-        if logs:
-            Log.objects.bulk_create(logs)
+            log_writer.add(email, STATUS.failed, message=str(exception),
+                           exception_type=type(exception).__name__)
 
     if log_level == 2:
-
-        logs = []
         for email in sent_emails:
-            logs.append(Log(email=email, status=STATUS.sent))
+            log_writer.add_sent(email)
 
-        if logs:
-            Log.objects.bulk_create(logs)
+    # Logs are kept for later batches only by a single sending process kept
+    # alive, worker processes may be terminated before flushing
+    flush_logs(force=not keep_alive or uses_multiprocessing or processes > 1)
 
     logger.info(
-        'Process finished, %s attempted, %s sent, %s failed' % (
-            email_count, len(sent_emails), len(failed_emails)
+        'Process finished, %s attempted, %s sent, %s failed, %s deferred by rate limits, '
+        '%s will be retried' % (
+            email_count, len(sent_emails), len(failed_emails), len(deferred_emails), len(retried_emails)
         )
     )
+    if uses_multiprocessing or processes > 1:
+        # Timings of worker processes are logged by each of them
+        log_timings()
+        flush_metrics()
 
     return len(sent_emails), len(failed_emails)
+
+
+def _update_statuses(emails, sent_emails, failed_emails, deferred_emails):
+    """
+    Updates statuses of sent and failed emails, queues retried and deferred
+    emails again, returns the retried emails. Rows whose lease expired and
+    were claimed by another worker in the meantime are left alone.
+    """
+    lease_owners = set(email.lease_owner for email in emails)
+
+    email_ids = [email.id for email in sent_emails]
+    OutgoingEmail.objects.filter(id__in=email_ids, lease_owner__in=lease_owners) \
+        .update(status=STATUS.sent, attempts=F('attempts') + 1, next_retry=None,
+                lease_owner='', lease_expires=None)
+
+    # Emails failing with a transient error are queued again for a later retry,
+    # emails over their rate limits too, without counting an attempt
+    retried_emails = []
+    for (email, delay) in deferred_emails:
+        email.status = STATUS.queued
+        email.next_retry = now() + datetime.timedelta(seconds=delay)
+        retried_emails.append(email)
+    email_ids = []
+    for (email, exception) in failed_emails:
+        email.attempts += 1
+        email.status, email.next_retry = email.get_failure_status(exception)
+        if email.status == STATUS.queued:
+            retried_emails.append(email)
+        else:
+            email_ids.append(email.id)
+    OutgoingEmail.objects.filter(id__in=email_ids, lease_owner__in=lease_owners) \
+        .update(status=STATUS.failed, attempts=F('attempts') + 1, next_retry=None,
+                lease_owner='', lease_expires=None)
+
+    if retried_emails:
+        # Each email has its own retry time, so they are updated in one CASE query
+        owned_ids = set(OutgoingEmail.objects.filter(id__in=[email.id for email in retried_emails],
+                                                     lease_owner__in=lease_owners)
+                        .values_list('id', flat=True))
+        retried_emails = [email for email in retried_emails if email.id in owned_ids]
+        for email in retried_emails:
+            email.lease_owner = ''
+            email.lease_expires = None
+        OutgoingEmail.objects.bulk_update(retried_emails, ['status', 'attempts', 'next_retry',
+                                                           'lease_owner', 'lease_expires'])
+    return retried_emails
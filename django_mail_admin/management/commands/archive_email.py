@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from django_mail_admin.archive import archive_emails
+
+
+class Command(BaseCommand):
+    help = 'Move sent and failed emails and their logs out of the queue into the archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-d', '--days',
+                            type=int,
+                            default=7,
+                            help="Archive mails last updated more than this many days ago, defaults to 7."
+                            )
+        parser.add_argument('-c', '--chunk-size',
+                            type=int,
+                            help="Mails archived per transaction, defaults to the ARCHIVE_CHUNK_SIZE setting.")
+
+    def handle(self, verbosity, days, chunk_size, **options):
+        cutoff_date = now() - datetime.timedelta(days)
+        total = 0
+        for archived in archive_emails(cutoff_date, chunk_size):
+            total += archived
+            if verbosity > 1:
+                print("Archived {0} outgoing mails".format(total))
+        print("Archived {0} outgoing mails last updated before {1} ".format(total, cutoff_date))
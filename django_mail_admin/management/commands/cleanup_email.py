@@ -3,11 +3,12 @@ import datetime
 from django.core.management.base import BaseCommand
 from django.utils.timezone import now
 
-from django_mail_admin.models import OutgoingEmail, IncomingEmail
+from django_mail_admin.cleanup import delete_outgoing_emails, delete_archived_emails, delete_incoming_emails
+from django_mail_admin.models import delete_unused_attachments
 
 
 class Command(BaseCommand):
-    help = 'Place deferred messages back in the queue.'
+    help = 'Delete mails older than a number of days, in chunks.'
 
     def add_arguments(self, parser):
         parser.add_argument('-d', '--days',
@@ -23,17 +24,39 @@ class Command(BaseCommand):
                             type=bool,
                             default=True,
                             help="Cleanup outgoing mails, defaults to False")
+        parser.add_argument('-c', '--chunk-size',
+                            type=int,
+                            default=1000,
+                            help="Mails deleted per transaction, defaults to 1000.")
+        parser.add_argument('-p', '--pause',
+                            type=float,
+                            default=0,
+                            help="Seconds to wait between chunks, defaults to 0.")
 
-    def handle(self, verbosity, days, incoming, outgoing, **options):
-        # Delete mails and their related logs and queued created before X days
+    def handle(self, verbosity, days, incoming, outgoing, chunk_size, pause, **options):
+        # Delete mails and their related logs and queued created before X days.
+        # Every chunk is committed, an interrupted cleanup resumes when run again.
         if not incoming and not outgoing:
             print("Please select either incoming or outgoing emails to delete. Exiting...")
         cutoff_date = now() - datetime.timedelta(days)
         if outgoing:
-            count_outgoing = OutgoingEmail.objects.filter(created__lt=cutoff_date).count()
-            OutgoingEmail.objects.only('id').filter(created__lt=cutoff_date).delete()
+            count_outgoing = self.delete(delete_outgoing_emails(cutoff_date, chunk_size, pause),
+                                         'outgoing', verbosity)
             print("Deleted {0} outgoing mails created before {1} ".format(count_outgoing, cutoff_date))
+            count_archived = self.delete(delete_archived_emails(cutoff_date, chunk_size, pause),
+                                         'archived', verbosity)
+            print("Deleted {0} archived mails created before {1} ".format(count_archived, cutoff_date))
+            count_attachments = delete_unused_attachments(cutoff_date, chunk_size)
+            print("Deleted {0} attachments unused since {1} ".format(count_attachments, cutoff_date))
         if incoming:
-            count_incoming = IncomingEmail.objects.filter(processed__lt=cutoff_date).count()
-            IncomingEmail.objects.only('id').filter(processed__lt=cutoff_date).delete()
+            count_incoming = self.delete(delete_incoming_emails(cutoff_date, chunk_size, pause),
+                                         'incoming', verbosity)
             print("Deleted {0} incoming mails processed before {1} ".format(count_incoming, cutoff_date))
+
+    def delete(self, chunks, kind, verbosity):
+        total = 0
+        for deleted in chunks:
+            total += deleted
+            if verbosity > 1:
+                print("Deleted {0} {1} mails so far".format(total, kind))
+        return total
@@ -1,31 +1,86 @@
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection as db_connection
 
 from django_mail_admin.models import Mailbox
+from django_mail_admin.settings import get_mailbox_poll_workers, get_mailbox_timeout
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
+def poll_mailbox(mailbox, timeout):
+    """
+    Receives the new mail of ``mailbox`` over its own database connection.
+    Returns (messages received, seconds taken, exception raised or None).
+    """
+    start = time.monotonic()
+    close_old_connections()
+    try:
+        messages = mailbox.get_new_mail(timeout=timeout)
+    except Exception as e:
+        return 0, time.monotonic() - start, e
+    finally:
+        # Pool threads would keep their connections open otherwise
+        db_connection.close()
+    for message in messages:
+        logger.info(
+            'Received %s (from %s)',
+            message.subject,
+            message.from_address
+        )
+    return len(messages), time.monotonic() - start, None
+
+
 class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('mailboxes', nargs='*', help='Name of the mailbox to poll, defaults to all active ones')
+        parser.add_argument(
+            '-w', '--workers',
+            type=int,
+            help='Number of mailboxes polled at once, defaults to MAILBOX_POLL_WORKERS',
+        )
+        parser.add_argument(
+            '-t', '--timeout',
+            type=float,
+            help='Seconds a network operation of a mailbox may take, defaults to MAILBOX_TIMEOUT',
+        )
+
     def handle(self, *args, **options):
         mailboxes = Mailbox.active_mailboxes.all()
-        if args:
+        if options['mailboxes']:
             mailboxes = mailboxes.filter(
-                name=' '.join(args)
+                name=' '.join(options['mailboxes'])
             )
-        for mailbox in mailboxes:
-            logger.info(
-                'Gathering messages for %s',
-                mailbox.name
-            )
-            messages = mailbox.get_new_mail()
-            for message in messages:
-                logger.info(
-                    'Received %s (from %s)',
-                    message.subject,
-                    message.from_address
-                )
-            if len(messages) == 0:
-                logger.info('No new mail for %s', mailbox.name)
+        mailboxes = list(mailboxes)
+        if not mailboxes:
+            return
+        timeout = options['timeout'] or get_mailbox_timeout()
+        workers = min(options['workers'] or get_mailbox_poll_workers(), len(mailboxes))
+
+        logger.info('Gathering messages for %d mailboxes with %d workers', len(mailboxes), workers)
+        start = time.monotonic()
+        received = 0
+        failed = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = dict((executor.submit(poll_mailbox, mailbox, timeout), mailbox) for mailbox in mailboxes)
+            for future in as_completed(futures):
+                mailbox = futures[future]
+                count, duration, error = future.result()
+                if error is not None:
+                    failed.append(mailbox.name)
+                    logger.error('Failed to get new mail for %s after %.2fs: %s', mailbox.name, duration, error,
+                                 exc_info=error)
+                elif count:
+                    received += count
+                    logger.info('%d new messages for %s in %.2fs', count, mailbox.name, duration)
+                else:
+                    logger.info('No new mail for %s (%.2fs)', mailbox.name, duration)
+        logger.info('Received %d messages from %d mailboxes in %.2fs, %d failed',
+                    received, len(mailboxes), time.monotonic() - start, len(failed))
+        if failed:
+            # Lets cron and supervisors notice, the other mailboxes were polled anyway
+            raise CommandError('Failed to get new mail for %s' % ', '.join(sorted(failed)))
@@ -0,0 +1,113 @@
+import imaplib
+import logging
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection as db_connection
+
+from django_mail_admin.models import Mailbox
+from django_mail_admin.settings import get_imap_idle_keepalive
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+# Seconds to wait before reconnecting, doubled after every failed attempt
+MIN_RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 300
+
+
+class Command(BaseCommand):
+    help = 'Keeps an IMAP IDLE session open for every active IMAP mailbox and receives new mail as soon as it arrives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('mailboxes', nargs='*', help='Names of the mailboxes to listen to, defaults to all')
+        parser.add_argument(
+            '-k', '--keepalive',
+            type=float,
+            help='Seconds after which IDLE is restarted, defaults to IMAP_IDLE_KEEPALIVE',
+        )
+
+    def handle(self, *args, **options):
+        mailboxes = Mailbox.active_mailboxes.all()
+        if options['mailboxes']:
+            mailboxes = mailboxes.filter(name=' '.join(options['mailboxes']))
+        mailboxes = [mailbox for mailbox in mailboxes if mailbox.uri and mailbox.type in ('imap', 'gmail')]
+        if not mailboxes:
+            logger.info('No active IMAP mailboxes.')
+            return
+
+        keepalive = options['keepalive'] or get_imap_idle_keepalive()
+        self.stopping = threading.Event()
+        # Writing to it ends the IDLE of every thread
+        self.interrupt, interrupt_writer = socket.socketpair()
+
+        def stop(signum, frame):
+            logger.info('Received signal %s, stopping.' % signum)
+            self.stopping.set()
+            interrupt_writer.send(b'x')
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        threads = [threading.Thread(target=self.listen, args=(mailbox, keepalive), name='idle-%s' % mailbox.pk)
+                   for mailbox in mailboxes]
+        for thread in threads:
+            thread.start()
+        try:
+            # Signals are only handled by the main thread, which mustn't
+            # block in join() without a timeout
+            while any(thread.is_alive() for thread in threads):
+                self.stopping.wait(1)
+            for thread in threads:
+                thread.join()
+        finally:
+            self.interrupt.close()
+            interrupt_writer.close()
+        logger.info('Stopped listening.')
+
+    def listen(self, mailbox, keepalive):
+        """
+        Receives new mail of ``mailbox`` until stopped, reconnecting if the
+        connection or receiving fails
+        """
+        delay = MIN_RECONNECT_DELAY
+        try:
+            while not self.stopping.is_set():
+                connection = None
+                try:
+                    connection = mailbox.get_connection()
+                    if not connection.supports_idle():
+                        logger.warning('%s does not support IDLE, poll it with get_new_mail.', mailbox.name)
+                        return
+                    # Catch up with the mail received while disconnected
+                    self.receive(mailbox, connection)
+                    delay = MIN_RECONNECT_DELAY
+                    while not self.stopping.is_set():
+                        if connection.idle(keepalive, self.interrupt):
+                            self.receive(mailbox, connection)
+                except Exception as e:
+                    logger.warning('Listening to %s failed (%s), reconnecting in %ds.', mailbox.name, e, delay,
+                                   exc_info=not isinstance(e, (imaplib.IMAP4.error, OSError)))
+                    self.stopping.wait(delay)
+                    delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                finally:
+                    if connection is not None:
+                        close_quietly(connection)
+        finally:
+            db_connection.close()
+
+    def receive(self, mailbox, connection):
+        # The database connection may have timed out while idling
+        close_old_connections()
+        messages = mailbox.get_new_mail(connection=connection)
+        for message in messages:
+            logger.info('Received %s (from %s) in %s', message.subject, message.from_address, mailbox.name)
+
+
+def close_quietly(connection):
+    try:
+        connection.server.logout()
+    except (imaplib.IMAP4.error, OSError):
+        pass
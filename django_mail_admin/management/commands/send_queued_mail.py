@@ -1,15 +1,18 @@
+import signal
 import sys
 import tempfile
 
 from django.core.management.base import BaseCommand
-from django.db import connection
-from django.db.models import Q
+from django.db import close_old_connections
 from django.utils.timezone import now
 
+from django_mail_admin.instrumentation import enable_timings
 from django_mail_admin.lockfile import FileLock, FileLocked
 from django_mail_admin.logutils import setup_loghandlers
-from django_mail_admin.mail import send_queued
+from django_mail_admin.logwriter import flush_logs
+from django_mail_admin.mail import send_queued, supports_concurrent_workers, close_pools, get_due
 from django_mail_admin.models import OutgoingEmail, STATUS
+from django_mail_admin.wakeup import WakeupListener
 
 logger = setup_loghandlers()
 default_lockfile = tempfile.gettempdir() + "/django_mail_admin"
@@ -33,27 +36,115 @@ class Command(BaseCommand):
             type=int,
             help='"0" to log nothing, "1" to only log errors',
         )
+        parser.add_argument(
+            '-d', '--daemon',
+            action='store_true',
+            help='Keep running and send emails as soon as they are queued',
+        )
+        parser.add_argument(
+            '--max-sleep',
+            type=float,
+            default=60,
+            help='In daemon mode, longest time in seconds to wait before checking the queue again',
+        )
+        parser.add_argument(
+            '--log-timings',
+            action='store_true',
+            help='Log p50/p95/max timings of every sending stage after each batch',
+        )
 
     def handle(self, *args, **options):
+        run = self.run_daemon if options['daemon'] else self.send_all
+        if options['log_timings']:
+            enable_timings()
+
+        if supports_concurrent_workers():
+            # Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any
+            # number of workers can run side by side without a lock.
+            run(options)
+            return
+
         logger.info('Acquiring lock for sending queued emails at %s.lock' %
                     options['lockfile'])
         try:
             with FileLock(options['lockfile']):
-
-                while 1:
-                    try:
-                        send_queued(options['processes'],
-                                    options.get('log_level'))
-                    except Exception as e:
-                        logger.error(e, exc_info=sys.exc_info(),
-                                     extra={'status_code': 500})
-                        raise
-
-                    # Close DB connection to avoid multiprocessing errors
-                    connection.close()
-
-                    if not OutgoingEmail.objects.filter(status=STATUS.queued) \
-                        .filter(Q(scheduled_time__lte=now()) | Q(scheduled_time=None)).exists():
-                        break
+                run(options)
         except FileLocked:
             logger.info('Failed to acquire lock, terminating now.')
+
+    def run_daemon(self, options):
+        """
+        Sends queued emails until SIGTERM/SIGINT. Pools and connections are
+        kept between batches; when the queue is drained, sleeps until the next
+        scheduled email is due or ``email_queued`` wakes it up.
+        """
+        self.stopping = False
+        listener = WakeupListener()
+
+        def stop(signum, frame):
+            logger.info('Received signal %s, finishing current batch.' % signum)
+            self.stopping = True
+            listener.interrupt()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        listener.open()
+        try:
+            while not self.stopping:
+                close_old_connections()
+                try:
+                    send_queued(options['processes'], options.get('log_level'), keep_alive=True)
+                except Exception as e:
+                    # Don't let a transient error (e.g. lost database
+                    # connection) kill the daemon
+                    logger.error(e, exc_info=sys.exc_info(),
+                                 extra={'status_code': 500})
+                    listener.wait(min(options['max_sleep'], 5))
+                    continue
+
+                if self.stopping or self.has_due_emails():
+                    continue
+
+                # Pools stay up while idle, connections idle for longer than
+                # CONNECTION_IDLE_TIMEOUT are replaced when they are checked out
+                flush_logs(force=True)
+                listener.wait(self.get_sleep_time(options['max_sleep']))
+        finally:
+            close_pools()
+            listener.close()
+        logger.info('Stopped sending queued emails.')
+
+    def has_due_emails(self):
+        return get_due().exists()
+
+    def get_sleep_time(self, max_sleep):
+        current_time = now()
+        queued = OutgoingEmail.objects.filter(status=STATUS.queued)
+        next_times = [
+            queued.filter(scheduled_time__gt=current_time).order_by('scheduled_time')
+                  .values_list('scheduled_time', flat=True).first(),
+            queued.filter(next_retry__gt=current_time).order_by('next_retry')
+                  .values_list('next_retry', flat=True).first(),
+        ]
+        next_times = [next_time for next_time in next_times if next_time is not None]
+        if not next_times:
+            return max_sleep
+        return max(0, min(max_sleep, (min(next_times) - current_time).total_seconds()))
+
+    def send_all(self, options):
+        try:
+            while 1:
+                try:
+                    # Reuse processes and connections between batches
+                    send_queued(options['processes'],
+                                options.get('log_level'), keep_alive=True)
+                except Exception as e:
+                    logger.error(e, exc_info=sys.exc_info(),
+                                 extra={'status_code': 500})
+                    raise
+
+                if not self.has_due_emails():
+                    break
+        finally:
+            close_pools()
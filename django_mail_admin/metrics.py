@@ -0,0 +1,168 @@
+import bisect
+from threading import Lock
+
+from django.db.models import Count, Min
+from django.utils.timezone import now
+
+from .instrumentation import STAGES
+from .models import OutgoingEmail, PRIORITY, STATUS
+from .settings import get_available_backends, get_cache_backend, get_metrics_buckets, get_metrics_cache_timeout
+
+# Counters and histograms are recorded in memory by every sending process and
+# added to counters in the django_mail_admin cache by flush_metrics(), so the
+# metrics view sees all processes. Queue gauges are computed by the view and
+# cached for METRICS_CACHE_TIMEOUT seconds.
+KEY_PREFIX = 'django_mail_admin:metrics:'
+QUEUE_KEY = KEY_PREFIX + 'queue'
+RESULTS = ['sent', 'failed']
+# Durations are stored as integer microseconds, caches only increment integers
+MICROSECONDS = 1000000
+
+cache_backend = get_cache_backend()
+_recorder = None
+
+
+def attempts_key(backend_alias, result):
+    return KEY_PREFIX + 'attempts:%s:%s' % (backend_alias, result)
+
+
+def bucket_key(stage, bucket):
+    # ``bucket`` is the index of the upper bound, len(buckets) counts the rest
+    return KEY_PREFIX + 'bucket:%s:%d' % (stage, bucket)
+
+
+def sum_key(stage):
+    return KEY_PREFIX + 'sum:%s' % stage
+
+
+class MetricsRecorder(object):
+    """
+    Counts send attempts per backend alias and result, and the durations
+    of stage_timed in histograms, until flush() adds them to the cache.
+    """
+
+    def __init__(self):
+        self.buckets = get_metrics_buckets()
+        self.counts = {}
+        self.lock = Lock()
+
+    def _add(self, key, value=1):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def email_sent(self, sender, **kwargs):
+        self._add(attempts_key(sender.backend_alias or 'default', 'sent'))
+
+    def email_failed(self, sender, **kwargs):
+        self._add(attempts_key(sender.backend_alias or 'default', 'failed'))
+
+    def stage_timed(self, sender, stage, duration, **kwargs):
+        self._add(bucket_key(stage, bisect.bisect_left(self.buckets, duration)))
+        self._add(sum_key(stage), int(duration * MICROSECONDS))
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, {}
+        if cache_backend is None:
+            return
+        for key, value in counts.items():
+            # Counters never expire, scrapers handle resets if they're evicted
+            cache_backend.add(key, 0, timeout=None)
+            try:
+                cache_backend.incr(key, value)
+            except ValueError:
+                # Evicted between add() and incr()
+                cache_backend.add(key, value, timeout=None)
+
+
+def enable_metrics():
+    """Starts recording send attempts and stage timings in this process"""
+    from .signals import email_sent, email_failed_to_send, stage_timed
+
+    global _recorder
+    if _recorder is None:
+        _recorder = MetricsRecorder()
+        email_sent.connect(_recorder.email_sent, weak=False, dispatch_uid='django_mail_admin_metrics_sent')
+        email_failed_to_send.connect(_recorder.email_failed, weak=False,
+                                     dispatch_uid='django_mail_admin_metrics_failed')
+        stage_timed.connect(_recorder.stage_timed, weak=False, dispatch_uid='django_mail_admin_metrics_stages')
+    return _recorder
+
+
+def flush_metrics():
+    """Adds the metrics recorded by this process to the cache, if enabled"""
+    if _recorder is not None:
+        _recorder.flush()
+
+
+def get_queue_stats():
+    """
+    Returns a dict with the number of queued, sending and failed emails per
+    (status, priority, backend alias) and the creation time of the oldest
+    queued email, cached for METRICS_CACHE_TIMEOUT seconds
+    """
+    stats = cache_backend.get(QUEUE_KEY) if cache_backend is not None else None
+    if stats is not None:
+        return stats
+    counts = OutgoingEmail.objects.filter(status__in=[STATUS.queued, STATUS.sending, STATUS.failed]) \
+        .values_list('status', 'priority', 'backend_alias').annotate(count=Count('id')).order_by()
+    stats = {
+        'counts': [(status, priority, backend_alias or 'default', count)
+                   for status, priority, backend_alias, count in counts],
+        'oldest_queued': OutgoingEmail.objects.filter(status=STATUS.queued).aggregate(oldest=Min('created'))['oldest'],
+    }
+    if cache_backend is not None:
+        cache_backend.set(QUEUE_KEY, stats, get_metrics_cache_timeout())
+    return stats
+
+
+def format_labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{%s}' % ','.join('%s="%s"' % (name, escape(value)) for name, value in sorted(labels.items()))
+
+
+def render_metrics():
+    """Returns the metrics in the Prometheus text exposition format"""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s %s' % (name, kind))
+        for suffix, labels, value in samples:
+            lines.append('%s%s%s %s' % (name, suffix, format_labels(**labels) if labels else '', value))
+
+    stats = get_queue_stats()
+    statuses = dict((value, name) for name, value in STATUS._asdict().items())
+    priorities = dict((value, name) for name, value in PRIORITY._asdict().items())
+    metric('django_mail_admin_emails', 'gauge', 'Queued, sending and failed emails.', [
+        ('', dict(status=statuses[status], priority=priorities.get(priority, 'none'), backend=backend_alias), count)
+        for status, priority, backend_alias, count in stats['counts']
+    ])
+    oldest = stats['oldest_queued']
+    metric('django_mail_admin_oldest_queued_email_age_seconds', 'gauge', 'Age of the oldest queued email.',
+           [('', {}, '%.3f' % ((now() - oldest).total_seconds() if oldest is not None else 0))])
+
+    buckets = get_metrics_buckets()
+    aliases = sorted(get_available_backends())
+    keys = [attempts_key(alias, result) for alias in aliases for result in RESULTS]
+    for stage in STAGES:
+        keys += [bucket_key(stage, bucket) for bucket in range(len(buckets) + 1)] + [sum_key(stage)]
+    values = cache_backend.get_many(keys) if cache_backend is not None else {}
+
+    metric('django_mail_admin_send_attempts_total', 'counter', 'Attempts to send an email, by result.', [
+        ('', dict(backend=alias, result=result), values.get(attempts_key(alias, result), 0))
+        for alias in aliases for result in RESULTS
+    ])
+
+    samples = []
+    for stage in STAGES:
+        total = 0
+        for bucket, bound in enumerate(buckets + [None]):
+            total += values.get(bucket_key(stage, bucket), 0)
+            samples.append(('_bucket', dict(stage=stage, le='+Inf' if bound is None else repr(float(bound))), total))
+        samples.append(('_sum', dict(stage=stage), '%.6f' % (values.get(sum_key(stage), 0) / MICROSECONDS)))
+        samples.append(('_count', dict(stage=stage), total))
+    metric('django_mail_admin_stage_duration_seconds', 'histogram',
+           'Duration of the sending stages, "send" is the SMTP transaction of a message.', samples)
+    return '\n'.join(lines) + '\n'
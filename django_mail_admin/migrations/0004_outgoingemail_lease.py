@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_admin', '0003_outgoingemail_sending_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='lease_expires',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Lease expires'),
+        ),
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='lease_owner',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Lease owner'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations
+import jsonfield.fields
+
+
+CHUNK_SIZE = 500
+
+
+def copy_variables_to_context(apps, schema_editor):
+    OutgoingEmail = apps.get_model('django_mail_admin', 'OutgoingEmail')
+    TemplateVariable = apps.get_model('django_mail_admin', 'TemplateVariable')
+
+    # Emails are handled CHUNK_SIZE at a time, each chunk's variables are
+    # deleted before the next one is read, so memory use doesn't grow with
+    # the table
+    variables = TemplateVariable.objects.filter(email__isnull=False)
+    last_id = 0
+    while True:
+        email_ids = list(variables.filter(email_id__gt=last_id).order_by('email_id')
+                         .values_list('email_id', flat=True).distinct()[:CHUNK_SIZE])
+        if not email_ids:
+            return
+        last_id = email_ids[-1]
+
+        chunk = variables.filter(email_id__in=email_ids)
+        contexts = {}
+        for email_id, name, value in chunk.order_by('id').values_list('email_id', 'name', 'value').iterator():
+            contexts.setdefault(email_id, {})[name] = value
+        emails = list(OutgoingEmail.objects.filter(id__in=email_ids).only('id'))
+        for email in emails:
+            email.context = contexts[email.id]
+        OutgoingEmail.objects.bulk_update(emails, ['context'])
+        chunk.delete()
+
+
+def copy_context_to_variables(apps, schema_editor):
+    OutgoingEmail = apps.get_model('django_mail_admin', 'OutgoingEmail')
+    TemplateVariable = apps.get_model('django_mail_admin', 'TemplateVariable')
+
+    emails = OutgoingEmail.objects.filter(context__isnull=False).only('id', 'context')
+    variables = []
+    for email in emails.iterator(CHUNK_SIZE):
+        for name, value in (email.context or {}).items():
+            variables.append(TemplateVariable(email_id=email.id, name=name, value=str(value)))
+        if len(variables) >= CHUNK_SIZE:
+            TemplateVariable.objects.bulk_create(variables)
+            variables = []
+    TemplateVariable.objects.bulk_create(variables)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_admin', '0004_outgoingemail_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='context',
+            field=jsonfield.fields.JSONField(blank=True, help_text='Variables used to render the template', null=True, verbose_name='Context'),
+        ),
+        migrations.RunPython(copy_variables_to_context, copy_context_to_variables),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_admin', '0005_outgoingemail_context'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=64, verbose_name='Content hash'),
+        ),
+    ]
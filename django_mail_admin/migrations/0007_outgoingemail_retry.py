@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_admin', '0006_attachment_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Attempts'),
+        ),
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='next_retry',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Next retry'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_admin', '0007_outgoingemail_retry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='outgoingemail',
+            index=models.Index(condition=models.Q(('next_retry', None), ('scheduled_time', None)), fields=['status', '-priority', 'id'], name='mail_admin_queue_ready_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outgoingemail',
+            index=models.Index(condition=models.Q(('scheduled_time__isnull', False)), fields=['status', 'scheduled_time'], name='mail_admin_queue_scheduled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outgoingemail',
+            index=models.Index(condition=models.Q(('next_retry__isnull', False), ('scheduled_time', None)), fields=['status', 'next_retry'], name='mail_admin_queue_retry_idx'),
+        ),
+    ]
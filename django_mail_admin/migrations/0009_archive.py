@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:07
+
+import django.db.models.deletion
+import django_mail_admin.fields
+import jsonfield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_admin', '0008_queue_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email_id', models.PositiveIntegerField(db_index=True, verbose_name='Outgoing email id')),
+                ('from_email', models.CharField(max_length=254, verbose_name='From email')),
+                ('to', django_mail_admin.fields.CommaSeparatedEmailField(blank=True, verbose_name='To email(s)')),
+                ('cc', django_mail_admin.fields.CommaSeparatedEmailField(blank=True, verbose_name='Cc')),
+                ('bcc', django_mail_admin.fields.CommaSeparatedEmailField(blank=True, verbose_name='Bcc')),
+                ('subject', models.CharField(blank=True, max_length=989, verbose_name='Subject')),
+                ('message', models.TextField(blank=True, verbose_name='Message')),
+                ('html_message', models.TextField(blank=True, verbose_name='HTML Message')),
+                ('headers', jsonfield.fields.JSONField(blank=True, null=True, verbose_name='Headers')),
+                ('context', jsonfield.fields.JSONField(blank=True, null=True, verbose_name='Context')),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'sent'), (1, 'failed')], verbose_name='Status')),
+                ('priority', models.PositiveSmallIntegerField(blank=True, choices=[(0, 'low'), (1, 'medium'), (2, 'high'), (3, 'now')], null=True, verbose_name='Priority')),
+                ('backend_alias', models.CharField(blank=True, default='', max_length=64, verbose_name='Backend alias')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('created', models.DateTimeField(db_index=True, verbose_name='Created')),
+                ('last_updated', models.DateTimeField(verbose_name='Last updated')),
+                ('scheduled_time', models.DateTimeField(blank=True, null=True, verbose_name='The scheduled sending time')),
+                ('archived', models.DateTimeField(db_index=True, verbose_name='Archived')),
+                ('attachments', models.ManyToManyField(blank=True, related_name='archived_emails', to='django_mail_admin.attachment', verbose_name='Attachments')),
+                ('template', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='django_mail_admin.emailtemplate', verbose_name='Template')),
+            ],
+            options={
+                'verbose_name': 'Archived email',
+                'verbose_name_plural': 'Archived emails',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLog',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(verbose_name='Date')),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'sent'), (1, 'failed')], verbose_name='Status')),
+                ('exception_type', models.CharField(blank=True, max_length=255, verbose_name='Exception type')),
+                ('message', models.TextField(verbose_name='Message')),
+                ('email', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='logs', to='django_mail_admin.archivedemail', verbose_name='Email address')),
+            ],
+            options={
+                'verbose_name': 'Archived log',
+                'verbose_name_plural': 'Archived logs',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_admin', '0009_archive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='log',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.CreateModel(
+            name='LogCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute', models.DateTimeField(db_index=True, verbose_name='Minute')),
+                ('backend_alias', models.CharField(blank=True, default='', max_length=64, verbose_name='Backend alias')),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'sent'), (1, 'failed')], verbose_name='Status')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Count')),
+            ],
+            options={
+                'verbose_name': 'Log counter',
+                'verbose_name_plural': 'Log counters',
+                'unique_together': {('minute', 'backend_alias', 'status')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_admin', '0010_log_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailbox',
+            name='last_uid',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='The highest IMAP UID processed, the next poll only fetches messages after it.', null=True, verbose_name='Last UID'),
+        ),
+        migrations.AddField(
+            model_name='mailbox',
+            name='uid_validity',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='UIDVALIDITY of the IMAP folder when it was last polled.', null=True, verbose_name='UIDVALIDITY'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_admin', '0011_mailbox_sync_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='last_used',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, verbose_name='Last used'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_admin', '0012_attachment_last_used'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='outgoingemail',
+            name='mail_admin_queue_scheduled_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='outgoingemail',
+            name='mail_admin_queue_retry_idx',
+        ),
+        migrations.AddIndex(
+            model_name='outgoingemail',
+            index=models.Index(condition=models.Q(('scheduled_time__isnull', False)), fields=['status', '-priority', 'id'], name='mail_admin_queue_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outgoingemail',
+            index=models.Index(condition=models.Q(('next_retry__isnull', False), ('scheduled_time', None)), fields=['status', '-priority', 'id'], name='mail_admin_queue_retried_idx'),
+        ),
+    ]
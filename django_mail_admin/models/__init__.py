@@ -3,3 +3,4 @@ from .outgoing import *
 from .incoming import *
 from .templates import *
 from .logs import *
+from .archive import *
@@ -0,0 +1,72 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+from jsonfield import JSONField
+
+from django_mail_admin.fields import CommaSeparatedEmailField
+from django_mail_admin.utils import STATUS
+from .outgoing import OutgoingEmail, Attachment
+from .templates import EmailTemplate
+
+
+class ArchivedEmail(models.Model):
+    """
+    A sent or failed OutgoingEmail moved out of the queue table by
+    archive.archive_emails(), together with its logs.
+    """
+    PRIORITY_CHOICES = OutgoingEmail.PRIORITY_CHOICES
+    STATUS_CHOICES = [(STATUS.sent, _("sent")), (STATUS.failed, _("failed"))]
+
+    # The id of the OutgoingEmail, which isn't reused as primary key because
+    # some databases (e.g. SQLite) may give it to a new email
+    email_id = models.PositiveIntegerField(_('Outgoing email id'), db_index=True)
+    from_email = models.CharField(_("From email"), max_length=254)
+    to = CommaSeparatedEmailField(_("To email(s)"))
+    cc = CommaSeparatedEmailField(_("Cc"))
+    bcc = CommaSeparatedEmailField(_("Bcc"))
+    template = models.ForeignKey(EmailTemplate, verbose_name=_("Template"), null=True, blank=True,
+                                 on_delete=models.SET_NULL)
+    subject = models.CharField(_("Subject"), max_length=989, blank=True)
+    message = models.TextField(_("Message"), blank=True)
+    html_message = models.TextField(_("HTML Message"), blank=True)
+    headers = JSONField(_('Headers'), blank=True, null=True)
+    # Includes the TemplateVariables of the email
+    context = JSONField(_('Context'), blank=True, null=True)
+    status = models.PositiveSmallIntegerField(_("Status"), choices=STATUS_CHOICES)
+    priority = models.PositiveSmallIntegerField(_("Priority"), choices=PRIORITY_CHOICES,
+                                                blank=True, null=True)
+    backend_alias = models.CharField(_('Backend alias'), max_length=64, blank=True, default='')
+    attempts = models.PositiveIntegerField(_('Attempts'), default=0)
+    created = models.DateTimeField(_('Created'), db_index=True)
+    last_updated = models.DateTimeField(_('Last updated'))
+    scheduled_time = models.DateTimeField(_('The scheduled sending time'), blank=True, null=True)
+    archived = models.DateTimeField(_('Archived'), db_index=True)
+    attachments = models.ManyToManyField(Attachment, related_name='archived_emails', blank=True,
+                                         verbose_name=_('Attachments'))
+
+    class Meta:
+        verbose_name = _("Archived email")
+        verbose_name_plural = _("Archived emails")
+
+    def __str__(self):
+        return str(self.from_email) + " -> " + str(self.to) + " (" + self.subject + ")"
+
+
+class ArchivedLog(models.Model):
+    """
+    A Log of an ArchivedEmail.
+    """
+    STATUS_CHOICES = [(STATUS.sent, _("sent")), (STATUS.failed, _("failed"))]
+
+    email = models.ForeignKey(ArchivedEmail, editable=False, related_name='logs',
+                              verbose_name=_('Email address'), on_delete=models.CASCADE)
+    date = models.DateTimeField(_('Date'))
+    status = models.PositiveSmallIntegerField(_('Status'), choices=STATUS_CHOICES)
+    exception_type = models.CharField(_('Exception type'), max_length=255, blank=True)
+    message = models.TextField(_('Message'))
+
+    class Meta:
+        verbose_name = _("Archived log")
+        verbose_name_plural = _("Archived logs")
+
+    def __str__(self):
+        return str(self.date)
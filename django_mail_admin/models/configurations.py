@@ -138,6 +138,22 @@ class Mailbox(models.Model):
         null=True
     )
 
+    uid_validity = models.BigIntegerField(
+        _("UIDVALIDITY"),
+        help_text=_("UIDVALIDITY of the IMAP folder when it was last polled."),
+        blank=True,
+        null=True,
+        editable=False,
+    )
+
+    last_uid = models.BigIntegerField(
+        _("Last UID"),
+        help_text=_("The highest IMAP UID processed, the next poll only fetches messages after it."),
+        blank=True,
+        null=True,
+        editable=False,
+    )
+
     objects = models.Manager()
     active_mailboxes = ActiveMailboxManager()
 
@@ -207,11 +223,20 @@ class Mailbox(models.Model):
             return None
         return folder[0]
 
-    def get_connection(self):
+    @property
+    def keep(self):
+        """Returns whether fetched messages are left on the server."""
+        keep = self._query_string.get('keep', None)
+        if not keep:
+            return False
+        return keep[0].lower() in ('1', 'true', 'yes')
+
+    def get_connection(self, timeout=None):
         """Returns the transport instance for this mailbox.
 
         These will always be instances of
-        `django_mail_admin.transports.base.EmailTransport`.
+        `django_mail_admin.transports.base.EmailTransport`. ``timeout`` limits
+        every network operation of IMAP and POP3 transports, in seconds.
 
         """
         if not self.uri:
@@ -223,7 +248,11 @@ class Mailbox(models.Model):
                 ssl=self.use_ssl,
                 tls=self.use_tls,
                 archive=self.archive,
-                folder=self.folder
+                folder=self.folder,
+                keep=self.keep,
+                uid_validity=self.uid_validity,
+                last_uid=self.last_uid,
+                timeout=timeout
             )
             conn.connect(self.username, self.password)
         elif self.type == 'gmail':
@@ -231,14 +260,19 @@ class Mailbox(models.Model):
                 self.location,
                 port=self.port if self.port else None,
                 ssl=True,
-                archive=self.archive
+                archive=self.archive,
+                keep=self.keep,
+                uid_validity=self.uid_validity,
+                last_uid=self.last_uid,
+                timeout=timeout
             )
             conn.connect(self.username, self.password)
         elif self.type == 'pop3':
             conn = Pop3Transport(
                 self.location,
                 port=self.port if self.port else None,
-                ssl=self.use_ssl
+                ssl=self.use_ssl,
+                timeout=timeout
             )
             conn.connect(self.username, self.password)
         elif self.type == 'maildir':
@@ -422,16 +456,35 @@ class Mailbox(models.Model):
                 save=False
             )
 
-    def get_new_mail(self, condition=None):
-        """Connect to this transport and fetch new messages."""
+    def _save_sync_state(self, connection):
+        if not isinstance(connection, ImapTransport):
+            return
+        if (connection.uid_validity, connection.last_uid) == (self.uid_validity, self.last_uid):
+            return
+        self.uid_validity = connection.uid_validity
+        self.last_uid = connection.last_uid
+        self.save(update_fields=['uid_validity', 'last_uid'])
+
+    def get_new_mail(self, condition=None, connection=None, timeout=None):
+        """Connect to this transport, unless ``connection`` is given, and fetch new messages."""
         new_mail = []
-        connection = self.get_connection()
+        if connection is None:
+            connection = self.get_connection(timeout=timeout)
         if not connection:
             return new_mail
-        for message in connection.get_message(condition):
-            msg = self.process_incoming_message(message)
-            if msg is not None:
-                new_mail.append(msg)
+        messages = connection.get_message(condition)
+        try:
+            for message in messages:
+                msg = self.process_incoming_message(message)
+                if msg is not None:
+                    new_mail.append(msg)
+        finally:
+            # Even if a message failed, the ones before it were processed.
+            # Closing the transport's generator lets it remove them first.
+            try:
+                messages.close()
+            finally:
+                self._save_sync_state(connection)
         self.last_polling = now()
         self.save(update_fields=['last_polling'])
         return new_mail
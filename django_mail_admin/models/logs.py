@@ -1,3 +1,4 @@
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from django_mail_admin.utils import STATUS
 from django.db import models
@@ -13,7 +14,8 @@ class Log(models.Model):
 
     email = models.ForeignKey(OutgoingEmail, editable=False, related_name='logs',
                               verbose_name=_('Email address'), on_delete=models.CASCADE)
-    date = models.DateTimeField(auto_now_add=True)
+    # Set when the log is buffered, which may be a while before it is written
+    date = models.DateTimeField(default=now, editable=False)
     status = models.PositiveSmallIntegerField(_('Status'), choices=STATUS_CHOICES)
     exception_type = models.CharField(_('Exception type'), max_length=255, blank=True)
     message = models.TextField(_('Message'))
@@ -24,3 +26,25 @@ class Log(models.Model):
 
     def __str__(self):
         return str(self.date)
+
+
+class LogCounter(models.Model):
+    """
+    Number of emails logged per minute, backend alias and status, written
+    instead of a Log per sent email when LOG_SUCCESS_ROLLUP is enabled.
+    """
+
+    STATUS_CHOICES = [(STATUS.sent, _("sent")), (STATUS.failed, _("failed"))]
+
+    minute = models.DateTimeField(_('Minute'), db_index=True)
+    backend_alias = models.CharField(_('Backend alias'), max_length=64, blank=True, default='')
+    status = models.PositiveSmallIntegerField(_('Status'), choices=STATUS_CHOICES)
+    count = models.PositiveIntegerField(_('Count'), default=0)
+
+    class Meta:
+        verbose_name = _("Log counter")
+        verbose_name_plural = _("Log counters")
+        unique_together = [('minute', 'backend_alias', 'status')]
+
+    def __str__(self):
+        return '%s %s: %d' % (self.minute, self.backend_alias or 'default', self.count)
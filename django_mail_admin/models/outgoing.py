@@ -1,33 +1,56 @@
+import hashlib
 import logging
+from smtplib import SMTPServerDisconnected
+from tempfile import SpooledTemporaryFile
 
 from django.core.files import File
 from django.core.mail import EmailMessage, EmailMultiAlternatives
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.template import Template, Context
 from django.utils.encoding import force_str
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from jsonfield import JSONField
 
+from django_mail_admin.cache import get_attachment_payload
 from django_mail_admin.connections import connections
 from django_mail_admin.fields import CommaSeparatedEmailField
-from django_mail_admin.settings import get_log_level, get_backend_names_str
+from django_mail_admin.instrumentation import timed_stage
+from django_mail_admin.settings import get_log_level, get_backend_names_str, get_max_retries
 from django_mail_admin.signals import email_sent, email_failed_to_send, email_queued
-from django_mail_admin.utils import get_attachment_save_path, PRIORITY, STATUS
+from django_mail_admin.utils import get_attachment_save_path, get_retry_delay, is_transient_error, PRIORITY, STATUS
 from django_mail_admin.validators import validate_email_with_name
 from .templates import EmailTemplate
 
 logger = logging.getLogger(__name__)
 
+# Attachments up to this size are hashed in memory, larger ones spill to disk
+ATTACHMENT_SPOOL_SIZE = 1024 * 1024
+
 
 class OutgoingEmail(models.Model):
     PRIORITY_CHOICES = [(PRIORITY.low, _("low")), (PRIORITY.medium, _("medium")),
                         (PRIORITY.high, _("high")), (PRIORITY.now, _("now"))]
     STATUS_CHOICES = [(STATUS.sent, _("sent")), (STATUS.failed, _("failed")),
-                      (STATUS.queued, _("queued"))]
+                      (STATUS.queued, _("queued")), (STATUS.sending, _("sending"))]
 
     class Meta:
         verbose_name = _("Outgoing email")
         verbose_name_plural = _("Outgoing emails")
+        # Indexes matching the branches of mail.get_queued_branches(), each
+        # one read in the default SENDING_ORDER with the due time checked on
+        # the rows found. The conditions only test for NULL, which SQLite can
+        # match against parametrized queries. MySQL doesn't support partial
+        # indexes (check models.W037) and indexes every row.
+        indexes = [
+            models.Index(fields=['status', '-priority', 'id'], name='mail_admin_queue_ready_idx',
+                         condition=Q(scheduled_time=None, next_retry=None)),
+            models.Index(fields=['status', '-priority', 'id'], name='mail_admin_queue_sched_idx',
+                         condition=Q(scheduled_time__isnull=False)),
+            models.Index(fields=['status', '-priority', 'id'], name='mail_admin_queue_retried_idx',
+                         condition=Q(scheduled_time=None, next_retry__isnull=False)),
+        ]
 
     from_email = models.CharField(
         verbose_name=_("From email"),
@@ -66,6 +89,8 @@ class OutgoingEmail(models.Model):
     scheduled_time = models.DateTimeField(_('The scheduled sending time'),
                                           blank=True, null=True, db_index=True)
     headers = JSONField(_('Headers'), blank=True, null=True)
+    context = JSONField(_('Context'), blank=True, null=True,
+                        help_text=_("Variables used to render the template"))
 
     status = models.PositiveSmallIntegerField(
         _("Status"),
@@ -84,13 +109,31 @@ class OutgoingEmail(models.Model):
                                      help_text=get_backend_names_str,
                                      max_length=64)
 
+    # Number of times sending was attempted. Emails failing with a transient
+    # error are queued again until MAX_RETRIES retries were made.
+    attempts = models.PositiveIntegerField(_('Attempts'), default=0, editable=False)
+    next_retry = models.DateTimeField(_('Next retry'), blank=True, null=True, db_index=True,
+                                      editable=False)
+
+    # Set while an email is claimed by a sending worker (STATUS.sending).
+    # Emails whose lease has expired are put back in the queue by
+    # mail.release_expired_leases()
+    lease_owner = models.CharField(_('Lease owner'), max_length=255, blank=True, default='',
+                                   editable=False)
+    lease_expires = models.DateTimeField(_('Lease expires'), blank=True, null=True, db_index=True,
+                                         editable=False)
+
     def __init__(self, *args, **kwargs):
         super(OutgoingEmail, self).__init__(*args, **kwargs)
         self._cached_email_message = None
+        # Monotonic time the rate limits allow sending at, set by _send_bulk
+        self._send_after = None
 
     def _get_context(self):
-        context = {}
-        for var in self.templatevariable_set.all().filter(email=self):
+        context = dict(self.context or {})
+        # Variables added as TemplateVariable rows (e.g. in the admin) take precedence.
+        # all() rather than a filter, so variables prefetched by get_queued() are used
+        for var in self.templatevariable_set.all():
             context[var.name] = var.value
 
         return Context(context)
@@ -111,30 +154,35 @@ class OutgoingEmail(models.Model):
         """
         message = self.message
         if self.template is not None:
-            _context = self._get_context()
-            subject = self.template.render_subject(_context)
-            html_message = self.template.render_html_text(_context)
+            with timed_stage('render'):
+                _context = self._get_context()
+                subject = self.template.render_subject(_context)
+                html_message = self.template.render_html_text(_context)
         else:
             subject = self.subject
             html_message = self.html_message
 
-        connection = connections[self.backend_alias or 'default']
-
-        if html_message:
-            msg = EmailMultiAlternatives(
-                subject=subject, body=message, from_email=self.from_email,
-                to=self.to, bcc=self.bcc, cc=self.cc,
-                headers=self.headers, connection=connection)
-            msg.attach_alternative(html_message, "text/html")
-        else:
-            msg = EmailMessage(
-                subject=subject, body=message, from_email=self.from_email,
-                to=self.to, bcc=self.bcc, cc=self.cc,
-                headers=self.headers, connection=connection)
-
-        for attachment in self.attachments.all():
-            msg.attach(attachment.name, attachment.file.read(), mimetype=attachment.mimetype or None)
-            attachment.file.close()
+        # Messages are prepared in the main thread, connections are attached
+        # by whoever sends them (dispatch, _send_messages or the asyncio engine)
+        connection = None
+
+        with timed_stage('mime'):
+            if html_message:
+                msg = EmailMultiAlternatives(
+                    subject=subject, body=message, from_email=self.from_email,
+                    to=self.to, bcc=self.bcc, cc=self.cc,
+                    headers=self.headers, connection=connection)
+                msg.attach_alternative(html_message, "text/html")
+            else:
+                msg = EmailMessage(
+                    subject=subject, body=message, from_email=self.from_email,
+                    to=self.to, bcc=self.bcc, cc=self.cc,
+                    headers=self.headers, connection=connection)
+
+        with timed_stage('attachments'):
+            for attachment in self.attachments.all():
+                msg.attach(attachment.name, get_attachment_payload(attachment),
+                           mimetype=attachment.mimetype or None)
 
         self._cached_email_message = msg
         return msg
@@ -143,22 +191,51 @@ class OutgoingEmail(models.Model):
         self.status = STATUS.queued
         self.save()
 
+    def get_failure_status(self, exception):
+        """
+        Returns the status and next retry time after a failed attempt,
+        ``attempts`` must already count it. Emails are queued again if the
+        error is transient and retries are left, otherwise they fail.
+        """
+        if self.attempts <= get_max_retries() and is_transient_error(exception):
+            return STATUS.queued, now() + get_retry_delay(self.attempts)
+        return STATUS.failed, None
+
     def dispatch(self, log_level=None, commit=True):
         """
         Sends email and log the result.
         """
 
         email_message = None
+        if commit:
+            # In bulk sending mode, _send_bulk counts the attempts
+            self.attempts += 1
         # Priority is handled in mail.send
+        alias = self.backend_alias or 'default'
+        connection = None
         try:
             email_message = self.email_message()
-            email_message.send()
+            if email_message.connection is None:
+                # Taken from the pool and given back once sent, so request
+                # threads don't keep connections open
+                connection = email_message.connection = connections.checkout(alias)
+            try:
+                with timed_stage('send'):
+                    email_message.send()
+            except SMTPServerDisconnected:
+                if connection is None:
+                    raise
+                # The server dropped a pooled connection, retry once on a new one
+                connection.close()
+                connection.open()
+                with timed_stage('send'):
+                    email_message.send()
             status = STATUS.sent
+            next_retry = None
             message = ''
             exception_type = ''
             email_sent.send(sender=self, outgoing_email=email_message)
         except Exception as e:
-            status = STATUS.failed
             message = str(e)
             exception_type = type(e).__name__
             if email_message:
@@ -167,23 +244,33 @@ class OutgoingEmail(models.Model):
             # layer handle the exception
             if not commit:
                 raise
+            status, next_retry = self.get_failure_status(e)
+        finally:
+            if connection is not None:
+                connections.checkin(alias, connection)
 
         if commit:
             self.status = status
-            self.save(update_fields=['status'])
+            self.next_retry = next_retry
+            with timed_stage('status_update'):
+                self.save(update_fields=['status', 'attempts', 'next_retry'])
 
             if log_level is None:
                 log_level = get_log_level()
 
+            # Logs record the attempt, so a retried email has a failed log entry
+            log_status = STATUS.sent if status == STATUS.sent else STATUS.failed
+
             # If log level is 0, log nothing, 1 logs only sending failures
             # and 2 means log both successes and failures
-            if log_level == 1:
-                if status == STATUS.failed:
-                    self.logs.create(status=status, message=message,
-                                     exception_type=exception_type)
+            from django_mail_admin.logwriter import get_log_writer, flush_logs
+            from django_mail_admin.metrics import flush_metrics
+            if log_level >= 1 and log_status == STATUS.failed:
+                get_log_writer().add(self, log_status, message=message, exception_type=exception_type)
             elif log_level == 2:
-                self.logs.create(status=status, message=message,
-                                 exception_type=exception_type)
+                get_log_writer().add_sent(self)
+            flush_logs()
+            flush_metrics()
 
     def save(self, *args, **kwargs):
         self.full_clean()
@@ -198,10 +285,15 @@ class Attachment(models.Model):
     A model describing an email attachment.
     """
     file = models.FileField(_('File'), upload_to=get_attachment_save_path)
+    # SHA-256 of the file, set by create_attachments()
+    content_hash = models.CharField(_('Content hash'), max_length=64, blank=True, default='',
+                                    db_index=True, editable=False)
     name = models.CharField(_('Name'), max_length=255, help_text=_("The original filename"))
     emails = models.ManyToManyField(OutgoingEmail, related_name='attachments', blank=True,
                                     verbose_name=_('Email addresses'))
     mimetype = models.CharField(max_length=255, default='', blank=True)
+    # Bumped whenever create_attachments() reuses the Attachment or its file
+    last_used = models.DateTimeField(_('Last used'), default=now, db_index=True, editable=False)
 
     class Meta:
         verbose_name = _("Attachment")
@@ -219,6 +311,10 @@ def create_attachments(attachment_files):
         * Key - the filename to be used for the attachment.
         * Value - file-like object, or a filename to open OR a dict of {'file': file-like-object, 'mimetype': string}
 
+    Attachments are stored by the SHA-256 of their content: an existing
+    Attachment with the same content, filename and mimetype is reused, and a
+    new Attachment whose content is already stored points at the existing file.
+
     Returns a list of Attachment objects
     """
     attachments = []
@@ -237,18 +333,85 @@ def create_attachments(attachment_files):
             # `content` is a filename - try to open the file
             opened_file = open(content, 'rb')
             content = File(opened_file)
+        elif not isinstance(content, File):
+            # Plain file-like objects, e.g. BytesIO or open files
+            content = File(content)
+
+        try:
+            attachments.append(get_or_create_attachment(filename, content, mimetype or ''))
+        finally:
+            if opened_file is not None:
+                opened_file.close()
 
-        attachment = Attachment()
-        if mimetype:
-            attachment.mimetype = mimetype
-        attachment.file.save(filename, content=content, save=True)
+    return attachments
 
-        attachments.append(attachment)
 
-        if opened_file is not None:
-            opened_file.close()
+def get_or_create_attachment(filename, content, mimetype=''):
+    # The content is hashed while it's copied to a temporary file, so it's
+    # read once and only written to the storage if it's new
+    content_hash = hashlib.sha256()
+    spooled_file = SpooledTemporaryFile(max_size=ATTACHMENT_SPOOL_SIZE)
+    for chunk in content.chunks():
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        content_hash.update(chunk)
+        spooled_file.write(chunk)
+    content_hash = content_hash.hexdigest()
+
+    with spooled_file:
+        same_content = Attachment.objects.filter(content_hash=content_hash).order_by('id')
+        attachment = same_content.filter(name=filename, mimetype=mimetype).first()
+        if attachment is not None:
+            # Keeps delete_unused_attachments() away from it until it's linked
+            attachment.last_used = now()
+            Attachment.objects.filter(pk=attachment.pk).update(last_used=attachment.last_used)
+            return attachment
+
+        attachment = Attachment(name=filename, mimetype=mimetype, content_hash=content_hash)
+        stored = same_content.only('file').first()
+        if stored is not None:
+            Attachment.objects.filter(pk=stored.pk).update(last_used=now())
+            attachment.file.name = stored.file.name
+            attachment.save()
+        else:
+            spooled_file.seek(0)
+            attachment.file.save(filename, content=File(spooled_file), save=True)
+    return attachment
 
-    return attachments
+
+def delete_unused_attachments(before=None, chunk_size=500):
+    """
+    Deletes Attachments which aren't linked to any email, archived or not, and
+    weren't used since ``before``. Their files are shared by Attachments with
+    the same content, so a file is only deleted once no Attachment references
+    it anymore.
+
+    Attachments are deleted in id ranges of up to ``chunk_size`` rows, each in
+    its own transaction. Pass ``before`` when emails are being sent meanwhile:
+    create_attachments() returns unlinked Attachments which it marks as used,
+    and they must not be deleted before send() links them to their email.
+
+    Returns the number of deleted Attachments.
+    """
+    unused = Attachment.objects.filter(emails=None, archived_emails=None)
+    if before is not None:
+        unused = unused.filter(last_used__lt=before)
+
+    deleted = last_id = 0
+    while True:
+        ids = list(unused.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        last_id = ids[-1]
+        with transaction.atomic():
+            # Filtered again, an Attachment may have been used since
+            chunk = unused.filter(id__in=ids)
+            file_names = set(chunk.exclude(file='').values_list('file', flat=True))
+            count, _ = chunk.delete()
+            referenced = set(Attachment.objects.filter(file__in=file_names).values_list('file', flat=True))
+        deleted += count
+        for file_name in file_names - referenced:
+            Attachment.file.field.storage.delete(file_name)
 
 
 def send_mail(subject, message, from_email, recipient_list, html_message='',
@@ -1,15 +1,14 @@
 import logging
 
 from django.db import models
-from django.template import Template
 from django.utils.translation import gettext_lazy as _
 
+from django_mail_admin.cache import get_compiled_template
 from django_mail_admin.validators import validate_template_syntax
 
 logger = logging.getLogger(__name__)
 
 
-# TODO: implement cache usage as in post_office
 class EmailTemplate(models.Model):
     # TODO: add description about vars availiable
     class Meta:
@@ -40,11 +39,11 @@ class EmailTemplate(models.Model):
     )
 
     def render_html_text(self, context):
-        template = Template(self.email_html_text)
+        template = get_compiled_template(self, 'email_html_text')
         return template.render(context)
 
     def render_subject(self, context):
-        template = Template(self.subject)
+        template = get_compiled_template(self, 'subject')
         return template.render(context)
 
     def __str__(self):
@@ -0,0 +1,213 @@
+import os
+import time
+from email.utils import parseaddr
+
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .settings import get_backend_rate_limit, get_cache_backend, get_domain_rate_limits
+
+# Buckets limiting how fast ``send_queued`` sends, per backend alias
+# (RATE_LIMIT in the backend's options) and per recipient domain
+# (DOMAIN_RATE_LIMITS). With a cache shared between processes the buckets
+# are counted in the cache, so every process and host shares the limits.
+# Otherwise each process keeps token buckets for its share of the limits.
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+cache_backend = get_cache_backend()
+
+_rate_limiter = None
+
+
+def parse_rate(rate):
+    """
+    Parses a rate like '10/s', '600/m' or '1000/h' into a tuple of
+    (count, seconds). Numbers are messages per second.
+    """
+    if isinstance(rate, (int, float)):
+        return float(rate), 1
+    try:
+        count, period = rate.split('/')
+        return float(count), PERIODS[period.strip().lower()[:1]]
+    except (AttributeError, ValueError, KeyError):
+        raise ValueError('%r is not a valid rate limit, use e.g. "10/s", "600/m" or "1000/h"' % (rate,))
+
+
+class TokenBucket(object):
+    """
+    Allows bursts of up to ``count`` messages, refilled at ``count / seconds``
+    messages per second. Tokens may be reserved ahead of time, which drives
+    the balance negative until it's refilled.
+    """
+
+    def __init__(self, count, seconds):
+        if count <= 0:
+            raise ValueError('Rate limits must be positive')
+        self.rate = count / seconds
+        self.capacity = max(count, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, at):
+        if at > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (at - self.updated) * self.rate)
+            self.updated = at
+
+    def get_delay(self, at):
+        """Returns seconds from ``at`` until a token is available"""
+        self._refill(at)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def consume(self, at):
+        self._refill(at)
+        self.tokens -= 1
+
+    def reserve(self, max_wait):
+        """
+        Consumes a token if one is available within ``max_wait`` seconds.
+        Returns a tuple of (reservation or None, delay), see CacheBucket.
+        """
+        at = time.monotonic()
+        delay = self.get_delay(at)
+        if delay > max_wait:
+            return None, delay
+        self.consume(at)
+        return at, delay
+
+    def release(self, reservation):
+        self.tokens += 1
+
+
+class CacheBucket(object):
+    """
+    Allows ``count`` messages in every window of ``seconds``, counted in the
+    cache so processes and hosts sharing it share the limit. Messages may be
+    counted in a later window, to be sent once it starts.
+    """
+
+    def __init__(self, key, count, seconds):
+        if count <= 0:
+            raise ValueError('Rate limits must be positive')
+        self.key = 'django_mail_admin:ratelimit:%s:%s' % key
+        self.count = count
+        self.seconds = seconds
+
+    def get_cache_key(self, window):
+        return '%s:%d' % (self.key, window)
+
+    def reserve(self, max_wait):
+        """
+        Counts a message in the first window with room left which starts
+        within ``max_wait`` seconds. Returns a tuple of (window, delay): the
+        message may be sent after ``delay`` seconds, or, if the window is
+        None, every window until ``delay`` seconds from now is full.
+        """
+        at = time.time()
+        window = int(at // self.seconds)
+        while True:
+            delay = max(0.0, window * self.seconds - at)
+            if delay > max_wait:
+                return None, delay
+            key = self.get_cache_key(window)
+            # Expires once the window is over
+            timeout = int(delay) + self.seconds + 1
+            cache_backend.add(key, 0, timeout=timeout)
+            try:
+                used = cache_backend.incr(key)
+            except ValueError:
+                # Evicted between add() and incr()
+                cache_backend.add(key, 1, timeout=timeout)
+                used = 1
+            if used <= self.count:
+                return window, delay
+            window += 1
+
+    def release(self, window):
+        try:
+            cache_backend.decr(self.get_cache_key(window))
+        except ValueError:
+            pass
+
+
+def is_shared_cache():
+    """Returns whether the cache backend is shared between processes"""
+    return cache_backend is not None and not isinstance(cache_backend, (DummyCache, LocMemCache))
+
+
+class RateLimiter(object):
+
+    def __init__(self, processes=1):
+        self.processes = processes
+        self.shared = is_shared_cache()
+        self.buckets = {}
+        self.domain_limits = dict((domain.lower(), rate) for domain, rate in get_domain_rate_limits().items())
+
+    def _get_bucket(self, key, rate):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            count, seconds = parse_rate(rate)
+            if self.shared:
+                bucket = CacheBucket(key, count, seconds)
+            else:
+                bucket = TokenBucket(count / self.processes, seconds)
+            self.buckets[key] = bucket
+        return bucket
+
+    def get_buckets(self, email):
+        alias = email.backend_alias or 'default'
+        buckets = []
+        rate = get_backend_rate_limit(alias)
+        if rate:
+            buckets.append(self._get_bucket(('backend', alias), rate))
+        if self.domain_limits:
+            for domain in get_recipient_domains(email):
+                if domain in self.domain_limits:
+                    buckets.append(self._get_bucket(('domain', domain), self.domain_limits[domain]))
+        return buckets
+
+    def reserve(self, email, max_wait):
+        """
+        Reserves a token for the email in the buckets of its backend and
+        recipient domains. Returns a tuple of (reserved, delay): the email may
+        be sent after ``delay`` seconds, or, if that's more than ``max_wait``,
+        nothing is reserved and it should be deferred by ``delay`` seconds.
+        """
+        reservations = []
+        delay = 0.0
+        for bucket in self.get_buckets(email):
+            reservation, bucket_delay = bucket.reserve(max_wait)
+            if reservation is None:
+                for reserved_bucket, reserved in reservations:
+                    reserved_bucket.release(reserved)
+                return False, bucket_delay
+            reservations.append((bucket, reservation))
+            delay = max(delay, bucket_delay)
+        return True, delay
+
+
+def get_recipient_domains(email):
+    domains = set()
+    for address in list(email.to) + list(email.cc) + list(email.bcc):
+        domain = parseaddr(address)[1].rpartition('@')[2].lower()
+        if domain:
+            domains.add(domain)
+    return domains
+
+
+def get_rate_limiter(processes=1):
+    """
+    Returns the RateLimiter of this process, which keeps its buckets
+    between batches.
+    """
+    global _rate_limiter
+    pid = os.getpid()
+    if _rate_limiter is None or _rate_limiter[0] != pid or _rate_limiter[1].processes != processes:
+        _rate_limiter = (pid, RateLimiter(processes))
+    return _rate_limiter[1]
+
+
+def get_wait_time(email):
+    """Returns seconds left until the email's reserved sending time"""
+    if email._send_after is None:
+        return 0
+    return max(0.0, email._send_after - time.monotonic())
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import warnings
 
 from django.conf import settings
@@ -24,7 +26,9 @@ def get_available_backends():
     backends = get_config().get('BACKENDS', {})
 
     if backends:
-        return backends
+        # Backends may be given in the dict form, see get_backend_options
+        return dict((alias, backend['BACKEND'] if isinstance(backend, dict) else backend)
+                    for alias, backend in backends.items())
 
     # Try to get backend settings from old style
     # DJANGO_MAIL_ADMIN = {
@@ -52,6 +56,113 @@ def get_available_backends():
     return backends
 
 
+def get_backend_options(alias='default'):
+    """ Returns the options of a backend defined in the dict form. For example:
+    'BACKENDS': {
+        'bulk': {
+            'BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'ENGINE': 'asyncio',
+        },
+    }
+    """
+    backend = get_config().get('BACKENDS', {}).get(alias)
+    if isinstance(backend, dict):
+        return backend
+    return {}
+
+
+def get_sending_engine(alias='default'):
+    return get_backend_options(alias).get('ENGINE', 'thread')
+
+
+def get_async_concurrency(alias='default'):
+    return get_backend_options(alias).get('CONCURRENCY', get_config().get('ASYNC_CONCURRENCY', 100))
+
+
+def get_connection_pool_size():
+    return get_config().get('CONNECTION_POOL_SIZE', 10)
+
+
+def get_connection_idle_timeout():
+    return get_config().get('CONNECTION_IDLE_TIMEOUT', 60)
+
+
+def get_template_cache_size():
+    return get_config().get('TEMPLATE_CACHE_SIZE', 500)
+
+
+def get_attachment_cache_size():
+    return get_config().get('ATTACHMENT_CACHE_SIZE', 50 * 1024 * 1024)
+
+
+def get_max_retries():
+    return get_config().get('MAX_RETRIES', 0)
+
+
+def get_retry_interval():
+    return get_config().get('RETRY_INTERVAL', 60)
+
+
+def get_retry_backoff():
+    return get_config().get('RETRY_BACKOFF', 2)
+
+
+def get_retry_max_interval():
+    return get_config().get('RETRY_MAX_INTERVAL', 3600)
+
+
+def get_retry_jitter():
+    return get_config().get('RETRY_JITTER', 0.1)
+
+
+def get_transient_exceptions():
+    return get_config().get('TRANSIENT_EXCEPTIONS', [])
+
+
+def get_backend_rate_limit(alias='default'):
+    return get_backend_options(alias).get('RATE_LIMIT')
+
+
+def get_domain_rate_limits():
+    return get_config().get('DOMAIN_RATE_LIMITS', {})
+
+
+def get_rate_limit_max_wait():
+    return get_config().get('RATE_LIMIT_MAX_WAIT', 5)
+
+
+def get_archive_chunk_size():
+    return get_config().get('ARCHIVE_CHUNK_SIZE', 1000)
+
+
+def get_log_buffer_size():
+    return get_config().get('LOG_BUFFER_SIZE', 1000)
+
+
+def get_log_flush_interval():
+    return get_config().get('LOG_FLUSH_INTERVAL', 0)
+
+
+def get_log_success_rollup():
+    return get_config().get('LOG_SUCCESS_ROLLUP', False)
+
+
+def get_metrics_enabled():
+    return get_config().get('METRICS_ENABLED', False)
+
+
+def get_metrics_token():
+    return get_config().get('METRICS_TOKEN', None)
+
+
+def get_metrics_cache_timeout():
+    return get_config().get('METRICS_CACHE_TIMEOUT', 30)
+
+
+def get_metrics_buckets():
+    return sorted(get_config().get('METRICS_BUCKETS', [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]))
+
+
 def get_backend_names_str():
     return _('Available backends are: ') + str(list(get_available_backends().keys()))
 
@@ -99,6 +210,14 @@ def get_sending_order():
     return get_config().get('SENDING_ORDER', ['-priority'])
 
 
+def get_lease_duration():
+    return get_config().get('LEASE_DURATION', 600)
+
+
+def get_wakeup_socket():
+    return get_config().get('WAKEUP_SOCKET', os.path.join(tempfile.gettempdir(), 'django_mail_admin.sock'))
+
+
 def strip_unallowed_mimetypes():
     return get_config().get('STRIP_UNALLOWED_MIMETYPES', False)
 
@@ -135,5 +254,21 @@ def get_original_message_compression():
     return get_config().get('ORIGINAL_MESSAGE_COMPRESSION', 6)
 
 
+def get_imap_fetch_chunk_size():
+    return get_config().get('IMAP_FETCH_CHUNK_SIZE', 100)
+
+
+def get_imap_idle_keepalive():
+    return get_config().get('IMAP_IDLE_KEEPALIVE', 1740)
+
+
+def get_mailbox_poll_workers():
+    return get_config().get('MAILBOX_POLL_WORKERS', 10)
+
+
+def get_mailbox_timeout():
+    return get_config().get('MAILBOX_TIMEOUT', 60)
+
+
 def get_default_charset():
     return get_config().get('DEFAULT_CHARSET', 'iso8859-1')
@@ -4,3 +4,4 @@ message_received = Signal()
 email_queued = Signal()   # sender is OutgoingEmail instance
 email_sent = Signal()
 email_failed_to_send = Signal()
+stage_timed = Signal()   # stage and duration in seconds, see instrumentation.timed_stage
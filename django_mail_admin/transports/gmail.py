@@ -12,7 +12,7 @@ class GmailImapTransport(ImapTransport):
             self._connect_oauth(username)
         except (TypeError, ValueError) as e:
             logger.warning("Couldn't do oauth2 because %s" % e)
-            self.server = self.transport(self.hostname, self.port)
+            self.server = self.transport(self.hostname, self.port, timeout=self.timeout)
             typ, msg = self.server.login(username, password)
             self.server.select()
 
@@ -51,6 +51,6 @@ class GmailImapTransport(ImapTransport):
             google_email_address,
             access_token
         )
-        self.server = self.transport(self.hostname, self.port)
+        self.server = self.transport(self.hostname, self.port, timeout=self.timeout)
         self.server.authenticate('XOAUTH2', lambda x: auth_string)
         self.server.select()
@@ -1,8 +1,13 @@
 import imaplib
 import logging
+import re
+import select
+import ssl
+import time
 
 from django.conf import settings
 
+from django_mail_admin.settings import get_imap_fetch_chunk_size
 from .base import EmailTransport, MessageParseError
 
 # By default, imaplib will raise an exception if it encounters more
@@ -13,11 +18,28 @@ imaplib._MAXLINE = 1000000
 
 logger = logging.getLogger(__name__)
 
+FETCH_UID_RE = re.compile(rb'\bUID (\d+)')
+EXISTS_RE = re.compile(rb'\* \d+ EXISTS\b')
+
+
+def get_uid_set(uids):
+    """
+    Returns an IMAP sequence set of ``uids``, with runs of consecutive UIDs
+    as ranges, e.g. ['1', '2', '3', '7'] gives '1:3,7'
+    """
+    ranges = []
+    for uid in sorted(int(uid) for uid in uids):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ','.join(str(first) if first == last else '%d:%d' % (first, last) for first, last in ranges)
+
 
 class ImapTransport(EmailTransport):
     def __init__(
         self, hostname, port=None, ssl=False, tls=False,
-        archive='', folder=None,
+        archive='', folder=None, keep=False, uid_validity=None, last_uid=None, timeout=None,
     ):
         self.max_message_size = getattr(
             settings,
@@ -33,7 +55,14 @@ class ImapTransport(EmailTransport):
         self.port = port
         self.archive = archive
         self.folder = folder
+        self.keep = keep
+        # Sync state: UIDs are only comparable while UIDVALIDITY stays the
+        # same, get_message() fetches the messages after last_uid
+        self.uid_validity = uid_validity
+        self.last_uid = last_uid
         self.tls = tls
+        # Seconds every network operation may take, None waits forever
+        self.timeout = timeout
         if ssl:
             self.transport = imaplib.IMAP4_SSL
             if not self.port:
@@ -44,7 +73,7 @@ class ImapTransport(EmailTransport):
                 self.port = 143
 
     def connect(self, username, password):
-        self.server = self.transport(self.hostname, self.port)
+        self.server = self.transport(self.hostname, self.port, timeout=self.timeout)
         if self.tls:
             self.server.starttls()
         typ, msg = self.server.login(username, password)
@@ -54,9 +83,8 @@ class ImapTransport(EmailTransport):
         else:
             self.server.select()
 
-    def _get_all_message_ids(self):
-        # Fetch all the message uids
-        response, message_ids = self.server.uid('search', None, 'ALL')
+    def _search(self, *criteria):
+        response, message_ids = self.server.uid('search', None, *criteria)
         message_id_string = message_ids[0].strip()
         # Usually `message_id_string` will be a list of space-separated
         # ids; we must make sure that it isn't an empty string before
@@ -65,6 +93,29 @@ class ImapTransport(EmailTransport):
             return message_id_string.decode().split(' ')
         return []
 
+    def _get_all_message_ids(self):
+        # Fetch all the message uids
+        return self._search('ALL')
+
+    def _get_uid_validity(self):
+        # Sent by the server in reply to SELECT, imaplib only returns it once
+        # and a connection may be polled several times
+        typ, data = self.server.response('UIDVALIDITY')
+        if data and data[-1]:
+            self._uid_validity = int(data[-1])
+        return getattr(self, '_uid_validity', None)
+
+    def _get_new_message_ids(self):
+        """Returns the uids after last_uid, or all of them if they were renumbered"""
+        uid_validity = self._get_uid_validity()
+        if uid_validity is None or uid_validity != self.uid_validity:
+            self.last_uid = None
+        self.uid_validity = uid_validity
+        if not self.last_uid:
+            return self._get_all_message_ids()
+        # `n:*` includes the highest uid even if it is below n
+        return [uid for uid in self._search('UID', '%d:*' % (self.last_uid + 1)) if int(uid) > self.last_uid]
+
     def _get_small_message_ids(self, message_ids):
         # Using existing message uids, get the sizes and
         # return only those that are under the size
@@ -73,7 +124,7 @@ class ImapTransport(EmailTransport):
 
         status, data = self.server.uid(
             'fetch',
-            ','.join(message_ids),
+            get_uid_set(message_ids),
             '(RFC822.SIZE)'
         )
 
@@ -91,8 +142,118 @@ class ImapTransport(EmailTransport):
                 pass
         return safe_message_ids
 
+    def _get_capabilities(self):
+        # Servers may advertise more capabilities once logged in, which
+        # imaplib doesn't pick up, so ask again
+        if not hasattr(self, '_capabilities'):
+            typ, data = self.server.capability()
+            self._capabilities = data[0].decode().upper().split() if typ == 'OK' and data and data[0] else []
+        return self._capabilities
+
+    def _supports_move(self):
+        return 'MOVE' in self._get_capabilities()
+
+    def supports_idle(self):
+        return 'IDLE' in self._get_capabilities()
+
+    def _has_pending_data(self):
+        # Whether a line can be read without waiting: imaplib may have
+        # buffered it already, peek() reads without blocking otherwise
+        sock = self.server.socket()
+        timeout = sock.gettimeout()
+        sock.settimeout(0)
+        try:
+            return bool(self.server.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(timeout)
+
+    def _wait_for_line(self, timeout, interrupt=None):
+        """
+        Returns the next line from the server, or None if none came within
+        ``timeout`` seconds or ``interrupt`` became readable first
+        """
+        if not self._has_pending_data():
+            sockets = [self.server.socket()] + ([interrupt] if interrupt is not None else [])
+            readable, _, _ = select.select(sockets, [], [], max(timeout, 0))
+            if self.server.socket() not in readable:
+                return None
+        line = self.server.readline()
+        if not line:
+            raise self.server.abort('socket error: EOF')
+        return line
+
+    def idle(self, timeout, interrupt=None):
+        """
+        Waits in IDLE for new messages, up to ``timeout`` seconds or until
+        ``interrupt`` (a socket or file descriptor) becomes readable.
+        Returns whether the server announced new messages. The server must
+        support IDLE (RFC 2177), see supports_idle().
+        """
+        # imaplib has no IDLE command, it's sent by hand
+        tag = self.server._new_tag()
+        self.server.send(tag + b' IDLE\r\n')
+        new_messages = False
+        line = self.server.readline()
+        while not line.startswith(b'+'):
+            if not line or line.startswith(tag):
+                raise self.server.error('IDLE failed: %r' % line)
+            new_messages = new_messages or bool(EXISTS_RE.match(line))
+            line = self.server.readline()
+
+        deadline = time.monotonic() + timeout
+        while not new_messages:
+            line = self._wait_for_line(deadline - time.monotonic(), interrupt)
+            if line is None:
+                break
+            new_messages = bool(EXISTS_RE.match(line))
+
+        self.server.send(b'DONE\r\n')
+        while True:
+            line = self.server.readline()
+            if not line:
+                raise self.server.abort('socket error: EOF')
+            if line.startswith(tag):
+                if line.split()[1] != b'OK':
+                    raise self.server.error('IDLE failed: %r' % line)
+                return new_messages
+            new_messages = new_messages or bool(EXISTS_RE.match(line))
+
+    def _fetch_messages(self, message_ids):
+        """
+        Yields (uid, message bytes) of ``message_ids``, fetching
+        IMAP_FETCH_CHUNK_SIZE messages per round trip
+        """
+        chunk_size = get_imap_fetch_chunk_size()
+        for start in range(0, len(message_ids), chunk_size):
+            typ, data = self.server.uid('fetch', get_uid_set(message_ids[start:start + chunk_size]), '(RFC822)')
+            for item in data or []:
+                # Messages are (envelope, literal) tuples, followed by a
+                # closing b')'. Messages deleted by another thread/process
+                # since we listed them are simply missing.
+                if not isinstance(item, tuple):
+                    continue
+                match = FETCH_UID_RE.search(item[0])
+                if match is None:
+                    logger.warning("No UID in fetch response %r" % item[0])
+                    continue
+                yield match.group(1).decode(), item[1]
+
+    def _remove_messages(self, message_ids):
+        """Moves ``message_ids`` to the archive folder if any, or deletes them"""
+        if not message_ids:
+            return
+        uid_set = get_uid_set(message_ids)
+        if self.archive and self._supports_move():
+            self.server.uid('move', uid_set, self.archive)
+            return
+        if self.archive:
+            self.server.uid('copy', uid_set, self.archive)
+        self.server.uid('store', uid_set, "+FLAGS", "(\\Deleted)")
+
     def get_message(self, condition=None):
-        message_ids = self._get_all_message_ids()
+        message_ids = self._get_new_message_ids()
 
         if not message_ids:
             return
@@ -101,35 +262,45 @@ class ImapTransport(EmailTransport):
         if self.max_message_size:
             message_ids = self._get_small_message_ids(message_ids)
 
-        if self.archive:
+        if self.archive and not self.keep:
             typ, folders = self.server.list(pattern=self.archive)
             if folders[0] is None:
                 # If the archive folder does not exist, create it
                 self.server.create(self.archive)
 
-        for uid in message_ids:
-            try:
-                typ, msg_contents = self.server.uid('fetch', uid, '(RFC822)')
-                if not msg_contents:
-                    continue
+        chunk_size = get_imap_fetch_chunk_size()
+        processed = []
+        # Unless messages are kept, last_uid only advances past messages once
+        # they are removed, so a failed removal doesn't lose them
+        handled_uid = None
+        try:
+            for uid, contents in self._fetch_messages(message_ids):
                 try:
-                    message = self.get_email_from_bytes(msg_contents[0][1])
-                except TypeError:
-                    # This happens if another thread/process deletes the
-                    # message between our generating the ID list and our
-                    # processing it here.
+                    message = self.get_email_from_bytes(contents)
+                    skip = condition and not condition(message)
+                except MessageParseError:
+                    skip = True
+                if not skip:
+                    yield message
+                # The caller processed the message, skipped ones are skipped
+                # on the next polls as well
+                if self.keep:
+                    self.last_uid = max(self.last_uid or 0, int(uid))
                     continue
-
-                if condition and not condition(message):
+                handled_uid = max(handled_uid or 0, int(uid))
+                if skip:
                     continue
-
-                yield message
-            except MessageParseError:
-                continue
-
-            if self.archive:
-                self.server.uid('copy', uid, self.archive)
-
-            self.server.uid('store', uid, "+FLAGS", "(\\Deleted)")
-        self.server.expunge()
+                processed.append(uid)
+                if len(processed) >= chunk_size:
+                    self._remove_messages(processed)
+                    processed = []
+                    self.last_uid = max(self.last_uid or 0, handled_uid)
+        finally:
+            # Also reached if the caller stops early, see close(), so the
+            # messages it processed aren't left on the server
+            if not self.keep:
+                self._remove_messages(processed)
+                if handled_uid is not None:
+                    self.last_uid = max(self.last_uid or 0, handled_uid)
+                self.server.expunge()
         return
@@ -4,9 +4,10 @@ from .base import EmailTransport, MessageParseError
 
 
 class Pop3Transport(EmailTransport):
-    def __init__(self, hostname, port=None, ssl=False):
+    def __init__(self, hostname, port=None, ssl=False, timeout=None):
         self.hostname = hostname
         self.port = port
+        self.timeout = timeout
         if ssl:
             self.transport = POP3_SSL
             if not self.port:
@@ -17,7 +18,10 @@ class Pop3Transport(EmailTransport):
                 self.port = 110
 
     def connect(self, username, password):
-        self.server = self.transport(self.hostname, self.port)
+        if self.timeout is not None:
+            self.server = self.transport(self.hostname, self.port, timeout=self.timeout)
+        else:
+            self.server = self.transport(self.hostname, self.port)
         self.server.user(username)
         self.server.pass_(password)
 
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+from django.urls import path
+
+from django_mail_admin import views
 
 app_name = 'django_mail_admin'
 urlpatterns = [
-
+    path('metrics/', views.metrics, name='metrics'),
 ]
@@ -2,17 +2,23 @@ import datetime
 import email.header
 import logging
 import os
+import random
+import smtplib
+import socket
 from collections import namedtuple
+from email.utils import parseaddr
 
 from django.core.exceptions import ValidationError
 
-from django_mail_admin.settings import get_default_priority, get_default_charset, get_attachment_upload_to
+from django_mail_admin.settings import (get_default_priority, get_default_charset, get_attachment_upload_to,
+                                        get_retry_backoff, get_retry_interval, get_retry_jitter,
+                                        get_retry_max_interval, get_transient_exceptions)
 from .validators import validate_email_with_name
 
 logger = logging.getLogger(__name__)
 
 PRIORITY = namedtuple('PRIORITY', 'low medium high now')._make(range(4))
-STATUS = namedtuple('STATUS', 'sent failed queued')._make(range(3))
+STATUS = namedtuple('STATUS', 'sent failed queued sending')._make(range(4))
 
 
 def convert_header_to_unicode(header):
@@ -136,3 +142,87 @@ def split_emails(emails, split_count=1):
     # Strange bug, only return 100 email if we do not evaluate the list
     if list(emails):
         return [emails[i::split_count] for i in range(split_count)]
+
+
+def split_contiguous(items, split_count=1):
+    """
+    Splits a list into ``split_count`` contiguous sublists whose sizes
+    differ by one at most
+    """
+    size, remainder = divmod(len(items), split_count)
+    sublists = []
+    start = 0
+    for i in range(split_count):
+        end = start + size + (1 if i < remainder else 0)
+        sublists.append(items[start:end])
+        start = end
+    return sublists
+
+
+def split_emails_by_backend(emails, split_count=1):
+    """
+    Like split_emails, but emails of the same backend alias and recipient
+    domain are kept together, so each process needs fewer connections
+    """
+    def key(email):
+        domain = parseaddr(email.to[0])[1].rpartition('@')[2].lower() if email.to else ''
+        return email.backend_alias or 'default', domain
+    return split_contiguous(sorted(emails, key=key), split_count)
+
+
+def get_worker_id():
+    """
+    Returns an identifier of the current sending worker, used as lease owner
+    for claimed emails.
+    """
+    return '%s:%s' % (socket.gethostname(), os.getpid())
+
+
+def _is_transient_code(code):
+    return isinstance(code, int) and 400 <= code < 500
+
+
+def is_transient_error(exception):
+    """
+    Tells whether sending may succeed if retried later: SMTP 4xx replies,
+    refused and dropped connections, timeouts and DNS failures are transient.
+    Exception class names listed in TRANSIENT_EXCEPTIONS (as stored in
+    Log.exception_type) are transient too, everything else is permanent.
+    """
+    if type(exception).__name__ in get_transient_exceptions():
+        return True
+
+    # smtplib stores {address: (code, message)}, aiosmtplib a list of exceptions
+    recipients = getattr(exception, 'recipients', None)
+    if isinstance(recipients, dict):
+        codes = [code for code, message in recipients.values()]
+        return bool(codes) and all(_is_transient_code(code) for code in codes)
+    if isinstance(recipients, list) and recipients:
+        return all(_is_transient_code(getattr(recipient, 'code', None)) for recipient in recipients)
+
+    # smtplib.SMTPResponseException and aiosmtplib.SMTPResponseException
+    code = getattr(exception, 'smtp_code', getattr(exception, 'code', None))
+    if isinstance(code, int):
+        return _is_transient_code(code)
+
+    if isinstance(exception, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(exception, smtplib.SMTPException):
+        return False
+    # Connection refused or reset, timeouts, DNS failures. Other OSErrors,
+    # e.g. an attachment missing from the storage, fail again when retried.
+    return isinstance(exception, (ConnectionError, TimeoutError, socket.timeout, socket.gaierror))
+
+
+def get_retry_delay(attempts):
+    """
+    Returns how long to wait before retrying an email after its ``attempts``-th
+    failed attempt: RETRY_INTERVAL * RETRY_BACKOFF ** (attempts - 1) seconds,
+    at most RETRY_MAX_INTERVAL, randomized by +/- RETRY_JITTER so emails
+    failing together aren't retried all at once.
+    """
+    exponent = min(max(attempts - 1, 0), 64)
+    delay = min(get_retry_interval() * get_retry_backoff() ** exponent, get_retry_max_interval())
+    jitter = get_retry_jitter()
+    delay *= 1 + random.uniform(-jitter, jitter)
+    return datetime.timedelta(seconds=delay)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+from django_mail_admin.metrics import render_metrics
+from django_mail_admin.settings import get_metrics_token
+
+
+def can_read_metrics(request):
+    token = get_metrics_token()
+    if token and constant_time_compare(request.headers.get('Authorization', ''), 'Bearer ' + token):
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_active and user.is_staff
+
+
+@require_GET
+def metrics(request):
+    """
+    Prometheus metrics, for staff users or scrapers sending
+    ``Authorization: Bearer <METRICS_TOKEN>``
+    """
+    if not can_read_metrics(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
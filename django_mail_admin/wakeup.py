@@ -0,0 +1,163 @@
+import glob
+import os
+import select
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .settings import get_wakeup_socket
+
+# A datagram on a Unix socket wakes up ``send_queued_mail --daemon`` as soon as
+# an email is queued, instead of waiting for the next polling interval. Every
+# daemon listens on its own socket, WAKEUP_SOCKET followed by its pid, and
+# notify() wakes up all of them. Platforms without Unix sockets fall back to
+# plain polling.
+_sender = None
+_local = threading.local()
+
+# Sockets found by get_listener_paths(), until their directory changes
+_listener_paths = (None, [])
+
+
+def is_available():
+    return hasattr(socket, 'AF_UNIX') and bool(get_wakeup_socket())
+
+
+def notify(sender=None, **kwargs):
+    """
+    Wakes up the sending daemons listening on WAKEUP_SOCKET, if there are any.
+    Connected to the ``email_queued`` signal.
+
+    Emails queued in one transaction or within ``batched()`` send a single
+    wake-up.
+    """
+    if getattr(_local, 'batches', 0):
+        _local.batched = True
+        return
+    if not is_available():
+        return
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        # Django replaces the list of commit hooks on commit and rollback
+        if getattr(_local, 'hooks', None) is connection.run_on_commit:
+            return
+        _local.hooks = connection.run_on_commit
+    # The daemon can't see the email before the transaction queuing it commits
+    transaction.on_commit(_send_wakeup)
+
+
+@contextmanager
+def batched():
+    """Emails queued within only send one wake-up at the end, see send_many()"""
+    _local.batches = getattr(_local, 'batches', 0) + 1
+    try:
+        yield
+    finally:
+        _local.batches -= 1
+    if not _local.batches and getattr(_local, 'batched', False):
+        _local.batched = False
+        notify()
+
+
+def get_listener_paths():
+    """
+    Returns the sockets of the running daemons. Binding or removing a socket
+    changes the modification time of its directory, so the directory is
+    only listed again after that.
+    """
+    global _listener_paths
+    base = get_wakeup_socket()
+    try:
+        key = (base, os.stat(os.path.dirname(base) or '.').st_mtime_ns)
+    except OSError:
+        return []
+    if _listener_paths[0] != key:
+        _listener_paths = (key, glob.glob(glob.escape(base) + '.*'))
+    return _listener_paths[1]
+
+
+def _send_wakeup():
+    global _sender
+    _local.hooks = None
+    paths = get_listener_paths()
+    if not paths:
+        return
+    if _sender is None:
+        _sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        _sender.setblocking(False)
+    for path in paths:
+        try:
+            _sender.sendto(b'1', path)
+        except ConnectionRefusedError:
+            # Left over from a daemon that didn't shut down cleanly
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        except OSError:
+            # Its buffer is full of pending wake-ups, or it just exited
+            pass
+
+
+class WakeupListener(object):
+    def __init__(self, path=None):
+        self.path = path or '%s.%d' % (get_wakeup_socket(), os.getpid())
+        self.socket = None
+
+    def open(self):
+        if not is_available():
+            return
+        if os.path.exists(self.path):
+            # Left over from a dead process that had our pid
+            os.unlink(self.path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(self.path)
+        self.socket.setblocking(False)
+
+    def wait(self, timeout):
+        """
+        Blocks until a wake-up arrives or ``timeout`` seconds pass.
+        Returns True if woken up.
+        """
+        if self.socket is None:
+            time.sleep(timeout)
+            return False
+        readable, _, _ = select.select([self.socket], [], [], timeout)
+        if not readable:
+            return False
+        # Several emails may have been queued meanwhile, one wake-up is enough
+        try:
+            while self.socket.recv(64):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def interrupt(self):
+        """Wakes up ``wait``, e.g. from a signal handler."""
+        if self.socket is None:
+            return
+        try:
+            self.socket.sendto(b'1', self.path)
+        except OSError:
+            pass
+
+    def close(self):
+        if self.socket is None:
+            return
+        self.socket.close()
+        self.socket = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
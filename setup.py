@@ -56,32 +56,29 @@ setup(
         'django_mail_admin',
     ],
     include_package_data=True,
-    install_requires=['jsonfield'],
+    install_requires=['Django>=3.2', 'jsonfield'],
+    python_requires='>=3.9',
     license="MIT",
     zip_safe=False,
     keywords='django_mail_admin',
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Framework :: Django',
-        'Framework :: Django :: 1.9',
-        'Framework :: Django :: 1.10',
-        'Framework :: Django :: 1.11',
-        'Framework :: Django :: 2.0',
-        'Framework :: Django :: 3.0',
-        'Framework :: Django :: 4.0',
+        'Framework :: Django :: 3.2',
+        'Framework :: Django :: 4.2',
+        'Framework :: Django :: 5.2',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
-        'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
         'Programming Language :: Python :: 3.10',
         'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
+        'Programming Language :: Python :: 3.13',
     ],
     extras_require={
-        'gmail': ['social-auth-app-django']
+        'gmail': ['social-auth-app-django'],
+        'async': ['aiosmtplib'],
     }
 )
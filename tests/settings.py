@@ -38,6 +38,8 @@ DJANGO_MAIL_ADMIN = {
         'default': 'django.core.mail.backends.dummy.EmailBackend',
         'locmem': 'django.core.mail.backends.locmem.EmailBackend',
         'error': 'tests.test_backends.ErrorRaisingBackend',
+        'transient': 'tests.test_backends.TransientErrorBackend',
+        'selective': 'tests.test_backends.SelectiveErrorBackend',
         'smtp': 'django.core.mail.backends.smtp.EmailBackend',
         'connection_tester': 'django_mail_admin.tests.test_mail.ConnectionTestingBackend',
         'custom': 'django_mail_admin.backends.CustomEmailBackend'
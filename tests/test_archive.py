@@ -0,0 +1,69 @@
+import datetime
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.timezone import now
+
+from django_mail_admin.archive import archive_emails, get_archivable
+from django_mail_admin.models import OutgoingEmail, Log, Attachment, TemplateVariable, IncomingEmail, Mailbox, \
+    ArchivedEmail, ArchivedLog, STATUS, delete_unused_attachments
+
+
+class ArchiveTest(TestCase):
+
+    def create_email(self, status=STATUS.sent, **kwargs):
+        email = OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                             subject='Hi', status=status, **kwargs)
+        OutgoingEmail.objects.filter(id=email.id).update(last_updated=now() - datetime.timedelta(days=10))
+        return email
+
+    def test_archive_emails(self):
+        sent = self.create_email(context={'name': 'Alice'})
+        TemplateVariable.objects.create(email=sent, name='coupon', value='abc')
+        sent.logs.create(status=STATUS.sent, message='')
+        attachment = Attachment(name='report.pdf')
+        attachment.file.save('report.pdf', ContentFile(b'%PDF'), save=True)
+        attachment.emails.add(sent)
+        failed = self.create_email(status=STATUS.failed)
+        failed.logs.create(status=STATUS.failed, message='Refused', exception_type='SMTPRecipientsRefused')
+        queued = self.create_email(status=STATUS.queued)
+        recent = OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                              status=STATUS.sent)
+
+        cutoff = now() - datetime.timedelta(days=7)
+        self.assertEqual(list(archive_emails(cutoff, chunk_size=1)), [1, 1])
+
+        self.assertEqual(set(OutgoingEmail.objects.all()), {queued, recent})
+        self.assertFalse(Log.objects.exists())
+        self.assertFalse(TemplateVariable.objects.exists())
+
+        archived = ArchivedEmail.objects.get(email_id=sent.id)
+        self.assertEqual((archived.to, archived.subject, archived.status), (['to@example.com'], 'Hi', STATUS.sent))
+        self.assertEqual(archived.context, {'name': 'Alice', 'coupon': 'abc'})
+        self.assertEqual(list(archived.attachments.all()), [attachment])
+        self.assertEqual(archived.logs.get().status, STATUS.sent)
+        self.assertEqual(ArchivedLog.objects.count(), 2)
+        log = ArchivedEmail.objects.get(email_id=failed.id).logs.get()
+        self.assertEqual((log.message, log.exception_type), ('Refused', 'SMTPRecipientsRefused'))
+
+        # Attachments of archived emails are still in use
+        self.assertEqual(delete_unused_attachments(), 0)
+        self.assertEqual(list(archive_emails(cutoff)), [])
+
+    def test_emails_with_replies_are_kept(self):
+        email = self.create_email()
+        mailbox = Mailbox.objects.create(from_email='from@example.com', name='example.com')
+        IncomingEmail.objects.create(mailbox=mailbox, subject='Re: Hi', in_reply_to=email)
+        self.assertFalse(get_archivable(now()).exists())
+        self.assertEqual(list(archive_emails(now())), [])
+        self.assertEqual(IncomingEmail.objects.get().in_reply_to, email)
+
+    def test_archive_email_command(self):
+        for i in range(3):
+            self.create_email()
+        call_command('archive_email', days=30)
+        self.assertEqual(OutgoingEmail.objects.count(), 3)
+        call_command('archive_email', days=7, chunk_size=2)
+        self.assertEqual(OutgoingEmail.objects.count(), 0)
+        self.assertEqual(ArchivedEmail.objects.count(), 3)
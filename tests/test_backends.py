@@ -1,3 +1,6 @@
+from smtplib import SMTPResponseException
+
+from django.core import mail
 from django.core.mail import send_mail 
 from django.core.mail.backends.base import BaseEmailBackend
 from django.test import TestCase
@@ -18,6 +21,31 @@ class ErrorRaisingBackend(BaseEmailBackend):
         raise Exception('Fake Error')
 
 
+class TransientErrorBackend(BaseEmailBackend):
+    """
+    An EmailBackend whose server is temporarily unavailable
+    """
+
+    def send_messages(self, email_messages):
+        raise SMTPResponseException(421, b'Service not available, try again later')
+
+
+class SelectiveErrorBackend(BaseEmailBackend):
+    """
+    An EmailBackend that sends messages to mail.outbox, like the locmem
+    backend, but raises an error for messages with the subject 'fail'
+    """
+
+    def send_messages(self, email_messages):
+        count = 0
+        for message in email_messages:
+            if message.subject == 'fail':
+                raise Exception('Fake Error')
+            mail.outbox.append(message)
+            count += 1
+        return count
+
+
 class BackendTest(TestCase):
     # @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
     def test_get_invalid_backend(self):
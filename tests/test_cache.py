@@ -1,7 +1,16 @@
+import shutil
+import tempfile
+
 from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.template import Context
 from django.test import TestCase
+from mock import patch
 
 from django_mail_admin import cache
+from django_mail_admin.models import Attachment, EmailTemplate, OutgoingEmail, create_attachments, \
+    delete_unused_attachments
 from django_mail_admin.settings import get_cache_backend
 
 
@@ -39,3 +48,119 @@ class CacheTest(TestCase):
         self.assertTrue('awesome content', cache.get('test-cache'))
         cache.delete('test-cache')
         self.assertEqual(None, cache.get('test-cache'))
+
+
+class CompiledTemplateCacheTest(TestCase):
+
+    def setUp(self):
+        cache.invalidate_templates()
+        self.template = EmailTemplate.objects.create(
+            name='greeting', subject='Hi {{ name }}', email_html_text='<p>Hello {{ name }}</p>')
+
+    def test_templates_are_compiled_once(self):
+        with patch('django_mail_admin.cache.Template', wraps=cache.Template) as compile_template:
+            for name in ('Alice', 'Bob'):
+                context = Context({'name': name})
+                self.assertEqual(self.template.render_subject(context), 'Hi %s' % name)
+                self.assertEqual(self.template.render_html_text(context), '<p>Hello %s</p>' % name)
+        self.assertEqual(compile_template.call_count, 2)
+
+    def test_invalidated_on_save(self):
+        self.template.render_subject(Context({'name': 'Alice'}))
+        self.template.subject = 'Bye {{ name }}'
+        self.template.save()
+        self.assertEqual(len(cache._compiled_templates), 0)
+        self.assertEqual(self.template.render_subject(Context({'name': 'Alice'})), 'Bye Alice')
+
+    def test_invalidated_on_delete(self):
+        self.template.render_subject(Context({'name': 'Alice'}))
+        self.template.delete()
+        self.assertEqual(len(cache._compiled_templates), 0)
+
+    def test_content_change_without_save(self):
+        # Unsaved edits are keyed by content, so they never render stale output
+        self.template.render_subject(Context({'name': 'Alice'}))
+        self.template.subject = 'Bye {{ name }}'
+        self.assertEqual(self.template.render_subject(Context({'name': 'Alice'})), 'Bye Alice')
+
+    def test_cache_size(self):
+        with self.settings(DJANGO_MAIL_ADMIN={'TEMPLATE_CACHE_SIZE': 2}):
+            for i in range(3):
+                template = EmailTemplate.objects.create(name='t%s' % i, subject='Subject %s' % i)
+                template.render_subject(Context())
+            self.assertEqual(len(cache._compiled_templates), 2)
+            self.assertNotIn(template.pk - 2, [key[0] for key in cache._compiled_templates])
+
+        with self.settings(DJANGO_MAIL_ADMIN={'TEMPLATE_CACHE_SIZE': 0}):
+            cache.invalidate_templates()
+            self.template.render_subject(Context({'name': 'Alice'}))
+            self.assertEqual(len(cache._compiled_templates), 0)
+
+
+class AttachmentPayloadCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear_attachment_payloads()
+
+    def create_attachment(self, content):
+        attachment = Attachment(name='test.pdf')
+        attachment.file.save('test.pdf', content=ContentFile(content), save=True)
+        return attachment
+
+    def test_payload_shared_between_emails(self):
+        attachment = self.create_attachment(b'shared content')
+        emails = []
+        for i in range(3):
+            email = OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com')
+            attachment.emails.add(email)
+            emails.append(email)
+
+        with patch.object(FileSystemStorage, '_open', autospec=True,
+                          side_effect=FileSystemStorage._open) as storage_open:
+            messages = [email.email_message() for email in emails]
+        self.assertEqual(storage_open.call_count, 1)
+        payloads = [message.attachments[0][1] for message in messages]
+        self.assertEqual(payloads[0], b'shared content')
+        self.assertTrue(all(payload is payloads[0] for payload in payloads))
+
+    def test_reused_file_name(self):
+        """
+        The storage reuses the name of a deleted file, the payload of another
+        Attachment stored under it must not be returned
+        """
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with self.settings(MEDIA_ROOT=media_root):
+            self.check_reused_file_name()
+
+    def check_reused_file_name(self):
+        first, = create_attachments({'reused-name.pdf': ContentFile(b'first content')})
+        self.assertEqual(cache.get_attachment_payload(first), b'first content')
+        delete_unused_attachments()
+
+        second, = create_attachments({'reused-name.pdf': ContentFile(b'second content')})
+        self.assertEqual(second.file.name, first.file.name)
+        self.assertEqual(cache.get_attachment_payload(second), b'second content')
+
+        # Without a content hash the Attachment and file size identify the content
+        second.content_hash = ''
+        self.assertEqual(cache.get_attachment_payload_key(second), ('attachment', second.pk, 14))
+
+    def test_cache_size(self):
+        first = self.create_attachment(b'a' * 6)
+        second = self.create_attachment(b'b' * 6)
+        with self.settings(DJANGO_MAIL_ADMIN={'ATTACHMENT_CACHE_SIZE': 10}):
+            cache.get_attachment_payload(first)
+            cache.get_attachment_payload(second)
+            # The least recently used payload is evicted to stay under 10 bytes
+            self.assertEqual(list(cache._attachment_payloads), [cache.get_attachment_payload_key(second)])
+            self.assertEqual(cache._attachment_payloads_size, 6)
+
+            # Files larger than the cache aren't cached at all
+            cache.clear_attachment_payloads()
+            self.assertEqual(cache.get_attachment_payload(self.create_attachment(b'c' * 11)), b'c' * 11)
+            self.assertEqual(cache._attachment_payloads_size, 0)
+
+        with self.settings(DJANGO_MAIL_ADMIN={'ATTACHMENT_CACHE_SIZE': 0}):
+            self.assertEqual(cache.get_attachment_payload(first), b'a' * 6)
+            self.assertEqual(len(cache._attachment_payloads), 0)
@@ -1,8 +1,16 @@
+import threading
+
+import mock
+
 from django.core.mail import backends
 from django.test import TestCase
+from django.test.utils import override_settings
 
+from .smtp_sink import SMTPSink
 from .test_backends import ErrorRaisingBackend
-from django_mail_admin.connections import connections
+from django_mail_admin.connections import connections, ConnectionHandler
+from django_mail_admin.mail import _send_bulk, _send_messages, claim_queued
+from django_mail_admin.models import OutgoingEmail, STATUS
 
 
 class ConnectionTest(TestCase):
@@ -11,3 +19,123 @@ class ConnectionTest(TestCase):
         # Ensure ConnectionHandler returns the right connection
         self.assertTrue(isinstance(connections['error'], ErrorRaisingBackend))
         self.assertTrue(isinstance(connections['locmem'], backends.locmem.EmailBackend))
+
+
+class ConnectionPoolTest(TestCase):
+
+    def setUp(self):
+        self.sink = SMTPSink().start()
+        self.settings_override = self.settings(EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.sink.port,
+                                               EMAIL_USE_TLS=False)
+        self.settings_override.enable()
+        self.handler = ConnectionHandler()
+
+    def tearDown(self):
+        self.handler.close()
+        self.settings_override.disable()
+        self.sink.stop()
+
+    def test_release_and_reuse(self):
+        connection = self.handler['smtp']
+        self.assertIs(self.handler['smtp'], connection)
+        self.handler.release()
+        # The released connection passes the NOOP check and is reused
+        self.assertIs(self.handler['smtp'], connection)
+        self.assertEqual(self.sink.connection_count, 1)
+
+    def test_close(self):
+        connection = self.handler['smtp']
+        self.handler.close()
+        self.assertIsNone(connection.connection)
+        self.assertIsNot(self.handler['smtp'], connection)
+
+    @override_settings(DJANGO_MAIL_ADMIN={'BACKENDS': {'smtp': 'django.core.mail.backends.smtp.EmailBackend'},
+                                          'CONNECTION_IDLE_TIMEOUT': 0})
+    def test_idle_timeout(self):
+        connection = self.handler['smtp']
+        self.handler.release()
+        self.assertIsNot(self.handler['smtp'], connection)
+        self.assertIsNone(connection.connection)
+
+    @override_settings(DJANGO_MAIL_ADMIN={'BACKENDS': {'smtp': 'django.core.mail.backends.smtp.EmailBackend'},
+                                          'CONNECTION_POOL_SIZE': 1})
+    def test_pool_size(self):
+        connection = self.handler['smtp']
+
+        def send():
+            self.handler['smtp']
+            self.handler.release()
+
+        other_thread = threading.Thread(target=send)
+        other_thread.start()
+        other_thread.join()
+        self.assertEqual(self.sink.connection_count, 2)
+
+        # Only one of the two connections is kept
+        self.handler.release()
+        self.assertEqual(len(self.handler._idle['smtp']), 1)
+        self.assertIsNone(connection.connection)
+
+    def test_broken_connection_is_not_reused(self):
+        connection = self.handler['smtp']
+        self.handler.release()
+        self.sink.disconnect_all()
+        self.assertIsNot(self.handler['smtp'], connection)
+
+    def test_reconnect_on_disconnect(self):
+        """
+        An email sent on a connection the server dropped is retried once
+        on a new connection.
+        """
+        email = OutgoingEmail.objects.create(from_email='from@example.com', to=['to@example.com'],
+                                             subject='Subject', backend_alias='smtp')
+        connections.checkin('smtp', connections.checkout('smtp'))
+        self.sink.disconnect_all()
+        try:
+            # The server drops it between the NOOP check and sending
+            with mock.patch('django_mail_admin.connections.is_usable', return_value=True):
+                email.dispatch()
+            self.assertEqual(email.status, STATUS.sent)
+            self.assertEqual(len(self.sink.messages), 1)
+            self.assertEqual(self.sink.connection_count, 2)
+            # dispatch() gives its connection back
+            self.assertEqual(len(connections._idle['smtp']), 1)
+            self.assertEqual(dict(connections._get_local_connections()), {})
+        finally:
+            connections.close()
+
+    def test_threads_only_close_their_connections(self):
+        connection = self.handler['smtp']
+        other_thread = threading.Thread(target=self.handler.close)
+        other_thread.start()
+        other_thread.join()
+        self.assertIsNotNone(connection.connection)
+
+    @override_settings(DJANGO_MAIL_ADMIN={'BACKENDS': {'smtp': 'django.core.mail.backends.smtp.EmailBackend'},
+                                          'THREADS_PER_PROCESS': 2})
+    def test_send_bulk_connections(self):
+        """
+        A batch is sent with one send_messages() call per thread,
+        so it needs one connection per thread.
+        """
+        for i in range(10):
+            OutgoingEmail.objects.create(from_email='from@example.com', to=['to%d@example.com' % i],
+                                         subject='Subject', status=STATUS.queued, backend_alias='smtp')
+        self.assertEqual(_send_bulk(claim_queued(), uses_multiprocessing=False), (10, 0))
+        self.assertEqual(len(self.sink.messages), 10)
+        self.assertEqual(self.sink.connection_count, 2)
+
+    def test_send_messages_reconnects(self):
+        emails = [OutgoingEmail.objects.create(from_email='from@example.com', to=['to@example.com'],
+                                               subject='Subject', backend_alias='smtp') for i in range(3)]
+        for email in emails:
+            email.prepare_email_message()
+        connections['smtp']
+        self.sink.disconnect_all()
+        try:
+            sent, failed = _send_messages(emails)
+        finally:
+            connections.close()
+        self.assertEqual((sent, failed), (emails, []))
+        self.assertEqual(len(self.sink.messages), 3)
+        self.assertEqual(self.sink.connection_count, 2)
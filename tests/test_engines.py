@@ -0,0 +1,100 @@
+from unittest import skipIf
+
+from django.core import mail
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from django_mail_admin import engines
+from django_mail_admin.engines import get_engine, ASYNCIO, THREAD
+from django_mail_admin.mail import send_queued
+from django_mail_admin.models import OutgoingEmail, STATUS
+from django_mail_admin.settings import get_available_backends
+from django_mail_admin.signals import email_sent, email_failed_to_send
+from .smtp_sink import SMTPSink
+
+
+ASYNC_SETTINGS = {
+    'BACKENDS': {
+        'default': 'django.core.mail.backends.dummy.EmailBackend',
+        'locmem': {
+            'BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+            'ENGINE': 'asyncio',
+        },
+        'smtp': {
+            'BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'ENGINE': 'asyncio',
+            'CONCURRENCY': 3,
+        },
+        'error': {
+            'BACKEND': 'tests.test_backends.ErrorRaisingBackend',
+            'ENGINE': 'asyncio',
+        },
+    }
+}
+
+
+@override_settings(DJANGO_MAIL_ADMIN=ASYNC_SETTINGS)
+@skipIf(engines.aiosmtplib is None, 'aiosmtplib is not installed')
+class AsyncioEngineTest(TestCase):
+
+    def create_emails(self, count, backend_alias):
+        for i in range(count):
+            OutgoingEmail.objects.create(from_email='from@example.com', to=['to%s@example.com' % i],
+                                         subject='Subject %s' % i, message='Message',
+                                         status=STATUS.queued, backend_alias=backend_alias)
+
+    def test_backend_options(self):
+        self.assertEqual(get_available_backends()['locmem'], 'django.core.mail.backends.locmem.EmailBackend')
+        self.assertEqual(get_engine('locmem'), ASYNCIO)
+        self.assertEqual(get_engine('default'), THREAD)
+        self.assertEqual(get_engine(''), THREAD)
+
+    def test_send_with_executor(self):
+        self.create_emails(10, 'locmem')
+        self.assertEqual(send_queued(), (10, 0))
+        self.assertEqual(len(mail.outbox), 10)
+        self.assertEqual(OutgoingEmail.objects.filter(status=STATUS.sent).count(), 10)
+
+    def test_send_failure(self):
+        self.create_emails(2, 'error')
+        self.assertEqual(send_queued(), (0, 2))
+        self.assertEqual(OutgoingEmail.objects.filter(status=STATUS.failed).count(), 2)
+        for email in OutgoingEmail.objects.all():
+            self.assertEqual(email.logs.get().message, 'Fake Error')
+
+    def test_signals_outside_event_loop(self):
+        # Receivers may use the ORM, which refuses to run inside an event loop
+        received = []
+
+        def receiver(sender, **kwargs):
+            received.append(OutgoingEmail.objects.get(pk=sender.pk).backend_alias)
+
+        email_sent.connect(receiver)
+        email_failed_to_send.connect(receiver)
+        self.addCleanup(email_sent.disconnect, receiver)
+        self.addCleanup(email_failed_to_send.disconnect, receiver)
+        self.create_emails(2, 'locmem')
+        self.create_emails(1, 'error')
+        self.assertEqual(send_queued(), (2, 1))
+        self.assertEqual(sorted(received), ['error', 'locmem', 'locmem'])
+
+    def test_send_with_smtp(self):
+        sink = SMTPSink().start()
+        try:
+            with self.settings(EMAIL_HOST='127.0.0.1', EMAIL_PORT=sink.port, EMAIL_USE_TLS=False):
+                self.create_emails(12, 'smtp')
+                self.assertEqual(send_queued(), (12, 0))
+        finally:
+            sink.stop()
+        self.assertEqual(len(sink.messages), 12)
+        # Emails are spread over CONCURRENCY sessions
+        self.assertEqual(sink.connection_count, 3)
+        self.assertEqual(OutgoingEmail.objects.filter(status=STATUS.sent).count(), 12)
+
+    def test_dispatch(self):
+        # Emails sent with priority "now" don't go through the engine
+        email = OutgoingEmail.objects.create(from_email='from@example.com', to=['to@example.com'],
+                                             subject='Subject', backend_alias='locmem')
+        email.dispatch()
+        self.assertEqual(email.status, STATUS.sent)
+        self.assertEqual(len(mail.outbox), 1)
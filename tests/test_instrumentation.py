@@ -0,0 +1,76 @@
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from mock import patch
+
+from django_mail_admin.instrumentation import TimingAggregator, enable_timings, disable_timings, timed_stage, \
+    percentile
+from django_mail_admin.mail import send_queued, close_pools
+from django_mail_admin.models import OutgoingEmail, EmailTemplate, Attachment, STATUS
+from django_mail_admin.signals import stage_timed
+
+
+class InstrumentationTest(TestCase):
+
+    def tearDown(self):
+        disable_timings()
+        close_pools()
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile([3], 95), 3)
+
+    def test_timed_stage(self):
+        received = []
+
+        def receiver(sender, stage, duration, **kwargs):
+            received.append((stage, duration))
+
+        # Nothing is measured without receivers
+        with patch('django_mail_admin.instrumentation.time.perf_counter') as perf_counter:
+            with timed_stage('render'):
+                pass
+        self.assertFalse(perf_counter.called)
+
+        stage_timed.connect(receiver)
+        try:
+            with timed_stage('render'):
+                pass
+            with self.assertRaises(ValueError):
+                with timed_stage('send'):
+                    raise ValueError
+        finally:
+            stage_timed.disconnect(receiver)
+        # Failed stages aren't recorded
+        self.assertEqual([stage for stage, duration in received], ['render'])
+        self.assertGreaterEqual(received[0][1], 0)
+
+    def test_aggregator_summary(self):
+        aggregator = TimingAggregator()
+        for duration in (0.3, 0.1, 0.2):
+            aggregator.record(None, stage='send', duration=duration)
+        self.assertEqual(aggregator.summary(), {'send': (3, 0.2, 0.3, 0.3)})
+        self.assertEqual(aggregator.summary(), {})
+
+    def test_send_queued_logs_stage_timings(self):
+        template = EmailTemplate.objects.create(name='test', subject='Hi {{ name }}', email_html_text='Hello')
+        email = OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                             template=template, context={'name': 'Alice'},
+                                             status=STATUS.queued, backend_alias='locmem')
+        attachment = Attachment(name='report.pdf')
+        attachment.file.save('report.pdf', ContentFile(b'%PDF'), save=True)
+        attachment.emails.add(email)
+
+        enable_timings()
+        with self.assertLogs('django_mail_admin.instrumentation', 'INFO') as logs:
+            send_queued()
+        message = logs.records[-1].getMessage()
+        stages = [part.split(':')[0] for part in message[len('Stage timings: '):].split('; ')]
+        self.assertEqual(stages, ['get_queued', 'render', 'mime', 'attachments', 'send', 'status_update',
+                                  'log_write'])
+
+        # Timings are logged per batch
+        with self.assertLogs('django_mail_admin.instrumentation', 'INFO') as logs:
+            send_queued()
+        self.assertEqual(logs.records[-1].getMessage().split(';')[0].split(',')[0], 'Stage timings: get_queued: 1')
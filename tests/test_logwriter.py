@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from django_mail_admin.logwriter import get_log_writer, flush_logs
+from django_mail_admin.mail import send_queued, close_pools
+from django_mail_admin.models import OutgoingEmail, Log, LogCounter, STATUS
+
+
+class LogWriterTest(TestCase):
+
+    def setUp(self):
+        get_log_writer().flush()
+
+    def tearDown(self):
+        close_pools()
+
+    def queue(self, backend_alias='locmem', count=1):
+        for i in range(count):
+            OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                         status=STATUS.queued, backend_alias=backend_alias)
+
+    def test_logs_are_written_after_each_batch_by_default(self):
+        self.queue(count=2)
+        self.queue('error')
+        send_queued()
+        self.assertEqual(Log.objects.filter(status=STATUS.sent).count(), 2)
+        self.assertEqual(Log.objects.get(status=STATUS.failed).exception_type, 'Exception')
+        self.assertEqual(len(get_log_writer()), 0)
+
+    @override_settings(DJANGO_MAIL_ADMIN=dict(settings.DJANGO_MAIL_ADMIN, LOG_FLUSH_INTERVAL=3600,
+                                              LOG_BUFFER_SIZE=3))
+    def test_logs_are_buffered_between_batches(self):
+        self.queue(count=2)
+        send_queued(keep_alive=True)
+        self.assertFalse(Log.objects.exists())
+        self.assertEqual(len(get_log_writer()), 2)
+
+        # Written once LOG_BUFFER_SIZE logs are buffered
+        self.queue()
+        send_queued(keep_alive=True)
+        self.assertEqual(Log.objects.count(), 3)
+
+        self.queue()
+        send_queued(keep_alive=True)
+        self.assertEqual(Log.objects.count(), 3)
+        close_pools()
+        self.assertEqual(Log.objects.count(), 4)
+
+    @override_settings(DJANGO_MAIL_ADMIN=dict(settings.DJANGO_MAIL_ADMIN, LOG_SUCCESS_ROLLUP=True))
+    def test_success_rollup(self):
+        self.queue(count=3)
+        self.queue('default')
+        self.queue('error')
+        send_queued()
+        email = OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                             backend_alias='locmem')
+        email.dispatch()
+
+        # Failures are still logged one by one
+        self.assertEqual(list(Log.objects.values_list('status', flat=True)), [STATUS.failed])
+        counters = dict(LogCounter.objects.values_list('backend_alias', 'count'))
+        self.assertEqual(counters, {'locmem': 4, 'default': 1})
+        self.assertEqual(set(LogCounter.objects.values_list('status', flat=True)), {STATUS.sent})
+        counter = LogCounter.objects.get(backend_alias='locmem')
+        self.assertEqual((counter.minute.second, counter.minute.microsecond), (0, 0))
+
+    def test_force_flush(self):
+        email = OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com')
+        get_log_writer().add(email, STATUS.failed, message='Refused')
+        with override_settings(DJANGO_MAIL_ADMIN=dict(settings.DJANGO_MAIL_ADMIN, LOG_FLUSH_INTERVAL=3600)):
+            flush_logs()
+            self.assertFalse(Log.objects.exists())
+            flush_logs(force=True)
+        self.assertEqual(Log.objects.get().message, 'Refused')
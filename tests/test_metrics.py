@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from django_mail_admin import metrics
+from django_mail_admin.mail import send_queued, close_pools
+from django_mail_admin.metrics import MetricsRecorder, enable_metrics, get_queue_stats, render_metrics
+from django_mail_admin.models import OutgoingEmail, PRIORITY, STATUS
+from django_mail_admin.signals import email_sent, email_failed_to_send, stage_timed
+from django_mail_admin.views import metrics as metrics_view
+
+
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        metrics.cache_backend.clear()
+
+    def tearDown(self):
+        if metrics._recorder is not None:
+            email_sent.disconnect(dispatch_uid='django_mail_admin_metrics_sent')
+            email_failed_to_send.disconnect(dispatch_uid='django_mail_admin_metrics_failed')
+            stage_timed.disconnect(dispatch_uid='django_mail_admin_metrics_stages')
+            metrics._recorder = None
+        close_pools()
+
+    def create(self, **kwargs):
+        return OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com', **kwargs)
+
+    def test_queue_stats_are_cached(self):
+        self.create(status=STATUS.queued, priority=PRIORITY.high, backend_alias='locmem')
+        self.create(status=STATUS.queued, priority=PRIORITY.high, backend_alias='locmem')
+        self.create(status=STATUS.failed, priority=PRIORITY.low)
+        self.create(status=STATUS.sent, priority=PRIORITY.low)
+        OutgoingEmail.objects.filter(status=STATUS.queued).update(created=timezone.now() - timedelta(minutes=5))
+
+        with self.assertNumQueries(2):
+            stats = get_queue_stats()
+        self.assertEqual(sorted(stats['counts']), [(STATUS.failed, PRIORITY.low, 'default', 1),
+                                                   (STATUS.queued, PRIORITY.high, 'locmem', 2)])
+        with self.assertNumQueries(0):
+            output = render_metrics()
+        self.assertIn('django_mail_admin_emails{backend="locmem",priority="high",status="queued"} 2', output)
+        self.assertIn('django_mail_admin_emails{backend="default",priority="low",status="failed"} 1', output)
+        age = [line for line in output.splitlines()
+               if line.startswith('django_mail_admin_oldest_queued_email_age_seconds ')][0]
+        self.assertGreaterEqual(float(age.split()[1]), 300)
+
+    @override_settings(DJANGO_MAIL_ADMIN=dict(settings.DJANGO_MAIL_ADMIN, METRICS_BUCKETS=[0.1, 1]))
+    def test_histogram(self):
+        recorder = MetricsRecorder()
+        for duration in (0.05, 0.1, 0.5, 3):
+            recorder.stage_timed(None, stage='send', duration=duration)
+        recorder.flush()
+        output = render_metrics()
+        self.assertIn('django_mail_admin_stage_duration_seconds_bucket{le="0.1",stage="send"} 2', output)
+        self.assertIn('django_mail_admin_stage_duration_seconds_bucket{le="1.0",stage="send"} 3', output)
+        self.assertIn('django_mail_admin_stage_duration_seconds_bucket{le="+Inf",stage="send"} 4', output)
+        self.assertIn('django_mail_admin_stage_duration_seconds_sum{stage="send"} 3.650000', output)
+        self.assertIn('django_mail_admin_stage_duration_seconds_count{stage="send"} 4', output)
+        self.assertIn('# TYPE django_mail_admin_stage_duration_seconds histogram', output)
+
+    def test_send_attempts_are_counted(self):
+        enable_metrics()
+        self.create(status=STATUS.queued, backend_alias='locmem')
+        self.create(status=STATUS.queued, backend_alias='locmem')
+        self.create(status=STATUS.queued, backend_alias='error')
+        send_queued()
+        self.create(backend_alias='locmem').dispatch()
+
+        output = render_metrics()
+        self.assertIn('django_mail_admin_send_attempts_total{backend="locmem",result="sent"} 3', output)
+        self.assertIn('django_mail_admin_send_attempts_total{backend="error",result="failed"} 1', output)
+        self.assertIn('django_mail_admin_stage_duration_seconds_count{stage="send"} 3', output)
+
+    @override_settings(DJANGO_MAIL_ADMIN=dict(settings.DJANGO_MAIL_ADMIN, METRICS_TOKEN='secret'))
+    def test_view_permissions(self):
+        factory = RequestFactory()
+        request = factory.get('/metrics/')
+        request.user = AnonymousUser()
+        self.assertEqual(metrics_view(request).status_code, 403)
+
+        request = factory.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(metrics_view(request).status_code, 403)
+
+        request = factory.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+        response = metrics_view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+        request = factory.get('/metrics/')
+        request.user = User.objects.create_user('staff', is_staff=True)
+        self.assertContains(metrics_view(request), 'django_mail_admin_send_attempts_total')
@@ -1,15 +1,23 @@
 import django
+from django.conf import settings
 import copy
+import gc
+import weakref
 from datetime import timedelta
 from django.utils import timezone
 from django.core import mail
+from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
 from django.core.mail import EmailMessage, EmailMultiAlternatives
 from django.forms.models import modelform_factory
 from django.test import TestCase
-from django.test.utils import override_settings
+from django.test.utils import override_settings, CaptureQueriesContext
+from django.db import connection
 from django_mail_admin.models import OutgoingEmail, Log, PRIORITY, STATUS, EmailTemplate, Attachment, TemplateVariable
-from django_mail_admin.mail import send, send_many, get_queued
+from django_mail_admin.mail import send, send_many, get_queued, get_queued_branches, claim_queued, \
+    release_expired_leases, _send_bulk, _send_messages
+from mock import patch
+from .test_backends import SelectiveErrorBackend
 
 
 class OutgoingModelTest(TestCase):
@@ -183,7 +191,8 @@ class OutgoingModelTest(TestCase):
         self.assertEqual(email.headers, None)
         email_message = email.email_message()
         self.assertEqual(email_message.subject, context['bar'])
-        self.assertEqual(email_message.alternatives[0][0], str(context['baz']) + " " + str(context['booz']))
+        # Context is stored as JSON, so tuples come back as lists
+        self.assertEqual(email_message.alternatives[0][0], '5 [6, 7]')
 
         # Now with tags
         OutgoingEmail.objects.all().delete()
@@ -197,7 +206,34 @@ class OutgoingModelTest(TestCase):
         self.assertEqual(email.headers, None)
         email_message = email.email_message()
         self.assertEqual(email_message.subject, context['bar'][0].upper() + context['bar'][1:])
-        self.assertEqual(email_message.alternatives[0][0], str(context['baz']) + " " + "(")
+        self.assertEqual(email_message.alternatives[0][0], '5 6')
+
+    def test_send_context(self):
+        """
+        Template variables are stored in the context column, values which
+        aren't JSON serializable are converted to strings.
+        """
+        template = EmailTemplate.objects.create(name='foo', subject='{{ when }}',
+                                                email_html_text='{% for i in items %}{{ i }}{% endfor %}')
+        scheduled_time = timezone.now()
+        email = send(recipients=['to@example.com'], sender='from@a.com', template=template,
+                     variable_dict={'items': [1, 2], 'when': scheduled_time})
+        self.assertFalse(TemplateVariable.objects.exists())
+        email = OutgoingEmail.objects.get(id=email.id)
+        self.assertEqual(email.context, {'items': [1, 2], 'when': str(scheduled_time)})
+        self.assertEqual(email.email_message().alternatives[0][0], '12')
+
+        # TemplateVariable rows (e.g. added in the admin) take precedence
+        TemplateVariable.objects.create(email=email, name='when', value='tomorrow')
+        email = OutgoingEmail.objects.get(id=email.id)
+        self.assertEqual(email.email_message().subject, 'tomorrow')
+
+    def test_send_many_context(self):
+        template = EmailTemplate.objects.create(name='foo', subject='Hi {{ name }}')
+        send_many([{'recipients': ['to@example.com'], 'sender': 'from@a.com', 'template': template,
+                    'variable_dict': {'name': name}} for name in ('Alice', 'Bob')])
+        subjects = [email.email_message().subject for email in OutgoingEmail.objects.order_by('id')]
+        self.assertEqual(subjects, ['Hi Alice', 'Hi Bob'])
 
     def test_send_without_template(self):
         headers = {'Reply-to': 'reply@email.com'}
@@ -342,16 +378,263 @@ class OutgoingModelTest(TestCase):
             emails_falsy = copy.deepcopy(emails)
             emails_falsy[0]['priority'] = PRIORITY.now
             send_many(emails_falsy)
-        with self.assertRaises(ValueError):
-            emails_falsy = copy.deepcopy(emails)
-            attachment = Attachment()
-            attachment.file.save(
-                'test.txt', content=ContentFile('test file content'), save=True
-            )
-            attachment.mimetype = 'text/plain'
-            attachment.save()
-            emails_falsy[0]['attachments'] = [attachment]
-            send_many(emails_falsy)
-        send_many(emails)
+        ids = send_many(emails)
         queued = get_queued()
-        self.assertEqual(queued.count(), 2)
+        self.assertEqual(len(queued), 2)
+        self.assertEqual(sorted(ids), sorted(email.id for email in queued))
+
+    def test_send_many_chunks(self):
+        """
+        Any iterable is accepted and inserted in chunks, chunks before
+        an invalid email stay queued.
+        """
+        def campaign(count):
+            for i in range(count):
+                yield dict(sender='from@a.com', recipients=['to%d@example.com' % i], subject='Hi')
+
+        # One INSERT per chunk, or per email on databases not returning the
+        # ids of bulk inserts, wrapped in a savepoint
+        inserts = 3 if connection.features.can_return_rows_from_bulk_insert else 5
+        with self.assertNumQueries(6 + inserts):
+            ids = send_many(campaign(5), chunk_size=2)
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(OutgoingEmail.objects.filter(id__in=ids).count(), 5)
+
+        invalid = list(campaign(3))
+        invalid[2]['recipients'] = ['invalid']
+        with self.assertRaises(ValidationError):
+            send_many(invalid, chunk_size=2)
+        self.assertEqual(OutgoingEmail.objects.count(), 7)
+
+    def test_send_many_attachments(self):
+        attachment = Attachment(mimetype='text/plain')
+        attachment.file.save('test.txt', content=ContentFile('test file content'), save=True)
+        shared = {'shared.txt': ContentFile('shared content')}
+        ids = send_many([
+            dict(sender='from@a.com', recipients=['to1@example.com'], attachments=shared),
+            dict(sender='from@a.com', recipients=['to2@example.com'], attachments=shared),
+            dict(sender='from@a.com', recipients=['to3@example.com'], attachments=[attachment]),
+        ])
+        # The shared dict is stored once
+        self.assertEqual(Attachment.objects.count(), 2)
+        for email_id in ids[:2]:
+            message = OutgoingEmail.objects.get(id=email_id).email_message()
+            self.assertEqual(message.attachments[0][1], 'shared content')
+        message = OutgoingEmail.objects.get(id=ids[2]).email_message()
+        self.assertEqual(message.attachments[0][1], 'test file content')
+
+    def test_send_many_attachments_per_chunk(self):
+        files = []
+        alive = []
+
+        def get_emails():
+            for i in range(6):
+                if i == 4:
+                    # Attachments of the first chunk aren't kept in memory
+                    gc.collect()
+                    alive.extend(ref() is not None for ref in files[:2])
+                content = ContentFile('content %d' % (i % 2))
+                files.append(weakref.ref(content))
+                yield dict(sender='from@a.com', recipients=['to@example.com'], attachments={'file.txt': content})
+
+        send_many(get_emails(), chunk_size=2)
+        self.assertEqual(alive, [False, False])
+        # Same content is stored once across chunks
+        self.assertEqual(Attachment.objects.count(), 2)
+
+    def test_claim_queued(self):
+        """
+        Claimed emails are moved to STATUS.sending, so another worker
+        can't pick them up again.
+        """
+        for i in range(3):
+            OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                         status=STATUS.queued)
+        OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                     status=STATUS.queued, scheduled_time=timezone.now() + timedelta(days=1))
+
+        claimed = claim_queued()
+        self.assertEqual(len(claimed), 3)
+        self.assertTrue(all(email.status == STATUS.sending for email in claimed))
+        self.assertEqual(OutgoingEmail.objects.filter(status=STATUS.sending).count(), 3)
+        self.assertEqual(claim_queued(), [])
+
+    @override_settings(DJANGO_MAIL_ADMIN=dict(settings.DJANGO_MAIL_ADMIN, BATCH_SIZE=4,
+                                              SENDING_ORDER=['-priority', 'id']))
+    def test_get_queued_merges_branches(self):
+        """
+        Ready, scheduled and retried emails are merged in SENDING_ORDER
+        and limited to BATCH_SIZE.
+        """
+        past = timezone.now() - timedelta(minutes=1)
+        future = timezone.now() + timedelta(days=1)
+
+        def create(**kwargs):
+            return OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                                status=STATUS.queued, **kwargs)
+
+        ready_low = create(priority=PRIORITY.low)
+        scheduled = create(priority=PRIORITY.high, scheduled_time=past)
+        retried = create(priority=PRIORITY.medium, next_retry=past)
+        ready_high = create(priority=PRIORITY.high)
+        scheduled_retried = create(priority=PRIORITY.medium, scheduled_time=past, next_retry=past)
+        create(priority=PRIORITY.high, scheduled_time=future)
+        create(priority=PRIORITY.high, next_retry=future)
+        create(priority=PRIORITY.high, scheduled_time=past, next_retry=future)
+        OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                     priority=PRIORITY.high, status=STATUS.sent)
+
+        self.assertEqual(get_queued(), [scheduled, ready_high, retried, scheduled_retried])
+        self.assertNotIn(ready_low, get_queued())
+
+    @override_settings(DJANGO_MAIL_ADMIN=dict(settings.DJANGO_MAIL_ADMIN, SENDING_ORDER=['-priority', 'id']))
+    def test_get_queued_uses_partial_index(self):
+        """
+        The ready branch is read from its partial index in SENDING_ORDER,
+        without sorting the queue.
+        """
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan format is specific to SQLite')
+        plan = get_queued_branches()[0].explain()
+        self.assertIn('mail_admin_queue_ready_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_prepare_queued_query_count(self):
+        """
+        Template variables and attachments of a batch are prefetched, so the
+        number of queries doesn't grow with the batch size.
+        """
+        template = EmailTemplate.objects.create(name='test', subject='Hi {{ name }}',
+                                                email_html_text='Hello {{ name }}')
+        query_counts = []
+        for batch_size in (2, 10):
+            for i in range(batch_size):
+                email = OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                                     template=template, status=STATUS.queued)
+                TemplateVariable.objects.create(email=email, name='name', value='user%d' % i)
+            with CaptureQueriesContext(connection) as context:
+                emails = claim_queued()
+                messages = [email.email_message() for email in emails]
+            self.assertEqual(len(messages), batch_size)
+            self.assertEqual(messages[-1].subject, 'Hi user%d' % (batch_size - 1))
+            query_counts.append(len(context.captured_queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    @override_settings(DJANGO_MAIL_ADMIN=dict(settings.DJANGO_MAIL_ADMIN, MAX_RETRIES=2))
+    def test_dispatch_retries_transient_errors(self):
+        email = OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                             backend_alias='transient')
+        for attempt in (1, 2):
+            email.dispatch()
+            email = OutgoingEmail.objects.get(id=email.id)
+            self.assertEqual(email.status, STATUS.queued)
+            self.assertEqual(email.attempts, attempt)
+            self.assertGreater(email.next_retry, timezone.now())
+            # Not due before the retry time
+            self.assertNotIn(email, get_queued())
+
+        email.dispatch()
+        email = OutgoingEmail.objects.get(id=email.id)
+        self.assertEqual(email.status, STATUS.failed)
+        self.assertEqual(email.attempts, 3)
+        self.assertIsNone(email.next_retry)
+        self.assertEqual(email.logs.filter(status=STATUS.failed, exception_type='SMTPResponseException').count(), 3)
+
+        # Permanent errors aren't retried
+        email = OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                             backend_alias='error')
+        email.dispatch()
+        self.assertEqual(OutgoingEmail.objects.get(id=email.id).status, STATUS.failed)
+
+    @override_settings(DJANGO_MAIL_ADMIN=dict(settings.DJANGO_MAIL_ADMIN, MAX_RETRIES=2))
+    def test_missing_attachment_is_not_retried(self):
+        email = OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                             status=STATUS.queued, backend_alias='locmem')
+        attachment = Attachment(name='missing.txt')
+        attachment.file.save('missing.txt', content=ContentFile(b'gone'), save=True)
+        attachment.emails.add(email)
+        attachment.file.delete(save=False)
+
+        _send_bulk(claim_queued(), uses_multiprocessing=False)
+        email = OutgoingEmail.objects.get(id=email.id)
+        self.assertEqual((email.status, email.attempts, email.next_retry), (STATUS.failed, 1, None))
+        self.assertEqual(email.logs.get().exception_type, 'FileNotFoundError')
+
+    @override_settings(DJANGO_MAIL_ADMIN=dict(settings.DJANGO_MAIL_ADMIN, MAX_RETRIES=1))
+    def test_send_bulk_retries_transient_errors(self):
+        for alias in ('transient', 'error', 'locmem'):
+            OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                         status=STATUS.queued, backend_alias=alias)
+        _send_bulk(claim_queued(), uses_multiprocessing=False)
+        statuses = dict(OutgoingEmail.objects.values_list('backend_alias', 'status'))
+        self.assertEqual(statuses, {'transient': STATUS.queued, 'error': STATUS.failed, 'locmem': STATUS.sent})
+        self.assertEqual(set(OutgoingEmail.objects.values_list('attempts', flat=True)), {1})
+
+        email = OutgoingEmail.objects.get(backend_alias='transient')
+        self.assertEqual(email.lease_owner, '')
+        self.assertEqual(claim_queued(), [])
+
+        # Once due, it is retried and fails for good
+        OutgoingEmail.objects.filter(id=email.id).update(next_retry=timezone.now())
+        _send_bulk(claim_queued(), uses_multiprocessing=False)
+        email = OutgoingEmail.objects.get(id=email.id)
+        self.assertEqual((email.status, email.attempts, email.next_retry), (STATUS.failed, 2, None))
+
+    def test_send_messages_outcomes(self):
+        """
+        Emails of a backend are sent with send_messages(), a failing message
+        doesn't fail the others of the batch.
+        """
+        emails = [OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                               subject=subject, backend_alias='selective')
+                  for subject in ('first', 'fail', 'third', 'fail')]
+        for email in emails:
+            email.prepare_email_message()
+        with patch('tests.test_backends.SelectiveErrorBackend.send_messages', autospec=True,
+                   side_effect=SelectiveErrorBackend.send_messages) as send_messages:
+            sent, failed = _send_messages(emails)
+        self.assertEqual(send_messages.call_count, 2)
+        self.assertEqual(sent, [emails[0], emails[2]])
+        self.assertEqual([email for email, exception in failed], [emails[1], emails[3]])
+        self.assertEqual([message.subject for message in mail.outbox], ['first', 'third'])
+
+    def test_send_bulk_groups_by_backend(self):
+        for alias in ('locmem', 'selective', 'locmem', 'selective'):
+            OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                         subject='Subject', status=STATUS.queued, backend_alias=alias)
+        with override_settings(DJANGO_MAIL_ADMIN=dict(settings.DJANGO_MAIL_ADMIN, THREADS_PER_PROCESS=1)):
+            with patch('django_mail_admin.mail._send_messages', wraps=_send_messages) as send_messages:
+                self.assertEqual(_send_bulk(claim_queued(), uses_multiprocessing=False), (4, 0))
+        self.assertEqual(sorted(set(email.backend_alias for email in call[0][0])
+                                for call in send_messages.call_args_list),
+                         [{'locmem'}, {'selective'}])
+
+    def test_release_expired_leases(self):
+        """
+        Emails claimed by a worker that didn't finish before its lease expired
+        are put back in the queue, other claimed emails are left alone.
+        """
+        OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                     status=STATUS.queued)
+        claimed = claim_queued(lease_owner='crashed-worker')
+        self.assertEqual(claimed[0].lease_owner, 'crashed-worker')
+        self.assertEqual(release_expired_leases(), 0)
+
+        OutgoingEmail.objects.filter(id=claimed[0].id).update(lease_expires=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(release_expired_leases(), 1)
+        email = OutgoingEmail.objects.get(id=claimed[0].id)
+        self.assertEqual(email.status, STATUS.queued)
+        self.assertEqual(email.lease_owner, '')
+        self.assertIsNone(email.lease_expires)
+
+    def test_send_bulk_respects_lease(self):
+        """
+        A worker whose lease was taken over by another worker doesn't
+        overwrite the email status.
+        """
+        OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                     status=STATUS.queued, backend_alias='locmem')
+        stale = claim_queued(lease_owner='stale-worker')
+        OutgoingEmail.objects.update(lease_owner='new-worker')
+        _send_bulk(stale, uses_multiprocessing=False)
+        self.assertEqual(OutgoingEmail.objects.get().status, STATUS.sending)
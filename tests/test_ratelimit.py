@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import mail
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from mock import patch
+
+from django_mail_admin.mail import _send_bulk, claim_queued
+from django_mail_admin.models import OutgoingEmail, STATUS
+from django_mail_admin.ratelimit import RateLimiter, TokenBucket, cache_backend, get_recipient_domains, parse_rate
+
+RATE_LIMITED = dict(settings.DJANGO_MAIL_ADMIN, BACKENDS=dict(
+    settings.DJANGO_MAIL_ADMIN['BACKENDS'],
+    limited={'BACKEND': 'django.core.mail.backends.locmem.EmailBackend', 'RATE_LIMIT': '2/h'},
+), DOMAIN_RATE_LIMITS={'Gmail.com': '1/h'}, RATE_LIMIT_MAX_WAIT=0)
+
+
+class RateLimitTest(TestCase):
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/s'), (10, 1))
+        self.assertEqual(parse_rate('600/min'), (600, 60))
+        self.assertEqual(parse_rate('1000/h'), (1000, 3600))
+        self.assertEqual(parse_rate(5), (5, 1))
+        for rate in ('10', '10/week', None):
+            with self.assertRaises(ValueError):
+                parse_rate(rate)
+
+    def test_token_bucket(self):
+        with patch('django_mail_admin.ratelimit.time.monotonic', return_value=100):
+            bucket = TokenBucket(2, 1)
+        # Bursts up to the capacity, then one token every half second
+        for delay in (0, 0, 0.5, 1):
+            self.assertEqual(bucket.get_delay(100), delay)
+            bucket.consume(100)
+        self.assertEqual(bucket.get_delay(101), 0.5)
+        self.assertEqual(bucket.get_delay(200), 0)
+
+    def test_recipient_domains(self):
+        email = OutgoingEmail(to=['a@example.com', 'B <b@Example.com>'], cc=['c@gmail.com'], bcc=[])
+        self.assertEqual(get_recipient_domains(email), {'example.com', 'gmail.com'})
+
+    @override_settings(DJANGO_MAIL_ADMIN=RATE_LIMITED)
+    def test_rate_limiter(self):
+        limiter = RateLimiter()
+        limited = OutgoingEmail(to=['a@example.com'], backend_alias='limited')
+        self.assertEqual(limiter.reserve(limited, 0), (True, 0))
+        self.assertEqual(limiter.reserve(limited, 0), (True, 0))
+        reserved, delay = limiter.reserve(limited, 0)
+        self.assertFalse(reserved)
+        self.assertAlmostEqual(delay, 1800, delta=1)
+
+        # Limits are split between processes
+        limiter = RateLimiter(processes=2)
+        self.assertEqual(limiter.reserve(limited, 0), (True, 0))
+        self.assertFalse(limiter.reserve(limited, 0)[0])
+
+        # Domain limits apply to any backend, without limits nothing is reserved
+        limiter = RateLimiter()
+        gmail = OutgoingEmail(to=['a@gmail.com'])
+        self.assertEqual(limiter.reserve(gmail, 0), (True, 0))
+        self.assertFalse(limiter.reserve(gmail, 0)[0])
+        self.assertTrue(limiter.reserve(gmail, 3600)[0])
+        self.assertEqual(limiter.reserve(OutgoingEmail(to=['a@example.com']), 0), (True, 0))
+
+    @override_settings(DJANGO_MAIL_ADMIN=RATE_LIMITED)
+    @patch('django_mail_admin.ratelimit.is_shared_cache', return_value=True)
+    @patch('django_mail_admin.ratelimit.time.time', return_value=7200.5)
+    def test_shared_rate_limiter(self, time, is_shared_cache):
+        cache_backend.clear()
+        # Processes share the full limits through the cache
+        limiters = [RateLimiter(processes=2), RateLimiter(processes=2)]
+        limited = OutgoingEmail(to=['a@example.com'], backend_alias='limited')
+        self.assertEqual(limiters[0].reserve(limited, 0), (True, 0))
+        self.assertEqual(limiters[1].reserve(limited, 0), (True, 0))
+        self.assertEqual(limiters[0].reserve(limited, 0), (False, 3599.5))
+        self.assertEqual(limiters[1].reserve(limited, 3600), (True, 3599.5))
+
+        # A refused email gives back what it reserved in its other buckets
+        time.return_value = 14400
+        limited_gmail = OutgoingEmail(to=['a@gmail.com'], backend_alias='limited')
+        self.assertEqual(limiters[0].reserve(limited_gmail, 0), (True, 0))
+        self.assertFalse(limiters[1].reserve(limited_gmail, 0)[0])
+        self.assertEqual(limiters[1].reserve(limited, 0), (True, 0))
+        self.assertFalse(limiters[0].reserve(limited, 0)[0])
+
+    @override_settings(DJANGO_MAIL_ADMIN=RATE_LIMITED)
+    def test_send_bulk_defers_emails(self):
+        for i in range(3):
+            OutgoingEmail.objects.create(to=['to@example.com'], from_email='from@example.com',
+                                         status=STATUS.queued, backend_alias='limited')
+        with patch('django_mail_admin.mail.get_rate_limiter', return_value=RateLimiter()):
+            self.assertEqual(_send_bulk(claim_queued(), uses_multiprocessing=False), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+        # Deferred emails are queued again without counting an attempt
+        email = OutgoingEmail.objects.get(status=STATUS.queued)
+        self.assertEqual(email.attempts, 0)
+        self.assertEqual(email.lease_owner, '')
+        self.assertGreater(email.next_retry, timezone.now() + timedelta(minutes=29))
+        self.assertFalse(email.logs.exists())
@@ -1,13 +1,21 @@
+import hashlib
+import io
+import os
+import smtplib
+import socket
+from datetime import timedelta
+
 from django.core.files.base import ContentFile
 from django.core.exceptions import ValidationError
 
 from django.test import TestCase
 from django.test.utils import override_settings
+from django.utils.timezone import now
 
 from django_mail_admin.models import OutgoingEmail, STATUS, PRIORITY, EmailTemplate, Attachment, create_attachments, \
-    send_mail
-from django_mail_admin.utils import (parse_emails,
-                                     parse_priority, split_emails)
+    delete_unused_attachments, send_mail
+from django_mail_admin.utils import (get_retry_delay, is_transient_error, parse_emails,
+                                     parse_priority, split_emails, split_emails_by_backend)
 from django_mail_admin.validators import validate_email_with_name, validate_comma_separated_emails
 from django_mail_admin.mail import send
 
@@ -68,6 +76,14 @@ class UtilsTest(TestCase):
         email_list = split_emails(OutgoingEmail.objects.all(), 4)
         self.assertEqual(expected_size, [len(emails) for emails in email_list])
 
+    def test_split_emails_by_backend(self):
+        emails = [OutgoingEmail(backend_alias=alias, to=[to]) for alias, to in (
+            ('smtp', 'a@gmail.com'), ('', 'b@example.com'), ('smtp', 'c@example.com'),
+            ('', 'd@gmail.com'), ('smtp', 'e@gmail.com'))]
+        email_lists = split_emails_by_backend(emails, 2)
+        self.assertEqual([[email.to[0] for email in email_list] for email_list in email_lists],
+                         [['b@example.com', 'd@gmail.com', 'c@example.com'], ['a@gmail.com', 'e@gmail.com']])
+
     def test_create_attachments(self):
         attachments = create_attachments({
             'attachment_file1.txt': ContentFile('content'),
@@ -100,6 +116,94 @@ class UtilsTest(TestCase):
         self.assertTrue(attachments[0].name.startswith('attachment_file'))
         self.assertEquals(attachments[0].mimetype, 'text/plain')
 
+    def test_create_attachments_from_file_objects(self):
+        path = os.path.join(os.path.dirname(__file__), 'messages', 'generic_message.eml')
+        with open(path, 'rb') as opened_file:
+            attachments = create_attachments({
+                'buffer.txt': io.BytesIO(b'hello'),
+                'message.eml': opened_file,
+            })
+        self.assertEqual(attachments[0].file.read(), b'hello')
+        self.assertEqual(attachments[0].content_hash, hashlib.sha256(b'hello').hexdigest())
+        with open(path, 'rb') as opened_file:
+            self.assertEqual(attachments[1].file.read(), opened_file.read())
+
+        send(sender='from@example.com', recipients=['to@example.com'], subject='Hi',
+             attachments={'buffer.txt': io.BytesIO(b'hello')})
+        self.assertEqual(Attachment.objects.count(), 2)
+
+    def test_is_transient_error(self):
+        self.assertTrue(is_transient_error(smtplib.SMTPResponseException(421, 'Try again later')))
+        self.assertTrue(is_transient_error(smtplib.SMTPServerDisconnected()))
+        self.assertTrue(is_transient_error(ConnectionRefusedError()))
+        self.assertTrue(is_transient_error(TimeoutError('timed out')))
+        self.assertTrue(is_transient_error(socket.gaierror(-3, 'Temporary failure in name resolution')))
+        # Missing or unreadable attachments fail on every attempt
+        self.assertFalse(is_transient_error(FileNotFoundError(2, 'No such file or directory')))
+        self.assertFalse(is_transient_error(PermissionError(13, 'Permission denied')))
+        self.assertTrue(is_transient_error(smtplib.SMTPRecipientsRefused({'a@example.com': (450, 'Greylisted')})))
+        self.assertFalse(is_transient_error(smtplib.SMTPRecipientsRefused({
+            'a@example.com': (450, 'Greylisted'), 'b@example.com': (550, 'No such user')})))
+        self.assertFalse(is_transient_error(smtplib.SMTPResponseException(550, 'No such user')))
+        self.assertFalse(is_transient_error(smtplib.SMTPNotSupportedError()))
+        self.assertFalse(is_transient_error(ValueError()))
+        with self.settings(DJANGO_MAIL_ADMIN={'TRANSIENT_EXCEPTIONS': ['ValueError']}):
+            self.assertTrue(is_transient_error(ValueError()))
+
+    @override_settings(DJANGO_MAIL_ADMIN={'RETRY_INTERVAL': 10, 'RETRY_BACKOFF': 3,
+                                          'RETRY_MAX_INTERVAL': 100, 'RETRY_JITTER': 0})
+    def test_get_retry_delay(self):
+        self.assertEqual([get_retry_delay(attempts) for attempts in range(1, 5)],
+                         [timedelta(seconds=seconds) for seconds in (10, 30, 90, 100)])
+        with self.settings(DJANGO_MAIL_ADMIN={'RETRY_INTERVAL': 10, 'RETRY_JITTER': 0.5}):
+            delays = set(get_retry_delay(1) for i in range(20))
+            self.assertGreater(len(delays), 1)
+            self.assertTrue(all(timedelta(seconds=5) <= delay <= timedelta(seconds=15) for delay in delays))
+
+    def test_create_attachments_deduplicates(self):
+        first, = create_attachments({'terms.pdf': ContentFile(b'terms')})
+        # Same content, name and mimetype reuses the Attachment
+        self.assertEqual(create_attachments({'terms.pdf': ContentFile(b'terms')}), [first])
+        self.assertEqual(first.content_hash, hashlib.sha256(b'terms').hexdigest())
+
+        # Same content under another name shares the file
+        renamed, = create_attachments({'conditions.pdf': ContentFile(b'terms')})
+        self.assertNotEqual(renamed.pk, first.pk)
+        self.assertEqual(renamed.name, 'conditions.pdf')
+        self.assertEqual(renamed.file.name, first.file.name)
+
+        other, = create_attachments({'terms.pdf': ContentFile(b'other terms')})
+        self.assertNotEqual(other.file.name, first.file.name)
+        self.assertEqual(Attachment.objects.count(), 3)
+
+    def test_delete_unused_attachments(self):
+        email = OutgoingEmail.objects.create(from_email='from@example.com', to=['to@example.com'])
+        used, = create_attachments({'used.pdf': ContentFile(b'shared')})
+        used.emails.add(email)
+        unused_shared, = create_attachments({'unused.pdf': ContentFile(b'shared')})
+        unused, = create_attachments({'unused.pdf': ContentFile(b'unused')})
+        storage = Attachment.file.field.storage
+
+        self.assertEqual(delete_unused_attachments(), 2)
+        self.assertEqual(list(Attachment.objects.all()), [used])
+        # The file of unused_shared is still referenced by used
+        self.assertTrue(storage.exists(unused_shared.file.name))
+        self.assertFalse(storage.exists(unused.file.name))
+
+    def test_delete_unused_attachments_before(self):
+        old = [create_attachments({'old%d.pdf' % i: ContentFile(b'old %d' % i)})[0] for i in range(3)]
+        recent, = create_attachments({'recent.pdf': ContentFile(b'recent')})
+        reused, = create_attachments({'reused.pdf': ContentFile(b'reused')})
+        Attachment.objects.exclude(pk=recent.pk).update(last_used=now() - timedelta(days=2))
+        # About to be linked by a concurrent send()
+        self.assertEqual(create_attachments({'reused.pdf': ContentFile(b'reused')}), [reused])
+        storage = Attachment.file.field.storage
+
+        self.assertEqual(delete_unused_attachments(now() - timedelta(days=1), chunk_size=2), 3)
+        self.assertEqual(set(Attachment.objects.all()), {recent, reused})
+        self.assertFalse(any(storage.exists(attachment.file.name) for attachment in old))
+        self.assertTrue(storage.exists(reused.file.name))
+
     def test_create_attachments_open_file(self):
         attachments = create_attachments({
             'attachment_file.py': __file__,
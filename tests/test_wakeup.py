@@ -0,0 +1,147 @@
+import datetime
+import os
+import signal
+import socket
+import tempfile
+import time
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.timezone import now
+
+from mock import patch
+
+from django_mail_admin import wakeup
+from django_mail_admin.mail import send_many
+from django_mail_admin.management.commands.send_queued_mail import Command
+from django_mail_admin.models import OutgoingEmail, STATUS
+from django_mail_admin.wakeup import WakeupListener
+
+WAKEUP_SOCKET = os.path.join(tempfile.gettempdir(), 'django_mail_admin_test.sock')
+
+
+@override_settings(DJANGO_MAIL_ADMIN={'WAKEUP_SOCKET': WAKEUP_SOCKET})
+class WakeupTest(TestCase):
+
+    def test_notify_wakes_up_listener(self):
+        if not wakeup.is_available():
+            self.skipTest('Unix sockets are not available')
+        with WakeupListener() as listener:
+            self.assertFalse(listener.wait(0))
+            with self.captureOnCommitCallbacks(execute=True):
+                wakeup.notify()
+                wakeup.notify()
+            self.assertTrue(listener.wait(1))
+            # Pending wake-ups are drained at once
+            self.assertFalse(listener.wait(0))
+        self.assertFalse(os.path.exists(listener.path))
+
+    def test_notify_wakes_up_every_daemon(self):
+        if not wakeup.is_available():
+            self.skipTest('Unix sockets are not available')
+        # A daemon that was killed leaves its socket behind
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        stale.bind(WAKEUP_SOCKET + '.3')
+        stale.close()
+        with WakeupListener(WAKEUP_SOCKET + '.1') as first:
+            with WakeupListener(WAKEUP_SOCKET + '.2') as second:
+                with self.captureOnCommitCallbacks(execute=True):
+                    wakeup.notify()
+                self.assertTrue(first.wait(1))
+                self.assertTrue(second.wait(1))
+            self.assertFalse(os.path.exists(WAKEUP_SOCKET + '.3'))
+
+            # Another daemon exiting doesn't affect this one
+            with self.captureOnCommitCallbacks(execute=True):
+                wakeup.notify()
+            self.assertTrue(first.wait(1))
+
+    def test_one_wakeup_per_transaction(self):
+        def get_wakeups(callbacks):
+            return [callback for callback in callbacks if callback is wakeup._send_wakeup]
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for i in range(3):
+                wakeup.notify()
+        self.assertEqual(len(get_wakeups(callbacks)), 1)
+
+        # send_many() notifies once per chunk
+        with self.captureOnCommitCallbacks() as callbacks, \
+                patch('django_mail_admin.wakeup.notify', side_effect=wakeup.notify) as notify:
+            send_many([{'sender': 'from@example.com', 'recipients': ['to%d@example.com' % i]}
+                       for i in range(5)], chunk_size=2)
+        self.assertEqual(notify.call_count, 3)
+        self.assertEqual(len(get_wakeups(callbacks)), 1)
+
+    def test_listener_paths_cached(self):
+        if not wakeup.is_available():
+            self.skipTest('Unix sockets are not available')
+        with patch('django_mail_admin.wakeup.glob.glob', side_effect=wakeup.glob.glob) as glob:
+            self.assertEqual(wakeup.get_listener_paths(), [])
+            self.assertEqual(wakeup.get_listener_paths(), [])
+            self.assertEqual(glob.call_count, 1)
+            # A daemon starting changes the directory
+            with WakeupListener() as listener:
+                self.assertEqual(wakeup.get_listener_paths(), [listener.path])
+            self.assertEqual(wakeup.get_listener_paths(), [])
+
+    def test_notify_without_listener(self):
+        # Must not fail when no daemon is running
+        with self.captureOnCommitCallbacks(execute=True):
+            wakeup.notify()
+
+    def test_interrupt(self):
+        if not wakeup.is_available():
+            self.skipTest('Unix sockets are not available')
+        with WakeupListener() as listener:
+            listener.interrupt()
+            self.assertTrue(listener.wait(1))
+
+    def test_daemon_sleep_time(self):
+        command = Command()
+        self.assertEqual(command.get_sleep_time(60), 60)
+
+        OutgoingEmail.objects.create(from_email='from@example.com', to=['to@example.com'],
+                                     status=STATUS.queued,
+                                     scheduled_time=now() + datetime.timedelta(seconds=10))
+        self.assertTrue(0 < command.get_sleep_time(60) <= 10)
+        self.assertEqual(command.get_sleep_time(5), 5)
+        self.assertFalse(command.has_due_emails())
+
+    def test_daemon_loop(self):
+        if not wakeup.is_available():
+            self.skipTest('Unix sockets are not available')
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+
+        def send_queued(processes, log_level, keep_alive):
+            batch = send_queued_mock.call_count
+            if batch == 1:
+                # The error is logged and the daemon waits, an email queued wakes it up
+                wakeup._send_wakeup()
+                raise ValueError('Lost database connection')
+            if batch == 3:
+                # Queued while sending the drained queue
+                wakeup._send_wakeup()
+            if batch == 4:
+                os.kill(os.getpid(), signal.SIGTERM)
+
+        command = Command()
+        start = time.monotonic()
+        with patch('django_mail_admin.management.commands.send_queued_mail.send_queued',
+                   side_effect=send_queued) as send_queued_mock, \
+                patch('django_mail_admin.management.commands.send_queued_mail.close_pools') as close_pools, \
+                patch.object(command, 'has_due_emails', side_effect=[True, False]), \
+                self.assertLogs('django_mail_admin', 'INFO') as logs:
+            command.run_daemon({'processes': 1, 'log_level': None, 'max_sleep': 30})
+
+        # Emails left after the second batch are sent right away, the drained
+        # queue is waited for without closing the pools
+        self.assertEqual(send_queued_mock.call_count, 4)
+        send_queued_mock.assert_called_with(1, None, keep_alive=True)
+        close_pools.assert_called_once_with()
+        self.assertEqual([record.getMessage() for record in logs.records],
+                         ['Lost database connection', 'Received signal %d, finishing current batch.' % signal.SIGTERM,
+                          'Stopped sending queued emails.'])
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(wakeup.get_listener_paths(), [])